@@ -0,0 +1,30 @@
+import hmac
+from functools import wraps
+from flask import current_app, request, abort
+from flask_login import current_user
+
+
+def is_admin_request():
+    """Check whether the current request comes from an operator.
+
+    Operators either send the configured admin token in the X-Admin-Token
+    header (for curl/automation) or are logged in as one of ADMIN_USERS.
+    """
+    token = current_app.config.get('ADMIN_TOKEN')
+    supplied = request.headers.get('X-Admin-Token', '')
+    if token and supplied and hmac.compare_digest(token, supplied):
+        return True
+
+    admin_users = current_app.config.get('ADMIN_USERS', ())
+    return bool(current_user and current_user.is_authenticated
+                and current_user.username in admin_users)
+
+
+def admin_required(view):
+    """Restrict a view to operators, answering 404 to everyone else."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not is_admin_request():
+            abort(404)
+        return view(*args, **kwargs)
+    return wrapped
@@ -1,23 +1,36 @@
 import mysql.connector
-from flask import Flask, render_template, redirect, url_for, request, flash, jsonify
+import click
+from flask import (Flask, Blueprint, current_app, render_template, redirect, url_for, request, flash, jsonify,
+                   Response, stream_with_context)
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_caching import Cache
-import requests
 import datetime
-import pandas as pd
-import numpy as np
 from config import MYSQL_CONFIG, FOOTBALL_DATA_API_URL, FOOTBALL_DATA_API_KEY, Config
 import logging
 from functools import wraps
 import time
 import hashlib
-import secrets
-from werkzeug.security import generate_password_hash, check_password_hash
 from decimal import Decimal
 import json
 from models import db, User, Match, Team, UserPrediction
+from profiling import init_profiler
+from user_cache import UserCache, watch_user_changes
+from head_to_head import apply_h2h_changes, rebuild_head_to_head, lookup_head_to_head
+from live import init_live, open_stream
+from queries import TEAMS_BY_ID_QUERY
+from players import ingest_squads, ingest_scorers, ingest_match_events, load_dump, leaderboard, latest_season, LEADERBOARDS
+from schema import ensure_schema, direct_connection
+from database import get_db_connection, get_read_connection, mark_write, init_database
+from admin import admin_required
+from export import DATASETS, FORMATS, export_chunks
+from write_behind import init_write_behind
+from season_store import init_season_store, bump_data_version, lock_ingest
+from change_log import init_change_feed, record_changes, changes_since, prune_changes
+from upstream_cache import UpstreamCache
+from user_import import UserImport
+from notifications import THEMES, load_preferences, save_preferences, queue_notifications, create_worker
 
 # Custom JSON encoder to handle Decimal values
 class CustomJSONEncoder(json.JSONEncoder):
@@ -30,84 +43,59 @@ class CustomJSONEncoder(json.JSONEncoder):
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-app.config.from_object(Config)
-app.json_encoder = CustomJSONEncoder
-
-# Initialize extensions
-db.init_app(app)
+# Extensions are created unbound and attached to each app in create_app()
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'main.login'
 
 limiter = Limiter(
-    app=app,
     key_func=get_remote_address,
     default_limits=["200 per day", "50 per hour"]
 )
 
-cache = Cache(app)
+cache = Cache()
+
+upstream = UpstreamCache()
+
+user_cache = UserCache()
+watch_user_changes(User, user_cache)
+
+# All routes and CLI commands live on this blueprint
+main = Blueprint('main', __name__, cli_group=None)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Serve the identity from the per-worker cache; only misses hit the database
+    return user_cache.load(int(user_id), User.query.get)
 
-# Enhanced database connection with connection pooling
-def get_db_connection():
-    """Get a database connection with connection pooling."""
+def stored_match_row(match):
+    """Convert an API match into the shape of a stored `matches` row."""
+    return {
+        'id': match['id'],
+        'season': match['Season'],
+        'match_date': match['MatchDate'],
+        'home_team_id': match['HomeTeamID'],
+        'away_team_id': match['AwayTeamID'],
+        'home_goals': match['HomeScore'],
+        'away_goals': match['AwayScore'],
+        'result': match['Result'],
+    }
+
+def load_stored_matches(cnx, match_ids):
+    """Fetch the stored state of the given matches, keyed by id."""
+    if not match_ids:
+        return {}
+    cursor = cnx.cursor(dictionary=True)
     try:
-        # Add connection pooling configuration
-        config = MYSQL_CONFIG.copy()
-        config.update({
-            'pool_name': 'mypool',
-            'pool_size': 5,
-            'pool_reset_session': True,
-            'connect_timeout': 10,  # Add timeout to prevent hanging
-            'use_pure': True  # Use pure Python implementation for better compatibility
-        })
-        
-        # Try to connect to the database
-        logger.info(f"Attempting to connect to database at {config['host']}")
-        cnx = mysql.connector.connect(**config)
-        
-        # Test the connection
-        cursor = cnx.cursor()
-        cursor.execute('SELECT 1')
-        result = cursor.fetchone()
+        placeholders = ', '.join(['%s'] * len(match_ids))
+        cursor.execute(f"""
+            SELECT id, season, match_date, home_team_id, away_team_id,
+                   home_goals, away_goals, result
+            FROM matches
+            WHERE id IN ({placeholders})
+        """, tuple(match_ids))
+        return {row['id']: row for row in cursor.fetchall()}
+    finally:
         cursor.close()
-        
-        if result and result[0] == 1:
-            logger.info("Database connection test successful")
-            return cnx
-        else:
-            logger.error("Database connection test failed")
-            raise mysql.connector.Error("Connection test failed")
-            
-    except mysql.connector.Error as err:
-        logger.error(f"Database connection error: {err}")
-        if err.errno == mysql.connector.errorcode.ER_ACCESS_DENIED_ERROR:
-            logger.error("Access denied: Check your username and password")
-        elif err.errno == mysql.connector.errorcode.ER_BAD_DB_ERROR:
-            logger.error("Database does not exist")
-        elif err.errno == mysql.connector.errorcode.ER_CON_COUNT_ERROR:
-            logger.error("Too many connections")
-        elif err.errno == mysql.connector.errorcode.ER_CONNECTION_ERROR:
-            logger.error("Connection error: Check if MySQL server is running")
-        else:
-            logger.error(f"Error {err.errno}: {err.msg}")
-        raise
-    except Exception as e:
-        logger.error(f"Unexpected error connecting to database: {e}")
-        raise
-
-# Enhanced password hashing with salt
-def hash_password(password):
-    salt = secrets.token_hex(16)
-    return f"{salt}:{generate_password_hash(password + salt)}"
-
-def verify_password(stored_hash, password):
-    salt, hash_value = stored_hash.split(':')
-    return check_password_hash(hash_value, password + salt)
 
 def update_matches():
     """Fetch and update matches from the Football-Data.org API."""
@@ -129,6 +117,10 @@ def update_matches():
             cnx = get_db_connection()
             cursor = cnx.cursor()
             
+            # Another ingest holding the lock commits first; our diff below then sees its rows,
+            # so the additive aggregate deltas are never applied twice
+            lock_ingest(cursor)
+            
             # Update teams first
             teams_data = set()
             for match in matches:
@@ -149,18 +141,24 @@ def update_matches():
                     logger.error(f"Error updating team {team_id}: {err}")
                     # Continue with other teams even if one fails
             
+            # Remember the stored state so we can tell which matches really changed
+            previous = load_stored_matches(cnx, [match['id'] for match in matches])
+            
             # Update matches
             logger.info(f"Updating {len(matches)} matches")
+            changes = []
             for match in matches:
                 try:
                     cursor.execute("""
                         INSERT INTO matches (
-                            id, match_date, home_team_id, away_team_id,
-                            home_goals, away_goals, result, season
+                            id, match_date, kickoff_at, home_team_id, away_team_id,
+                            home_goals, away_goals, result, season, matchday
                         )
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                         ON DUPLICATE KEY UPDATE
                             match_date = VALUES(match_date),
+                            matchday = VALUES(matchday),
+                            kickoff_at = VALUES(kickoff_at),
                             home_goals = VALUES(home_goals),
                             away_goals = VALUES(away_goals),
                             result = VALUES(result),
@@ -168,19 +166,39 @@ def update_matches():
                     """, (
                         match['id'],
                         match['MatchDate'],
+                        match.get('KickoffAt'),
                         match['HomeTeamID'],
                         match['AwayTeamID'],
                         match['HomeScore'],
                         match['AwayScore'],
                         match['Result'],
-                        match['Season']
+                        match['Season'],
+                        match.get('Matchday')
                     ))
                 except mysql.connector.Error as err:
                     logger.error(f"Error updating match {match['id']}: {err}")
                     # Continue with other matches even if one fails
+                    continue
+                
+                current = stored_match_row(match)
+                if previous.get(match['id']) != current:
+                    changes.append((previous.get(match['id']), current))
+            
+            # Keep the head-to-heads in step with the new results
+            if changes:
+                logger.info(f"{len(changes)} matches changed")
+                apply_h2h_changes(cursor, changes)
+                bump_data_version(cursor)
+                record_changes(cursor, changes)
+                queued = queue_notifications(cursor, changes)
+                if queued:
+                    logger.info(f"Queued notifications for {queued} results")
             
             cnx.commit()
             logger.info("Matches updated successfully")
+            if changes:
+                # Don't wait for the next version check in this worker
+                current_app.extensions['season_store'].expire()
             
         except mysql.connector.Error as err:
             logger.error(f"Database error in update_matches: {err}")
@@ -200,214 +218,168 @@ def update_matches():
         logger.error(f"Traceback: {traceback.format_exc()}")
         raise
 
-# Update the fetch_matches function to include more match data
-@cache.memoize(timeout=300)
-def fetch_matches():
-    """
-    Fetch real match data from Football-Data.org API with caching.
-    """
-    headers = {"X-Auth-Token": FOOTBALL_DATA_API_KEY}
-    endpoint = f"{FOOTBALL_DATA_API_URL}competitions/PL/matches"
-    
+# Statuses football-data uses for a match that is being played
+LIVE_STATUSES = ('IN_PROGRESS', 'IN_PLAY', 'PAUSED')
+
+def parse_match(m):
+    """Convert one API match into our match dict, or None if it is unusable."""
     try:
-        logger.info(f"Making API request to {endpoint}")
-        response = requests.get(endpoint, headers=headers, timeout=10)
-        
-        # Check if the request was successful
-        if response.status_code != 200:
-            logger.error(f"API request failed with status code {response.status_code}: {response.text}")
-            return []
-            
-        data = response.json()
+        season_info = m.get("season", {})
+        season_str = f"{season_info.get('startDate', '')[:4]}/{season_info.get('endDate', '')[:4]}" if season_info else "Unknown"
         
-        # Check if the response contains matches
-        if "matches" not in data:
-            logger.error(f"API response does not contain matches: {data}")
-            return []
-            
-        matches = []
-        logger.info(f"Processing {len(data['matches'])} matches from API")
-        
-        for m in data.get("matches", []):
-            try:
-                season_info = m.get("season", {})
-                season_str = f"{season_info.get('startDate', '')[:4]}/{season_info.get('endDate', '')[:4]}" if season_info else "Unknown"
-                
-                utc_date = m.get("utcDate", "")
-                try:
-                    match_date = datetime.datetime.strptime(utc_date[:10], "%Y-%m-%d").date()
-                except Exception as e:
-                    logger.error(f"Error parsing date {utc_date}: {e}")
-                    match_date = None
-
-                # Get match result
-                result = 'Scheduled'
-                if m.get('status') == 'FINISHED':
-                    home_goals = m.get('score', {}).get('fullTime', {}).get('home', 0)
-                    away_goals = m.get('score', {}).get('fullTime', {}).get('away', 0)
-                    if home_goals > away_goals:
-                        result = 'Home Win'
-                    elif away_goals > home_goals:
-                        result = 'Away Win'
-                    else:
-                        result = 'Draw'
-                elif m.get('status') == 'IN_PROGRESS':
-                    result = 'Live'
-     
-                match = {
-                    'id': m.get('id'),
-                    'Season': season_str,
-                    'HomeTeamID': m.get("homeTeam", {}).get("id"),
-                    'AwayTeamID': m.get("awayTeam", {}).get("id"),
-                    'HomeTeamName': m.get("homeTeam", {}).get("name"),
-                    'AwayTeamName': m.get("awayTeam", {}).get("name"),
-                    'HomeScore': m.get('score', {}).get('fullTime', {}).get('home', 0),
-                    'AwayScore': m.get('score', {}).get('fullTime', {}).get('away', 0),
-                    'HomeTeamRank': 0,  # Will be updated from league table
-                    'AwayTeamRank': 0,  # Will be updated from league table
-                    'Result': result,
-                    'MatchDate': match_date,
-                    'Status': m.get('status', 'SCHEDULED')
-                }
-                
-                # Validate required fields
-                if not all([match['id'], match['HomeTeamID'], match['AwayTeamID'], match['MatchDate']]):
-                    logger.warning(f"Skipping match with missing required fields: {match}")
-                    continue
-                    
-                matches.append(match)
-            except Exception as e:
-                logger.error(f"Error processing match: {e}")
-                continue
+        utc_date = m.get("utcDate", "")
+        try:
+            match_date = datetime.datetime.strptime(utc_date[:10], "%Y-%m-%d").date()
+        except Exception as e:
+            logger.error(f"Error parsing date {utc_date}: {e}")
+            match_date = None
+        try:
+            kickoff_at = datetime.datetime.strptime(utc_date[:19], "%Y-%m-%dT%H:%M:%S")
+        except ValueError:
+            kickoff_at = None
+
+        # Get match result
+        result = 'Scheduled'
+        if m.get('status') == 'FINISHED':
+            home_goals = m.get('score', {}).get('fullTime', {}).get('home', 0)
+            away_goals = m.get('score', {}).get('fullTime', {}).get('away', 0)
+            if home_goals > away_goals:
+                result = 'Home Win'
+            elif away_goals > home_goals:
+                result = 'Away Win'
+            else:
+                result = 'Draw'
+        elif m.get('status') in LIVE_STATUSES:
+            result = 'Live'
+
+        match = {
+            'id': m.get('id'),
+            'Season': season_str,
+            'Matchday': m.get('matchday'),
+            'HomeTeamID': m.get("homeTeam", {}).get("id"),
+            'AwayTeamID': m.get("awayTeam", {}).get("id"),
+            'HomeTeamName': m.get("homeTeam", {}).get("name"),
+            'AwayTeamName': m.get("awayTeam", {}).get("name"),
+            'HomeScore': m.get('score', {}).get('fullTime', {}).get('home', 0),
+            'AwayScore': m.get('score', {}).get('fullTime', {}).get('away', 0),
+            'HomeTeamRank': 0,  # Will be updated from league table
+            'AwayTeamRank': 0,  # Will be updated from league table
+            'Result': result,
+            'MatchDate': match_date,
+            'KickoffAt': kickoff_at,  # UTC
+            'Status': m.get('status', 'SCHEDULED')
+        }
         
-        logger.info(f"Successfully processed {len(matches)} matches")
-        return matches
+        # Validate required fields
+        if not all([match['id'], match['HomeTeamID'], match['AwayTeamID'], match['MatchDate']]):
+            logger.warning(f"Skipping match with missing required fields: {match}")
+            return None
         
-    except requests.exceptions.Timeout:
-        logger.error("API request timed out")
-        return []
-    except requests.exceptions.RequestException as e:
-        logger.error(f"API request error: {e}")
-        return []
+        return match
     except Exception as e:
-        logger.error(f"Unexpected error in fetch_matches: {e}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.error(f"Error processing match: {e}")
+        return None
+
+def fetch_live_matches():
+    """Fetch today's matches for the live score poller; None if the API call failed."""
+    today = datetime.date.today().isoformat()
+    # Always revalidate (cheap when unchanged), and wait for it: a stale answer would lag the feed by a poll
+    data = fetch_api("competitions/PL/matches", {"dateFrom": today, "dateTo": today}, max_age=0, background=False)
+    if data is None:
+        return None
+    return [match for match in map(parse_match, data.get("matches", [])) if match]
+
+def parse_matches(data):
+    """Parse a competition matches payload, skipping matches that fail validation."""
+    if "matches" not in data:
+        logger.error(f"API response does not contain matches: {str(data)[:500]}")
         return []
+    logger.info(f"Processing {len(data['matches'])} matches from API")
+    matches = [match for match in map(parse_match, data["matches"]) if match]
+    logger.info(f"Successfully processed {len(matches)} matches")
+    return matches
+
+def fetch_matches():
+    """
+    Fetch real match data from Football-Data.org API through the upstream cache.
+    The parsed list is reused while the upstream payload is unchanged.
+    Ingest must not get a stale payload back (and a one-shot CLI would exit
+    before a background refresh finished), so stale entries are revalidated first.
+    """
+    return upstream.get("competitions/PL/matches", parse=parse_matches, background=False) or []
+
+def fetch_api(path, params=None, max_age=None, background=True):
+    """Fetch a raw JSON payload from the Football-Data.org API through the upstream cache, or None on failure."""
+    return upstream.get(path, params, max_age=max_age, background=background)
+
+# Live score stream (server-sent events)
+@main.route('/live/stream')
+@limiter.exempt
+def live_stream():
+    stream = open_stream(current_app.extensions['live'], current_app.config['LIVE_MAX_STREAMS'])
+    if stream is None:
+        # Every stream holds a worker thread; past the cap, clients poll /api/v1/live instead
+        response = jsonify({'error': 'Too many live streams, poll /api/v1/live'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(current_app.config['LIVE_POLL_INTERVAL'])
+        return response
+    response = Response(stream_with_context(stream), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # keep nginx from buffering the stream
+    return response
+
+@main.route('/api/v1/live')
+@limiter.exempt
+def api_live():
+    live_scores = current_app.extensions['live']
+    live_scores.ensure_started()
+    return jsonify(live_scores.current())
+
+# Delta sync: only what changed since the client's last version, optionally long-polled
+@main.route('/api/v1/changes')
+@limiter.exempt
+def api_changes():
+    since = max(request.args.get('since', 0, type=int), 0)
+    wait = min(max(request.args.get('wait', 0, type=float), 0), current_app.config['CHANGES_MAX_WAIT'])
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 1000)
+    try:
+        if wait:
+            # Past the per-process cap the request is answered at once, like wait=0
+            current_app.extensions['changes'].wait(since, wait, current_app.config['CHANGES_MAX_WAITERS'])
+        # Primary, so a version the feed has seen is never missing from the answer
+        cnx = get_db_connection()
+        cursor = cnx.cursor(dictionary=True)
+        try:
+            body = changes_since(cursor, since, limit)
+        finally:
+            cursor.close()
+            cnx.close()
+    except Exception as e:
+        logger.error(f"Error in api_changes route: {e}")
+        return jsonify({'error': 'Unable to load changes'}), 500
+    return jsonify(body)
 
 # Enhanced routes with pagination and caching
-@app.route('/')
+@main.route('/')
 @cache.cached(timeout=300)
 def index():
     """Display all matches and league table with pagination."""
     try:
-        # Update matches to ensure fresh data
-        try:
-            update_matches()
-        except Exception as e:
-            logger.error(f"Error updating matches in index route: {str(e)}")
-            flash('Unable to update matches. Showing existing data.', 'warning')
-        
         page = request.args.get('page', 1, type=int)
-        per_page = app.config['ITEMS_PER_PAGE']
-        
-        # Initialize variables
-        matches = []
-        league_table = []
-        total_matches = 0
-        cnx = None
-        cursor = None
+        per_page = current_app.config['ITEMS_PER_PAGE']
         
+        # Served from the in-process season store; no queries unless the data version moved
         try:
-            # Get database connection with better error handling
-            try:
-                cnx = get_db_connection()
-                logger.info("Database connection established successfully")
-            except mysql.connector.Error as db_err:
-                logger.error(f"Database connection error: {str(db_err)}")
-                flash(f'Database connection error: {str(db_err)}', 'error')
-                return render_template('error.html')
-            
-            cursor = cnx.cursor(dictionary=True)
-            
-            # Get total count for pagination
-            try:
-                cursor.execute("SELECT COUNT(*) as total FROM matches")
-                result = cursor.fetchone()
-                if result:
-                    total_matches = result['total']
-                else:
-                    total_matches = 0
-                logger.info(f"Total matches count: {total_matches}")
-            except mysql.connector.Error as db_err:
-                logger.error(f"Error counting matches: {str(db_err)}")
-                flash(f'Error counting matches: {str(db_err)}', 'error')
-                return render_template('error.html')
-            
-            if total_matches > 0:
-                # Get paginated matches, ordered by match date
-                try:
-                    matches_query = """
-                        SELECT m.*, 
-                               ht.name as HomeTeamName, at.name as AwayTeamName,
-                               ht.short_name as HomeTeamShort, at.short_name as AwayTeamShort
-                        FROM matches m
-                        JOIN teams ht ON m.home_team_id = ht.id
-                        JOIN teams at ON m.away_team_id = at.id
-                        ORDER BY m.match_date DESC
-                        LIMIT %s OFFSET %s
-                    """
-                    cursor.execute(matches_query, (per_page, (page - 1) * per_page))
-                    matches = cursor.fetchall()
-                    logger.info(f"Retrieved {len(matches)} matches")
-                except mysql.connector.Error as db_err:
-                    logger.error(f"Error fetching matches: {str(db_err)}")
-                    flash(f'Error fetching matches: {str(db_err)}', 'error')
-                    return render_template('error.html')
-            
-            # Get league table with enhanced statistics
-            try:
-                table_query = """
-                    SELECT t.name, t.short_name, t.id as team_id,
-                           COUNT(m.id) as Played,
-                           SUM(CASE WHEN (m.home_team_id = t.id AND m.home_goals > m.away_goals) 
-                                OR (m.away_team_id = t.id AND m.away_goals > m.home_goals) THEN 1 ELSE 0 END) as Won,
-                           SUM(CASE WHEN m.home_goals = m.away_goals THEN 1 ELSE 0 END) as Drawn,
-                           SUM(CASE WHEN (m.home_team_id = t.id AND m.home_goals < m.away_goals) 
-                                OR (m.away_team_id = t.id AND m.away_goals < m.home_goals) THEN 1 ELSE 0 END) as Lost,
-                           SUM(CASE WHEN m.home_team_id = t.id THEN m.home_goals ELSE m.away_goals END) as GoalsFor,
-                           SUM(CASE WHEN m.home_team_id = t.id THEN m.away_goals ELSE m.home_goals END) as GoalsAgainst,
-                           SUM(CASE WHEN (m.home_team_id = t.id AND m.home_goals > m.away_goals) 
-                                OR (m.away_team_id = t.id AND m.away_goals > m.home_goals) THEN 3
-                                WHEN m.home_goals = m.away_goals THEN 1 ELSE 0 END) as Points
-                    FROM teams t
-                    LEFT JOIN matches m ON t.id = m.home_team_id OR t.id = m.away_team_id
-                    GROUP BY t.id, t.name, t.short_name
-                    ORDER BY Points DESC, (GoalsFor - GoalsAgainst) DESC
-                """
-                cursor.execute(table_query)
-                league_table = cursor.fetchall()
-                logger.info(f"Retrieved league table with {len(league_table)} teams")
-                
-                # Add team rank to each team
-                for i, team in enumerate(league_table):
-                    team['team_rank'] = i + 1
-            except mysql.connector.Error as db_err:
-                logger.error(f"Error fetching league table: {str(db_err)}")
-                flash(f'Error fetching league table: {str(db_err)}', 'error')
-                return render_template('error.html')
-            
-        except Exception as e:
-            logger.error(f"Unexpected error in database operations: {str(e)}")
-            flash(f'An unexpected error occurred: {str(e)}', 'error')
+            snapshot = current_app.extensions['season_store'].snapshot()
+            total_matches = snapshot.match_count()
+            matches = snapshot.recent_matches(per_page, (page - 1) * per_page)
+            league_table = snapshot.league_table()
+            logger.info(f"Retrieved {len(matches)} of {total_matches} matches and "
+                        f"{len(league_table)} table rows from season store v{snapshot.version}")
+        except mysql.connector.Error as db_err:
+            logger.error(f"Database error loading season store: {str(db_err)}")
+            flash(f'Database connection error: {str(db_err)}', 'error')
             return render_template('error.html')
-        finally:
-            # Ensure resources are properly closed
-            if cursor:
-                cursor.close()
-            if cnx:
-                cnx.close()
-                logger.info("Database connection closed")
         
         if not matches and not league_table:
             flash('No data available. Please check back later.', 'info')
@@ -425,78 +397,243 @@ def index():
         return render_template('error.html')
 
 # New route for user preferences
-@app.route('/preferences', methods=['GET', 'POST'])
+@main.route('/preferences', methods=['GET', 'POST'])
 @login_required
 def preferences():
-    if request.method == 'POST':
-        try:
-            preferences = {
-                'notifications_enabled': request.form.get('notifications_enabled') == 'on',
-                'favorite_team': request.form.get('favorite_team'),
-                'theme': request.form.get('theme', 'light')
-            }
+    try:
+        if request.method == 'POST':
+            favorite_team_id = request.form.get('favorite_team', type=int)
+            theme = request.form.get('theme', 'light')
             
             cnx = get_db_connection()
             cursor = cnx.cursor()
+            try:
+                if favorite_team_id is not None:
+                    cursor.execute("SELECT id FROM teams WHERE id = %s", (favorite_team_id,))
+                    if cursor.fetchone() is None:
+                        favorite_team_id = None
+                save_preferences(
+                    cursor, current_user.id,
+                    request.form.get('notifications_enabled') == 'on',
+                    favorite_team_id,
+                    theme if theme in THEMES else 'light'
+                )
+                cnx.commit()
+            finally:
+                cursor.close()
+                cnx.close()
+            mark_write()
             
-            cursor.execute("""
-                INSERT INTO user_preferences (user_id, preferences)
-                VALUES (%s, %s)
-                ON DUPLICATE KEY UPDATE preferences = %s
-            """, (current_user.id, str(preferences), str(preferences)))
-            
-            cnx.commit()
+            flash('Preferences updated successfully!', 'success')
+            return redirect(url_for('main.preferences'))
+        
+        cnx = get_read_connection()
+        cursor = cnx.cursor(dictionary=True)
+        try:
+            user_preferences = load_preferences(cursor, current_user.id)
+            cursor.execute("SELECT id, name FROM teams ORDER BY name")
+            teams = cursor.fetchall()
+        finally:
             cursor.close()
             cnx.close()
-            
-            flash('Preferences updated successfully!', 'success')
-        except Exception as e:
-            logger.error(f"Error updating preferences: {e}")
-            flash('An error occurred while updating preferences.', 'error')
-            
-    return render_template('preferences.html')
+        
+        return render_template('preferences.html', preferences=user_preferences, teams=teams, themes=THEMES)
+    except Exception as e:
+        logger.error(f"Error updating preferences: {e}")
+        flash('An error occurred while updating preferences.', 'error')
+        return render_template('error.html')
 
 # New route for team statistics
-@app.route('/team/<int:team_id>')
+@main.route('/team/<int:team_id>')
 @cache.cached(timeout=300)
 def team_stats(team_id):
     try:
-        cnx = get_db_connection()
-        cursor = cnx.cursor(dictionary=True)
+        snapshot = current_app.extensions['season_store'].snapshot()
+        team = snapshot.teams.get(team_id)
         
-        # Get team information
-        cursor.execute("""
-            SELECT * FROM teams WHERE id = %s
-        """, (team_id,))
-        team = cursor.fetchone()
+        if not team:
+            flash('Team not found.', 'error')
+            return render_template('error.html'), 404
         
-        # Get team statistics
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_matches,
-                SUM(CASE WHEN (home_team_id = %s AND home_goals > away_goals) 
-                    OR (away_team_id = %s AND away_goals > home_goals) THEN 1 ELSE 0 END) as wins,
-                SUM(CASE WHEN home_goals = away_goals THEN 1 ELSE 0 END) as draws,
-                SUM(CASE WHEN (home_team_id = %s AND home_goals < away_goals) 
-                    OR (away_team_id = %s AND away_goals < home_goals) THEN 1 ELSE 0 END) as losses,
-                SUM(CASE WHEN home_team_id = %s THEN home_goals ELSE away_goals END) as goals_for,
-                SUM(CASE WHEN home_team_id = %s THEN away_goals ELSE home_goals END) as goals_against
-            FROM matches
-            WHERE home_team_id = %s OR away_team_id = %s
-        """, (team_id,) * 8)
-        stats = cursor.fetchone()
+        # Season splits and form are computed from the season store's column arrays
+        seasons = snapshot.team_seasons(team_id)
+        stats = seasons[0] if seasons else None
         
-        cursor.close()
-        cnx.close()
+        # Last ten results with opponents for the form guide
+        recent_form = snapshot.team_recent_form(team_id)
         
-        return render_template('team_stats.html', team=team, stats=stats)
+        return render_template('team_stats.html', team=team, stats=stats,
+                               seasons=seasons, recent_form=recent_form)
     except Exception as e:
         logger.error(f"Error in team_stats route: {e}")
         flash('An error occurred while loading team statistics.', 'error')
         return render_template('error.html')
 
+def load_head_to_head(team_a, team_b):
+    """Return the two teams and their head-to-head record, or None if a team is unknown."""
+    cnx = get_read_connection()
+    cursor = cnx.cursor(dictionary=True)
+    try:
+        # Team names come from the table preloaded before fork when it has both teams
+        teams = current_app.extensions.get('teams', {})
+        if team_a not in teams or team_b not in teams:
+            cursor.execute(TEAMS_BY_ID_QUERY, (team_a, team_b))
+            teams = {row['id']: row for row in cursor.fetchall()}
+        if team_a not in teams or team_b not in teams:
+            return None
+        record = lookup_head_to_head(cursor, team_a, team_b)
+        return teams[team_a], teams[team_b], record
+    finally:
+        cursor.close()
+        cnx.close()
+
+# Head-to-head record between two teams
+@main.route('/h2h/<int:team_a>/<int:team_b>')
+@cache.cached(timeout=300)
+def head_to_head(team_a, team_b):
+    try:
+        result = load_head_to_head(team_a, team_b)
+        if result is None:
+            flash('Team not found.', 'error')
+            return render_template('error.html'), 404
+        home_team, away_team, record = result
+        return render_template('head_to_head.html', team_a=home_team, team_b=away_team, record=record)
+    except Exception as e:
+        logger.error(f"Error in head_to_head route: {e}")
+        flash('An error occurred while loading the head-to-head record.', 'error')
+        return render_template('error.html')
+
+@main.route('/api/v1/h2h/<int:team_a>/<int:team_b>')
+@cache.cached(timeout=300)
+def api_head_to_head(team_a, team_b):
+    try:
+        result = load_head_to_head(team_a, team_b)
+    except Exception as e:
+        logger.error(f"Error in api_head_to_head route: {e}")
+        return jsonify({'error': 'Unable to load head-to-head record'}), 500
+    if result is None:
+        return jsonify({'error': 'Team not found'}), 404
+    team_a_row, team_b_row, record = result
+    record = dict(record, team_a_name=team_a_row['name'], team_b_name=team_b_row['name'])
+    if record['last_match_date']:
+        record['last_match_date'] = record['last_match_date'].isoformat()
+    return jsonify(record)
+
+def standings_args(snapshot):
+    """Read season, matchday and as_of from the query string; as_of is None if unparseable.
+
+    Without a season, as_of picks the season it falls in; otherwise the current one.
+    """
+    season = request.args.get('season') or None
+    matchday = request.args.get('matchday', type=int)
+    as_of = None
+    if request.args.get('as_of'):
+        try:
+            as_of = datetime.date.fromisoformat(request.args['as_of'])
+        except ValueError:
+            as_of = None
+    if not season:
+        season = snapshot.season_at(as_of) if as_of else snapshot.current_season()
+    return season, matchday, as_of
+
+# League table as of any date or matchweek
+@main.route('/standings')
+@cache.cached(timeout=300, query_string=True)
+def standings():
+    try:
+        snapshot = current_app.extensions['season_store'].snapshot()
+        season, matchday, as_of = standings_args(snapshot)
+        table = snapshot.standings(season, as_of=as_of, matchday=matchday)
+        return render_template('standings.html', table=table, season=season, matchday=matchday,
+                               as_of=as_of.isoformat() if as_of else None,
+                               seasons=[str(option) for option in snapshot.seasons[::-1]],
+                               matchdays=snapshot.matchdays(season),
+                               history=snapshot.standings_history(season))
+    except Exception as e:
+        logger.error(f"Error in standings route: {e}")
+        flash('An error occurred while loading the standings.', 'error')
+        return render_template('error.html')
+
+@main.route('/api/v1/standings')
+@cache.cached(timeout=300, query_string=True)
+def api_standings():
+    try:
+        snapshot = current_app.extensions['season_store'].snapshot()
+    except Exception as e:
+        logger.error(f"Error in api_standings route: {e}")
+        return jsonify({'error': 'Unable to load standings'}), 500
+    season, matchday, as_of = standings_args(snapshot)
+    if request.args.get('as_of') and as_of is None:
+        return jsonify({'error': 'as_of must be a YYYY-MM-DD date'}), 400
+    return jsonify({
+        'season': season,
+        'matchday': matchday,
+        'as_of': as_of.isoformat() if as_of else None,
+        'table': snapshot.standings(season, as_of=as_of, matchday=matchday),
+    })
+
+@main.route('/api/v1/standings/history')
+@cache.cached(timeout=300, query_string=True)
+def api_standings_history():
+    try:
+        snapshot = current_app.extensions['season_store'].snapshot()
+    except Exception as e:
+        logger.error(f"Error in api_standings_history route: {e}")
+        return jsonify({'error': 'Unable to load standings'}), 500
+    history = snapshot.standings_history(request.args.get('season'))
+    if history is None:
+        return jsonify({'error': 'Unknown season'}), 404
+    return jsonify(history)
+
+# Player leaderboards
+@main.route('/players')
+@cache.cached(timeout=300, query_string=True)
+def player_leaders():
+    try:
+        cnx = get_read_connection()
+        cursor = cnx.cursor(dictionary=True)
+        season = request.args.get('season') or latest_season(cursor)
+        leaders = {category: leaderboard(cursor, category, season) for category in LEADERBOARDS} if season else {}
+        cursor.close()
+        cnx.close()
+        return render_template('players.html', season=season, leaders=leaders)
+    except Exception as e:
+        logger.error(f"Error in player_leaders route: {e}")
+        flash('An error occurred while loading player statistics.', 'error')
+        return render_template('error.html')
+
+@main.route('/api/v1/leaders/<category>')
+@cache.cached(timeout=300, query_string=True)
+def api_player_leaders(category):
+    if category not in LEADERBOARDS:
+        return jsonify({'error': f'Unknown leaderboard {category}'}), 404
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    try:
+        cnx = get_read_connection()
+        cursor = cnx.cursor(dictionary=True)
+        season = request.args.get('season') or latest_season(cursor)
+        rows = leaderboard(cursor, category, season, limit) if season else []
+        cursor.close()
+        cnx.close()
+    except Exception as e:
+        logger.error(f"Error in api_player_leaders route: {e}")
+        return jsonify({'error': 'Unable to load leaderboard'}), 500
+    return jsonify({'season': season, 'category': category, 'players': rows})
+
+# Bulk export (streamed; memory use does not grow with the table size)
+@main.route('/export/<dataset>.<fmt>')
+@admin_required
+def export_dataset(dataset, fmt):
+    if dataset not in DATASETS or fmt not in FORMATS:
+        return jsonify({'error': f'Unknown export {dataset}.{fmt}'}), 404
+    chunks = export_chunks(dataset, fmt, current_app.config['EXPORT_CHUNK_SIZE'],
+                           current_app.extensions['season_store'].snapshot())
+    return Response(stream_with_context(chunks), mimetype=FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={dataset}.{fmt}',
+                             'X-Accel-Buffering': 'no'})
+
 # Enhanced login route with rate limiting
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 @limiter.limit("5 per minute")
 def login():
     if request.method == 'POST':
@@ -508,7 +645,15 @@ def login():
             
             if user and user.check_password(password):
                 login_user(user)
-                return redirect(url_for('index'))
+                user_cache.put(user)
+                if db.session.is_modified(user):
+                    # check_password upgraded a legacy hash
+                    try:
+                        db.session.commit()
+                    except Exception as e:
+                        logger.error(f"Could not upgrade password hash of user {user.id}: {e}")
+                        db.session.rollback()
+                return redirect(url_for('main.index'))
             else:
                 flash('Invalid username or password', 'error')
         except Exception as e:
@@ -517,8 +662,8 @@ def login():
             
     return render_template('login.html')
 
-@app.route('/update')
-@login_required
+@main.route('/update')
+@admin_required
 def update():
     """Trigger data extraction and update the database."""
     try:
@@ -527,36 +672,27 @@ def update():
     except Exception as e:
         logger.error(f"Error updating matches: {e}")
         flash('An error occurred while updating matches.', 'error')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/predict')
+@main.route('/predict')
 def predict():
     """Display predictions for upcoming matches."""
     try:
         today = datetime.date.today()
-        cnx = get_db_connection()
-        cursor = cnx.cursor(dictionary=True)
+        snapshot = current_app.extensions['season_store'].snapshot()
+        upcoming_matches = snapshot.upcoming_matches(today)
         
-        query = """
-            SELECT m.*, 
-                   ht.name as HomeTeamName, at.name as AwayTeamName,
-                   ht.short_name as HomeTeamShort, at.short_name as AwayTeamShort
-            FROM matches m
-            JOIN teams ht ON m.home_team_id = ht.id
-            JOIN teams at ON m.away_team_id = at.id
-            WHERE m.match_date >= %s 
-            ORDER BY m.match_date ASC
-        """
-        cursor.execute(query, (today,))
-        upcoming_matches = cursor.fetchall()
+        # Current league positions are the prediction features; head-to-heads come from the same arrays
+        ranks = snapshot.ranks()
+        h2h = snapshot.head_to_head([(m['home_team_id'], m['away_team_id']) for m in upcoming_matches])
         
         for match in upcoming_matches:
+            match['HomeTeamRank'] = ranks.get(match['home_team_id'], 0)
+            match['AwayTeamRank'] = ranks.get(match['away_team_id'], 0)
             prediction, confidence = predict_match_outcome(match)
             match['Prediction'] = prediction
             match['Confidence'] = confidence
-            
-        cursor.close()
-        cnx.close()
+            match['H2H'] = h2h[(match['home_team_id'], match['away_team_id'])]
         
         return render_template('predictions.html', matches=upcoming_matches)
     except Exception as e:
@@ -564,7 +700,7 @@ def predict():
         flash('An error occurred while generating predictions.', 'error')
         return render_template('error.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@main.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -574,18 +710,18 @@ def register():
         
         if password != confirm_password:
             flash('Passwords do not match', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
         
         try:
             # Check if username exists
             if User.query.filter_by(username=username).first():
                 flash('Username already exists', 'error')
-                return redirect(url_for('register'))
+                return redirect(url_for('main.register'))
             
             # Check if email exists
             if User.query.filter_by(email=email).first():
                 flash('Email already exists', 'error')
-                return redirect(url_for('register'))
+                return redirect(url_for('main.register'))
             
             # Create new user
             new_user = User(
@@ -597,7 +733,7 @@ def register():
             db.session.commit()
             
             flash('Registration successful! Please login.', 'success')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
             
         except Exception as e:
             logger.error(f"Registration error: {e}")
@@ -606,17 +742,18 @@ def register():
             
     return render_template('register.html')
 
-@app.route('/logout')
+@main.route('/logout')
 @login_required
 def logout():
+    user_cache.invalidate(current_user.id)
     logout_user()
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/profile')
+@main.route('/profile')
 @login_required
 def profile():
     try:
-        cnx = get_db_connection()
+        cnx = get_read_connection()
         cursor = cnx.cursor(dictionary=True)
         
         # Get user's predictions
@@ -645,7 +782,7 @@ def profile():
         flash('An error occurred while loading your profile.', 'error')
         return render_template('error.html')
 
-@app.route('/predictions')
+@main.route('/predictions')
 @login_required
 def predictions():
     # Get upcoming matches that haven't been played yet
@@ -661,25 +798,37 @@ def predictions():
             UserPrediction.user_id == current_user.id
         ).all()
     }
+    # Include predictions still waiting in this worker's write-behind journal
+    journal = current_app.extensions.get('prediction_journal')
+    if journal:
+        user_predictions.update(journal.pending_for(current_user.id))
     
     return render_template('predictions.html', 
                          matches=upcoming_matches,
                          user_predictions=user_predictions)
 
-@app.route('/make_prediction/<int:match_id>', methods=['POST'])
+@main.route('/make_prediction/<int:match_id>', methods=['POST'])
 @login_required
 def make_prediction(match_id):
     prediction = request.form.get('prediction')
     
     if not prediction or prediction not in ['Home Win', 'Draw', 'Away Win']:
         flash('Invalid prediction', 'error')
-        return redirect(url_for('predictions'))
+        return redirect(url_for('main.predictions'))
     
     # Check if match exists and hasn't been played yet
     match = Match.query.get_or_404(match_id)
     if match.result is not None:
         flash('Cannot predict a match that has already been played', 'error')
-        return redirect(url_for('predictions'))
+        return redirect(url_for('main.predictions'))
+    
+    # Write-behind: journal now, the flusher upserts in batches and enforces the kickoff cutoff
+    journal = current_app.extensions.get('prediction_journal')
+    if journal:
+        journal.append(current_user.id, match_id, prediction)
+        mark_write()
+        flash('Your prediction has been saved!', 'success')
+        return redirect(url_for('main.predictions'))
     
     # Check if user already made a prediction for this match
     existing_prediction = UserPrediction.query.filter_by(
@@ -700,8 +849,9 @@ def make_prediction(match_id):
         db.session.add(new_prediction)
     
     db.session.commit()
+    mark_write()
     flash('Your prediction has been saved!', 'success')
-    return redirect(url_for('predictions'))
+    return redirect(url_for('main.predictions'))
 
 def predict_match_outcome(match):
     """
@@ -729,67 +879,198 @@ def predict_match_outcome(match):
         logger.error(f"Error in prediction: {e}")
         return 'Unknown', 0.0
 
-def init_db():
-    """Initialize the database tables."""
+@main.cli.command('init-db')
+def init_db_command():
+    """Apply pending schema migrations, ignoring the cached schema version."""
+    ensure_schema(current_app, force=True)
+
+@main.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute head-to-head records from the full match history."""
+    cnx = get_db_connection()
     try:
-        with app.app_context():
-            # Create all tables
-            db.create_all()
-            
-            # Check if tables exist
-            cnx = get_db_connection()
-            cursor = cnx.cursor()
-            
-            # Check if teams table exists
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS teams (
-                    id INT PRIMARY KEY,
-                    name VARCHAR(80) NOT NULL,
-                    short_name VARCHAR(3) NOT NULL
-                )
-            """)
-            
-            # Check if matches table exists
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS matches (
-                    id INT PRIMARY KEY,
-                    season VARCHAR(9) NOT NULL,
-                    match_date DATE NOT NULL,
-                    home_team_id INT NOT NULL,
-                    away_team_id INT NOT NULL,
-                    home_goals INT DEFAULT 0,
-                    away_goals INT DEFAULT 0,
-                    home_team_rank INT DEFAULT 0,
-                    away_team_rank INT DEFAULT 0,
-                    result VARCHAR(20) NOT NULL DEFAULT 'Scheduled',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (home_team_id) REFERENCES teams(id),
-                    FOREIGN KEY (away_team_id) REFERENCES teams(id)
-                )
-            """)
-            
-            # Check if user_predictions table exists
+        rebuild_head_to_head(cnx)
+        # Matches may have been imported directly; make every season store reload
+        cursor = cnx.cursor()
+        bump_data_version(cursor)
+        cnx.commit()
+        cursor.close()
+    finally:
+        cnx.close()
+
+@main.cli.command('ingest-players')
+@click.option('--dump', type=click.Path(exists=True, file_okay=False),
+              help='Directory with teams.json, scorers.json and matches/<id>.json instead of the API.')
+@click.option('--limit', default=50, help='Maximum number of finished matches to fetch events for.')
+def ingest_players_command(dump, limit):
+    """Ingest squads, scorers and per-match player events."""
+    cnx = get_db_connection()
+    cursor = cnx.cursor()
+    try:
+        if dump:
+            teams, scorers, match_payloads = load_dump(dump)
+        else:
+            # Revalidated in the foreground: ingest must not write a stale payload
+            teams = fetch_api("competitions/PL/teams", background=False)
+            scorers = fetch_api("competitions/PL/scorers", {"limit": 100}, background=False)
+            # Finished matches we have no player rows for yet
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_predictions (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT NOT NULL,
-                    match_id INT NOT NULL,
-                    prediction VARCHAR(10) NOT NULL,
-                    predicted_at DATETIME NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES users(id),
-                    FOREIGN KEY (match_id) REFERENCES matches(id)
-                )
-            """)
-            
-            cnx.commit()
+                SELECT m.id FROM matches m
+                LEFT JOIN player_stats ps ON ps.match_id = m.id
+                WHERE m.result IN ('Home Win', 'Draw', 'Away Win') AND ps.match_id IS NULL
+                ORDER BY m.match_date DESC
+                LIMIT %s
+            """, (limit,))
+            match_ids = [row[0] for row in cursor.fetchall()]
+            match_payloads = []
+            for match_id in match_ids:
+                payload = fetch_api(f"matches/{match_id}", background=False)
+                if payload:
+                    match_payloads.append(payload.get('match', payload))
+                # Stay inside the API rate limit
+                time.sleep(current_app.config['API_RATE_LIMIT_PERIOD'] / current_app.config['API_RATE_LIMIT'])
+        
+        # Fresh transaction holding the ingest lock, so a concurrent run cannot apply the same deltas
+        cnx.commit()
+        lock_ingest(cursor)
+        if teams:
+            ingest_squads(cursor, teams)
+        for payload in match_payloads:
+            ingest_match_events(cursor, payload)
+        if scorers:
+            ingest_scorers(cursor, scorers)
+        cnx.commit()
+        logger.info(f"Ingested player events for {len(match_payloads)} matches")
+    except Exception:
+        cnx.rollback()
+        raise
+    finally:
+        cursor.close()
+        cnx.close()
+
+@main.cli.command('update-matches')
+@click.option('--every', type=int, help='Keep running, updating every this many seconds.')
+def update_matches_command(every):
+    """Fetch matches from the API and ingest the changes (run outside the web workers)."""
+    while True:
+        try:
+            update_matches()
+        except Exception as e:
+            if not every:
+                raise
+            logger.error(f"Error updating matches: {e}")
+        if not every:
+            return
+        time.sleep(every)
+
+@main.cli.command('live-poller')
+def live_poller_command():
+    """Run the live score poller in the foreground (instead of inside a web worker)."""
+    current_app.extensions['live'].poller.run()
+
+@main.cli.command('notify-worker')
+@click.option('--once', is_flag=True, help='Send what is queued now and exit.')
+def notify_worker_command(once):
+    """Send queued result notifications (run outside the web workers)."""
+    worker = create_worker(current_app, get_db_connection)
+    try:
+        if once:
+            while worker.run_once() is not None:
+                pass
+        else:
+            worker.run(current_app.config['NOTIFY_POLL_INTERVAL'])
+    finally:
+        worker.transport.close()
+
+@main.cli.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', type=int, help='Users checked, hashed and inserted together (default USER_IMPORT_CHUNK_SIZE).')
+@click.option('--workers', type=int, help='Hashing processes (default: one per core).')
+def import_users_command(path, chunk_size, workers):
+    """Import users from a CSV of username, email and password or password_hash."""
+    user_import = UserImport(direct_connection, chunk_size or current_app.config['USER_IMPORT_CHUNK_SIZE'], workers)
+    with open(path, newline='', encoding='utf-8') as f:
+        counts = user_import.run(f)
+    logger.info(f"Imported {counts['imported']} users; skipped {counts['existing']} existing, "
+                f"{counts['duplicate']} duplicated in the file and {counts['invalid']} invalid")
+
+@main.cli.command('prune-changes')
+@click.option('--days', type=int, help='Keep this many days of change log (default CHANGES_RETENTION_DAYS).')
+def prune_changes_command(days):
+    """Delete old match change log rows; clients further behind are told to resync."""
+    cnx = get_db_connection()
+    cursor = cnx.cursor()
+    try:
+        removed = prune_changes(cursor, days or current_app.config['CHANGES_RETENTION_DAYS'])
+        cnx.commit()
+        logger.info(f"Pruned {removed} match changes")
+    finally:
+        cursor.close()
+        cnx.close()
+
+@main.cli.command('export')
+@click.argument('dataset', type=click.Choice(sorted(DATASETS)))
+@click.option('--format', 'fmt', type=click.Choice(sorted(FORMATS)), default='csv')
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='Output file (default stdout).')
+def export_command(dataset, fmt, output):
+    """Stream matches, standings or predictions to CSV or Parquet."""
+    snapshot = current_app.extensions['season_store'].snapshot()
+    for chunk in export_chunks(dataset, fmt, current_app.config['EXPORT_CHUNK_SIZE'], snapshot):
+        output.write(chunk)
+
+def preload_shared_state(app):
+    """Load read-only state once in the master so forked workers share it.
+
+    Compiles every template into the Jinja cache and loads the team table
+    and the season store.
+    Uses a plain connection that is closed again, so no socket is inherited
+    by the workers.
+    """
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+    try:
+        cnx = direct_connection()
+        try:
+            cursor = cnx.cursor(dictionary=True)
+            cursor.execute("SELECT id, name, short_name FROM teams")
+            app.extensions['teams'] = {row['id']: row for row in cursor.fetchall()}
             cursor.close()
+        finally:
             cnx.close()
-            
-            logger.info("Database tables initialized successfully")
-    except Exception as e:
-        logger.error(f"Error initializing database: {e}")
-        raise
+        logger.info(f"Preloaded {len(app.extensions['teams'])} teams")
+        # Plain connection here too: a pooled one would leave sockets for the workers to inherit
+        app.extensions['season_store'].refresh(direct_connection)
+    except mysql.connector.Error as err:
+        logger.error(f"Could not preload teams: {err}")
+
+def create_app(config_object=Config):
+    """Application factory."""
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    app.json_encoder = CustomJSONEncoder
+    
+    # Initialize extensions
+    db.init_app(app)
+    login_manager.init_app(app)
+    limiter.init_app(app)
+    cache.init_app(app)
+    user_cache.ttl = app.config['USER_CACHE_TTL']
+    user_cache.max_size = app.config['USER_CACHE_SIZE']
+    
+    app.register_blueprint(main)
+    init_database(app)
+    upstream.init_app(app, FOOTBALL_DATA_API_URL, FOOTBALL_DATA_API_KEY)
+    init_write_behind(app, get_db_connection)
+    init_season_store(app, get_read_connection)
+    init_change_feed(app, get_db_connection)
+    init_profiler(app)
+    init_live(app, fetch_live_matches)
+    
+    if app.config['SCHEMA_CHECK_ON_BOOT']:
+        ensure_schema(app)
+    
+    return app
 
 if __name__ == '__main__':
-    init_db()  # Initialize database tables
+    app = create_app()
     app.run(debug=True, port=5000)
@@ -0,0 +1,351 @@
+"""Async serving mode.
+
+The read-heavy JSON API and the live score stream are served natively on an
+event loop with an aiomysql pool, so thousands of polling or streaming
+clients share a handful of processes and ASYNC_DB_POOL_SIZE connections each.
+Every other path (HTML pages, login, forms) falls through to the regular
+Flask app.
+
+    uvicorn asgi:application --workers 4
+"""
+import asyncio
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from decimal import Decimal
+
+import aiomysql
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import create_app, preload_shared_state, predict_match_outcome
+from change_log import LATEST_CHANGE_QUERY, CHANGE_RANGE_QUERY, CHANGES_SINCE_QUERY, shape_changes
+from config import MYSQL_CONFIG
+from head_to_head import head_to_head_query, orient_rows
+from live import SnapshotFile, diff_states, format_sse
+from players import LEADERBOARDS, LATEST_SEASON_QUERY, SEASON_SOURCE_QUERY, leaderboard_query
+from queries import TEAMS_BY_ID_QUERY
+
+logger = logging.getLogger(__name__)
+
+flask_app = create_app()
+preload_shared_state(flask_app)
+config = flask_app.config
+season_store = flask_app.extensions['season_store']
+
+
+def _json_default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class APIResponse(JSONResponse):
+    """JSON response that understands the Decimal and date values MySQL returns."""
+
+    def render(self, content):
+        return json.dumps(content, default=_json_default, separators=(',', ':')).encode('utf-8')
+
+
+class AsyncTTLCache:
+    """Short-lived result cache that also coalesces concurrent misses into one query."""
+
+    def __init__(self, ttl, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+
+    async def get(self, key, compute):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= now:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+            task = asyncio.ensure_future(compute())
+            task.add_done_callback(lambda done: self._forget_failed(key, done))
+            entry = self._entries[key] = (now + self.ttl, task)
+        # Shielded: a caller cancelled by its client disconnecting must not cancel the others' query
+        return await asyncio.shield(entry[1])
+
+    def _forget_failed(self, key, task):
+        """Drop a failed or cancelled computation so the next caller retries instead of awaiting it."""
+        if task.cancelled() or task.exception() is not None:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is task:
+                del self._entries[key]
+
+
+cache = AsyncTTLCache(config['ASYNC_CACHE_TTL'])
+
+
+async def fetch_all(sql, params=()):
+    async with application.state.pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(sql, params)
+            return await cursor.fetchall()
+
+
+async def fetch_one(sql, params=()):
+    rows = await fetch_all(sql, params)
+    return rows[0] if rows else None
+
+
+async def current_snapshot():
+    """The season store snapshot the Flask pages use; its periodic version check blocks, so it runs off the loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, season_store.snapshot)
+
+
+async def api_matches(request):
+    """Recent matches and the league table (the data behind `/`)."""
+    try:
+        page = max(int(request.query_params.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    per_page = config['ITEMS_PER_PAGE']
+
+    snapshot = await current_snapshot()
+    total_matches = snapshot.match_count()
+    return APIResponse({
+        'matches': snapshot.recent_matches(per_page, (page - 1) * per_page),
+        'league_table': snapshot.league_table(),
+        'total_pages': (total_matches + per_page - 1) // per_page,
+        'current_page': page,
+    })
+
+
+async def api_predictions(request):
+    """Upcoming matches with predictions and head-to-head records (the data behind `/predict`)."""
+    today = datetime.date.today()
+    snapshot = await current_snapshot()
+    upcoming = snapshot.upcoming_matches(today)
+    # Current league positions are the prediction features, as in the Flask view
+    ranks = snapshot.ranks()
+    h2h = snapshot.head_to_head([(m['home_team_id'], m['away_team_id']) for m in upcoming])
+    for match in upcoming:
+        match['HomeTeamRank'] = ranks.get(match['home_team_id'], 0)
+        match['AwayTeamRank'] = ranks.get(match['away_team_id'], 0)
+        match['Prediction'], match['Confidence'] = predict_match_outcome(match)
+        match['H2H'] = h2h[(match['home_team_id'], match['away_team_id'])]
+    return APIResponse({'matches': upcoming})
+
+
+async def api_team(request):
+    """Team summary, season splits and recent form (the data behind `/team/<id>`)."""
+    team_id = request.path_params['team_id']
+    snapshot = await current_snapshot()
+    team = snapshot.teams.get(team_id)
+    if team is None:
+        return APIResponse({'error': 'Team not found'}, status_code=404)
+    seasons = snapshot.team_seasons(team_id)
+    return APIResponse({'team': team, 'stats': seasons[0] if seasons else None,
+                        'seasons': seasons, 'recent_form': snapshot.team_recent_form(team_id)})
+
+
+async def api_head_to_head(request):
+    team_a = request.path_params['team_a']
+    team_b = request.path_params['team_b']
+
+    async def load():
+        teams = {row['id']: row for row in await fetch_all(TEAMS_BY_ID_QUERY, (team_a, team_b))}
+        if team_a not in teams or team_b not in teams:
+            return None
+        sql, params = head_to_head_query([(team_a, team_b)])
+        record = orient_rows(await fetch_all(sql, params), [(team_a, team_b)])[(team_a, team_b)]
+        return dict(record, team_a_name=teams[team_a]['name'], team_b_name=teams[team_b]['name'])
+
+    record = await cache.get(('h2h', team_a, team_b), load)
+    if record is None:
+        return APIResponse({'error': 'Team not found'}, status_code=404)
+    return APIResponse(record)
+
+
+async def api_player_leaders(request):
+    category = request.path_params['category']
+    if category not in LEADERBOARDS:
+        return APIResponse({'error': f'Unknown leaderboard {category}'}, status_code=404)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+    except ValueError:
+        limit = 20
+    season = request.query_params.get('season')
+
+    async def load():
+        chosen = season
+        if not chosen:
+            row = await fetch_one(LATEST_SEASON_QUERY)
+            chosen = row['season'] if row else None
+        if not chosen:
+            return {'season': None, 'category': category, 'players': []}
+        if category == 'discipline':
+            source = 'events'
+        else:
+            coverage = await fetch_one(SEASON_SOURCE_QUERY, (chosen, chosen))
+            source = 'events' if coverage['complete'] else 'feed'
+        players = await fetch_all(*leaderboard_query(category, chosen, limit, source))
+        return {'season': chosen, 'category': category, 'players': players}
+
+    return APIResponse(await cache.get(('leaders', category, season, limit), load))
+
+
+class AsyncChangeFeed:
+    """Event-loop twin of change_log.ChangeFeed: one watcher task per process for all long-polls."""
+
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self.latest = None
+        self._changed = asyncio.Event()
+
+    async def run(self):
+        while True:
+            try:
+                row = await fetch_one(LATEST_CHANGE_QUERY)
+            except Exception as e:
+                logger.error(f"Error checking change log: {e}")
+            else:
+                if row['version'] != self.latest:
+                    self.latest = row['version']
+                    # Wake everyone waiting on the old event; new waiters get a fresh one
+                    changed, self._changed = self._changed, asyncio.Event()
+                    changed.set()
+            await asyncio.sleep(self.check_interval)
+
+    async def wait(self, since, timeout):
+        deadline = asyncio.get_running_loop().time() + timeout
+        while self.latest is None or self.latest <= since:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+
+changes = AsyncChangeFeed(config['CHANGES_CHECK_INTERVAL'])
+
+
+async def api_changes(request):
+    """Match changes after ?since=<version>, long-polled for up to ?wait= seconds."""
+    try:
+        since = max(int(request.query_params.get('since', 0)), 0)
+        wait = min(max(float(request.query_params.get('wait', 0)), 0), config['CHANGES_MAX_WAIT'])
+        limit = min(max(int(request.query_params.get('limit', 500)), 1), 1000)
+    except ValueError:
+        return APIResponse({'error': 'since, wait and limit must be numbers'}, status_code=400)
+    if wait:
+        await changes.wait(since, wait)
+    bounds = await fetch_one(CHANGE_RANGE_QUERY)
+    rows = await fetch_all(CHANGES_SINCE_QUERY, (since, limit))
+    return APIResponse(shape_changes(rows, since, bounds['oldest'], bounds['latest'], limit))
+
+
+class AsyncLiveBroadcaster:
+    """Event-loop twin of live.LiveBroadcaster: one watcher task per process."""
+
+    def __init__(self, snapshot, check_interval=1.0, queue_size=100):
+        self.snapshot = snapshot
+        self.check_interval = check_interval
+        self.queue_size = queue_size
+        self.state = snapshot.read()
+        self._mtime = snapshot.mtime()
+        self._subscribers = set()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            mtime = self.snapshot.mtime()
+            if mtime is None or mtime == self._mtime:
+                continue
+            self._mtime = mtime
+            new_state = self.snapshot.read()
+            changed = diff_states(self.state['matches'], new_state['matches'])
+            self.state = new_state
+            if not changed:
+                continue
+            event = {'version': new_state['version'], 'matches': changed}
+            for subscriber in list(self._subscribers):
+                try:
+                    subscriber.put_nowait(event)
+                except asyncio.QueueFull:
+                    self._subscribers.discard(subscriber)
+
+    async def stream(self, keepalive=15):
+        subscriber = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(subscriber)
+        try:
+            yield format_sse('snapshot', self.state['matches'], self.state['version'])
+            while subscriber in self._subscribers:
+                try:
+                    event = await asyncio.wait_for(subscriber.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse('scores', event['matches'], event['version'])
+        finally:
+            self._subscribers.discard(subscriber)
+
+
+live = AsyncLiveBroadcaster(SnapshotFile(os.path.join(config['LIVE_STATE_DIR'], 'live.json')))
+
+
+async def live_stream(request):
+    return StreamingResponse(live.stream(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def api_live(request):
+    return APIResponse(live.state)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.pool = await aiomysql.create_pool(
+        host=MYSQL_CONFIG['host'],
+        user=MYSQL_CONFIG['user'],
+        password=MYSQL_CONFIG['password'],
+        db=MYSQL_CONFIG['database'],
+        minsize=1,
+        maxsize=config['ASYNC_DB_POOL_SIZE'],
+        autocommit=True,
+        connect_timeout=10,
+    )
+    watcher = asyncio.ensure_future(live.run())
+    change_watcher = asyncio.ensure_future(changes.run())
+    # The poller is shared with WSGI mode; the file lock keeps it to one per host
+    threading.Thread(target=flask_app.extensions['live'].poller.run, name='live-poller', daemon=True).start()
+    logger.info(f"Async API ready (pool size {config['ASYNC_DB_POOL_SIZE']})")
+    try:
+        yield
+    finally:
+        watcher.cancel()
+        change_watcher.cancel()
+        app.state.pool.close()
+        await app.state.pool.wait_closed()
+
+
+application = Starlette(
+    routes=[
+        Route('/api/v1/matches', api_matches),
+        Route('/api/v1/predictions', api_predictions),
+        Route('/api/v1/teams/{team_id:int}', api_team),
+        Route('/api/v1/h2h/{team_a:int}/{team_b:int}', api_head_to_head),
+        Route('/api/v1/leaders/{category}', api_player_leaders),
+        Route('/api/v1/live', api_live),
+        Route('/api/v1/changes', api_changes),
+        Route('/live/stream', live_stream),
+        # Everything else is served by the Flask app in a thread pool
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,199 @@
+"""Change log of match updates for delta sync.
+
+`update_matches` appends one `match_changes` row per match that really
+changed, holding only the fields that differ. Versions are the AUTO_INCREMENT
+key; because the rows are written after the data_version bump in the same
+transaction, ingest transactions are serialized on that row lock and
+versions become visible in order, so `version > since` never skips a row.
+
+Clients call /api/v1/changes?since=<version>&wait=<seconds>. A long-poll
+waits on a per-process ChangeFeed that checks MAX(version) once a second for
+all waiting clients together, so idle polls cost about one index lookup per
+worker per second rather than a query per client. Under WSGI each waiter
+holds a thread, so at most CHANGES_MAX_WAITERS wait per process and the
+rest are answered immediately.
+"""
+import datetime
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MATCH_CHANGES_DDL = """
+    CREATE TABLE IF NOT EXISTS match_changes (
+        version BIGINT AUTO_INCREMENT PRIMARY KEY,
+        match_id INT NOT NULL,
+        fields JSON NOT NULL,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        KEY idx_match_changes_changed_at (changed_at)
+    )
+"""
+
+LATEST_CHANGE_QUERY = "SELECT COALESCE(MAX(version), 0) as version FROM match_changes"
+
+CHANGE_RANGE_QUERY = """
+    SELECT COALESCE(MIN(version), 0) as oldest, COALESCE(MAX(version), 0) as latest
+    FROM match_changes
+"""
+
+# Pruning always keeps the newest row, so the range above never collapses to
+# 0 and AUTO_INCREMENT cannot restart below versions clients already hold
+PRUNE_CHANGES_QUERY = """
+    DELETE FROM match_changes
+    WHERE changed_at < NOW() - INTERVAL %s DAY
+      AND version < (SELECT latest FROM (SELECT MAX(version) AS latest FROM match_changes) AS newest)
+"""
+
+CHANGES_SINCE_QUERY = """
+    SELECT version, match_id, fields, changed_at
+    FROM match_changes
+    WHERE version > %s
+    ORDER BY version
+    LIMIT %s
+"""
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def changed_fields(previous, current):
+    """The fields of current that differ from previous (all of them for a new match)."""
+    return {
+        field: _json_value(value) for field, value in current.items()
+        if field != 'id' and (previous is None or previous.get(field) != value)
+    }
+
+
+def record_changes(cursor, changes):
+    """Append a change log row per (previous, current) pair; call after bump_data_version."""
+    rows = [(current['id'], json.dumps(changed_fields(previous, current))) for previous, current in changes]
+    if rows:
+        cursor.executemany("INSERT INTO match_changes (match_id, fields) VALUES (%s, %s)", rows)
+
+
+def shape_changes(rows, since, oldest, latest, limit):
+    """Build the response body for a page of change log rows; oldest..latest is the retained range."""
+    changes = []
+    for row in rows:
+        fields = row['fields']
+        changes.append({
+            'version': row['version'],
+            'match_id': row['match_id'],
+            'fields': json.loads(fields) if isinstance(fields, (str, bytes)) else fields,
+            'changed_at': _json_value(row['changed_at']),
+        })
+    return {
+        'since': since,
+        'version': changes[-1]['version'] if changes else since,
+        'changes': changes,
+        'more': len(changes) == limit,
+        # The client's version is not in the retained range (pruned past it, or from
+        # another database): it has to refetch everything
+        'reset': since > 0 and not oldest - 1 <= since <= latest,
+    }
+
+
+def changes_since(cursor, since, limit):
+    """Changes after version `since`, oldest first."""
+    cursor.execute(CHANGE_RANGE_QUERY)
+    bounds = cursor.fetchone()
+    cursor.execute(CHANGES_SINCE_QUERY, (since, limit))
+    return shape_changes(cursor.fetchall(), since, bounds['oldest'], bounds['latest'], limit)
+
+
+def prune_changes(cursor, days):
+    """Drop change log rows older than `days`, except the newest; returns the number removed."""
+    cursor.execute(PRUNE_CHANGES_QUERY, (days,))
+    return cursor.rowcount
+
+
+class ChangeFeed:
+    """Per-process watcher of the latest change version, for long-polling requests."""
+
+    def __init__(self, connect, check_interval=1.0):
+        self.connect = connect
+        self.check_interval = check_interval
+        self.latest = None
+        self._checked_at = 0
+        self._condition = threading.Condition()
+        self._waiters = 0
+        self._started = False
+
+    def ensure_started(self):
+        """Start the watcher thread on first use, i.e. after fork."""
+        with self._condition:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._watch, name='change-feed', daemon=True).start()
+
+    def _read_latest(self):
+        cnx = self.connect()
+        cursor = cnx.cursor(dictionary=True)
+        try:
+            cursor.execute(LATEST_CHANGE_QUERY)
+            return cursor.fetchone()['version']
+        finally:
+            cursor.close()
+            cnx.close()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.check_interval)
+            with self._condition:
+                if not self._waiters:
+                    continue
+            try:
+                latest = self._read_latest()
+            except Exception as e:
+                logger.error(f"Error checking change log: {e}")
+                continue
+            with self._condition:
+                self._checked_at = time.monotonic()
+                if latest != self.latest:
+                    self.latest = latest
+                    self._condition.notify_all()
+
+    def wait(self, since, timeout, limit=None):
+        """Block until a version after `since` exists or timeout passes; returns whether one does.
+
+        With `limit` requests already waiting in this process it returns False
+        at once, so the caller answers right away (as for wait=0): under a
+        threaded WSGI server every waiter holds a worker thread.
+        """
+        self.ensure_started()
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            if limit is not None and self._waiters >= limit:
+                return False
+            self._waiters += 1
+            try:
+                stale = time.monotonic() - self._checked_at >= self.check_interval
+                if self.latest is None or (self.latest <= since and stale):
+                    # The watcher only reads while someone waits, so the cached version may be old
+                    self._condition.release()
+                    try:
+                        latest = self._read_latest()
+                    finally:
+                        self._condition.acquire()
+                    self.latest = max(self.latest or 0, latest)
+                    self._checked_at = time.monotonic()
+                while self.latest <= since:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+                return True
+            finally:
+                self._waiters -= 1
+
+
+def init_change_feed(app, connect):
+    """Create the per-process change feed; its thread starts with the first long-poll."""
+    app.extensions['changes'] = ChangeFeed(connect, app.config['CHANGES_CHECK_INTERVAL'])
+    return app.extensions['changes']
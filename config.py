@@ -35,6 +35,15 @@ class Config:
         'pool_pre_ping': True
     }
     
+    # Read replicas: comma-separated host[:port][/database], empty to read from the primary
+    MYSQL_REPLICAS = os.getenv('MYSQL_REPLICAS', '')
+    REPLICA_MAX_LAG = int(os.getenv('REPLICA_MAX_LAG', '5'))  # seconds behind before falling back
+    REPLICA_CHECK_INTERVAL = 10  # seconds between replica health checks per worker
+    READ_YOUR_WRITES_WINDOW = 30  # seconds a user's reads stay on the primary after a write
+    
+    # Check the schema version at startup (cached per host, see schema.py)
+    SCHEMA_CHECK_ON_BOOT = os.getenv('SCHEMA_CHECK_ON_BOOT', 'true').lower() == 'true'
+    
     # Rate limiting
     RATELIMIT_ENABLED = True
     RATELIMIT_STORAGE_URL = "memory://"
@@ -45,9 +54,80 @@ class Config:
     CACHE_TYPE = "SimpleCache"
     CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes
     
+    # Logged-in user identity cache
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '60'))  # seconds
+    USER_CACHE_SIZE = 10000
+
     # Pagination
     ITEMS_PER_PAGE = 10
     
     # API rate limiting
     API_RATE_LIMIT = 10  # requests per minute
     API_RATE_LIMIT_PERIOD = 60  # seconds
+
+    # Live scores
+    LIVE_POLL_INTERVAL = int(os.getenv('LIVE_POLL_INTERVAL', '5'))  # seconds while matches are in play
+    LIVE_IDLE_INTERVAL = 60  # seconds when nothing is in play
+    LIVE_API_SHARE = 0.5  # fraction of API_RATE_LIMIT the live poller may use
+    LIVE_STATE_DIR = os.getenv('LIVE_STATE_DIR', 'live_state')
+    # SSE streams per WSGI worker process; each holds a thread, so keep it below WEB_THREADS
+    # (raise it for gevent/eventlet workers; asgi.py has no cap)
+    LIVE_MAX_STREAMS = int(os.getenv('LIVE_MAX_STREAMS', '1'))
+
+    # Async serving mode (asgi.py)
+    ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', '10'))  # connections per process
+    ASYNC_CACHE_TTL = 5  # seconds the async API reuses a query result
+
+    # Admin access (profiler, operational pages)
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+    ADMIN_USERS = [u for u in os.getenv('ADMIN_USERS', '').split(',') if u]
+
+    # Match change log and delta sync (change_log.py)
+    CHANGES_CHECK_INTERVAL = 1.0  # seconds between change log checks while clients long-poll
+    CHANGES_MAX_WAIT = 30  # longest long-poll, seconds
+    # Long-polls each WSGI process holds open at once (each holds a thread; asgi.py has no cap)
+    CHANGES_MAX_WAITERS = int(os.getenv('CHANGES_MAX_WAITERS', '1'))
+    CHANGES_RETENTION_DAYS = int(os.getenv('CHANGES_RETENTION_DAYS', '30'))
+    
+    # In-process season store (season_store.py)
+    SEASON_STORE_CHECK_INTERVAL = int(os.getenv('SEASON_STORE_CHECK_INTERVAL', '5'))  # seconds between data version checks
+    
+    # Upstream API response cache (upstream_cache.py)
+    UPSTREAM_CACHE_DIR = os.getenv('UPSTREAM_CACHE_DIR', 'upstream_cache')
+    UPSTREAM_CACHE_TTL = int(os.getenv('UPSTREAM_CACHE_TTL', '300'))  # seconds before a response is revalidated
+    UPSTREAM_NEGATIVE_TTL = 30  # seconds a failed request is not retried
+    UPSTREAM_TIMEOUT = 10  # seconds per API request
+    UPSTREAM_BREAKER_THRESHOLD = 3  # consecutive failures that open the circuit
+    UPSTREAM_BREAKER_COOLDOWN = 60  # seconds the circuit stays open
+    
+    # Result notifications (notifications.py, flask notify-worker)
+    MAIL_SERVER = os.getenv('MAIL_SERVER', 'localhost')
+    MAIL_PORT = int(os.getenv('MAIL_PORT', '25'))
+    MAIL_USERNAME = os.getenv('MAIL_USERNAME', '')
+    MAIL_PASSWORD = os.getenv('MAIL_PASSWORD', '')
+    MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'false').lower() == 'true'
+    MAIL_FROM = os.getenv('MAIL_FROM', 'Premier League Tracker <noreply@localhost>')
+    NOTIFY_POOL_SIZE = int(os.getenv('NOTIFY_POOL_SIZE', '8'))  # SMTP connections
+    NOTIFY_RATE = float(os.getenv('NOTIFY_RATE', '200'))  # messages per second, 0 for no limit
+    NOTIFY_BATCH_SIZE = 1000  # recipient rows selected, rendered and sent per round
+    NOTIFY_CLAIM_SIZE = 20  # matches a worker takes on at once
+    NOTIFY_CLAIM_TIMEOUT = 600  # seconds before a stalled worker's jobs are taken over
+    NOTIFY_POLL_INTERVAL = 10  # seconds between queue checks when idle
+    
+    # Bulk user import (user_import.py, flask import-users)
+    USER_IMPORT_CHUNK_SIZE = int(os.getenv('USER_IMPORT_CHUNK_SIZE', '1000'))  # users per lookup, hash batch and INSERT
+    
+    # Write-behind prediction journal (write_behind.py)
+    WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+    WRITE_BEHIND_DIR = os.getenv('WRITE_BEHIND_DIR', 'journal')
+    WRITE_BEHIND_INTERVAL = 0.25  # seconds between batched flushes
+    
+    # Bulk export (export.py)
+    EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '5000'))  # rows fetched and written per chunk
+
+    # Request profiling
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'false').lower() == 'true'
+    PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', '0'))  # fraction of requests
+    PROFILER_INTERVAL = 0.005  # seconds between stack samples
+    PROFILER_DIR = os.getenv('PROFILER_DIR', 'profiles')
+    PROFILER_KEEP = 50  # number of profiles kept on disk
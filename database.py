@@ -0,0 +1,222 @@
+"""MySQL connections: the primary plus optional read replicas.
+
+Writes and anything that must see them go through get_db_connection() (the
+primary). Read-only route queries use get_read_connection(), which picks a
+healthy replica round-robin and falls back to the primary when:
+
+- no replicas are configured (MYSQL_REPLICAS is empty),
+- the user wrote something in the last READ_YOUR_WRITES_WINDOW seconds
+  (see mark_write), or
+- every replica is unreachable or more than REPLICA_MAX_LAG seconds behind.
+"""
+import itertools
+import logging
+import threading
+import time
+import mysql.connector
+from flask import current_app, has_request_context, session
+from config import MYSQL_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Enhanced database connection with connection pooling
+def get_db_connection():
+    """Get a database connection with connection pooling."""
+    try:
+        # Add connection pooling configuration
+        config = MYSQL_CONFIG.copy()
+        config.update({
+            'pool_name': 'mypool',
+            'pool_size': 5,
+            'pool_reset_session': True,
+            'connect_timeout': 10,  # Add timeout to prevent hanging
+            'use_pure': True  # Use pure Python implementation for better compatibility
+        })
+
+        # Try to connect to the database
+        logger.info(f"Attempting to connect to database at {config['host']}")
+        cnx = mysql.connector.connect(**config)
+
+        # Test the connection
+        cursor = cnx.cursor()
+        cursor.execute('SELECT 1')
+        result = cursor.fetchone()
+        cursor.close()
+
+        if result and result[0] == 1:
+            logger.info("Database connection test successful")
+            return cnx
+        else:
+            logger.error("Database connection test failed")
+            raise mysql.connector.Error("Connection test failed")
+
+    except mysql.connector.Error as err:
+        logger.error(f"Database connection error: {err}")
+        if err.errno == mysql.connector.errorcode.ER_ACCESS_DENIED_ERROR:
+            logger.error("Access denied: Check your username and password")
+        elif err.errno == mysql.connector.errorcode.ER_BAD_DB_ERROR:
+            logger.error("Database does not exist")
+        elif err.errno == mysql.connector.errorcode.ER_CON_COUNT_ERROR:
+            logger.error("Too many connections")
+        elif err.errno == mysql.connector.errorcode.ER_CONNECTION_ERROR:
+            logger.error("Connection error: Check if MySQL server is running")
+        else:
+            logger.error(f"Error {err.errno}: {err.msg}")
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error connecting to database: {e}")
+        raise
+
+
+def parse_replicas(spec):
+    """Turn 'host[:port][/database],...' into connection configs based on MYSQL_CONFIG."""
+    replicas = []
+    for entry in (part.strip() for part in spec.split(',')):
+        if not entry:
+            continue
+        config = MYSQL_CONFIG.copy()
+        config.pop('pool_size', None)
+        address, _, database = entry.partition('/')
+        host, _, port = address.partition(':')
+        config['host'] = host
+        if port:
+            config['port'] = int(port)
+        if database:
+            config['database'] = database
+        replicas.append(config)
+    return replicas
+
+
+def replica_lag(cnx):
+    """Seconds the replica is behind its source; 0 for a standalone server, None if replication is stopped."""
+    cursor = cnx.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except mysql.connector.Error as err:
+            if err.errno != mysql.connector.errorcode.ER_PARSE_ERROR:
+                raise
+            # MySQL before 8.0.22 and MariaDB only know the old name
+            cursor.execute("SHOW SLAVE STATUS")
+        row = cursor.fetchone()
+        if row is None:
+            return 0
+        return row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+    finally:
+        cursor.close()
+
+
+class ReplicaRouter:
+    """Round-robin over replicas, skipping ones that lag or fail.
+
+    Each replica's health is checked at most every check_interval seconds
+    per worker, on the connection that is about to be handed out.
+    """
+
+    def __init__(self):
+        self.replicas = []
+        self.max_lag = 5
+        self.check_interval = 10
+        self.pool_size = 5
+        self._checked = {}
+        self._healthy = {}
+        self._order = itertools.cycle([])
+        self._lock = threading.Lock()
+
+    def configure(self, replicas, max_lag, check_interval, pool_size):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.pool_size = pool_size
+        self._checked = {}
+        self._healthy = {}
+        self._order = itertools.cycle(range(len(replicas)))
+
+    def _mark(self, index, healthy):
+        self._checked[index] = time.monotonic()
+        if self._healthy.get(index, True) != healthy:
+            state = 'healthy' if healthy else 'unavailable'
+            logger.warning(f"Read replica {self.replicas[index]['host']} is {state}")
+        self._healthy[index] = healthy
+
+    def _connect(self, index):
+        config = self.replicas[index].copy()
+        config.update({
+            'pool_name': f'replica{index}',
+            'pool_size': self.pool_size,
+            'pool_reset_session': True,
+            'connect_timeout': 3,
+            'use_pure': True
+        })
+        return mysql.connector.connect(**config)
+
+    def connection(self):
+        """Return a connection to a healthy replica, or None if there is none."""
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                index = next(self._order)
+            stale = now - self._checked.get(index, 0) >= self.check_interval
+            if not stale and not self._healthy.get(index, True):
+                continue
+            try:
+                cnx = self._connect(index)
+            except mysql.connector.errors.PoolError:
+                # Busy rather than broken: try the next replica without marking this one down
+                continue
+            except mysql.connector.Error as err:
+                logger.error(f"Read replica {self.replicas[index]['host']} connection error: {err}")
+                self._mark(index, False)
+                continue
+            if stale:
+                try:
+                    lag = replica_lag(cnx)
+                except mysql.connector.Error as err:
+                    if err.errno == mysql.connector.errorcode.ER_SPECIFIC_ACCESS_DENIED_ERROR:
+                        # A configuration problem, not an outage: the replica is fine but unusable
+                        logger.error(f"MySQL user {self.replicas[index]['user']} lacks REPLICATION CLIENT "
+                                     f"on read replica {self.replicas[index]['host']}; reads stay on the "
+                                     f"primary until it is granted")
+                    else:
+                        logger.error(f"Could not check replica {self.replicas[index]['host']}: {err}")
+                    lag = None
+                healthy = lag is not None and lag <= self.max_lag
+                self._mark(index, healthy)
+                if not healthy:
+                    cnx.close()
+                    continue
+            return cnx
+        return None
+
+
+replica_router = ReplicaRouter()
+
+
+def init_database(app):
+    """Configure replica routing from the app config."""
+    replica_router.configure(
+        parse_replicas(app.config['MYSQL_REPLICAS']),
+        app.config['REPLICA_MAX_LAG'],
+        app.config['REPLICA_CHECK_INTERVAL'],
+        MYSQL_CONFIG.get('pool_size', 5),
+    )
+    if replica_router.replicas:
+        logger.info(f"Routing reads to {len(replica_router.replicas)} replica(s)")
+
+
+def mark_write(window=None):
+    """Pin this user's reads to the primary for a while so they see their own write."""
+    if window is None:
+        window = current_app.config['READ_YOUR_WRITES_WINDOW']
+    session['read_primary_until'] = time.time() + window
+
+
+def get_read_connection():
+    """Get a connection for read-only queries: a replica when one can serve, else the primary."""
+    if replica_router.replicas:
+        sticky = has_request_context() and session.get('read_primary_until', 0) > time.time()
+        if not sticky:
+            cnx = replica_router.connection()
+            if cnx is not None:
+                return cnx
+    return get_db_connection()
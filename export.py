@@ -0,0 +1,225 @@
+"""Streaming bulk export of matches, standings and predictions.
+
+Rows are read through an unbuffered cursor on a dedicated connection and
+written out chunk by chunk, so memory use stays flat however many rows are
+exported. Plain SELECTs on InnoDB are non-locking consistent reads, and the
+session is READ ONLY / READ COMMITTED, so an export never holds row locks
+or blocks ingest. Standings come from the season store instead, so they
+match the tables the site shows.
+"""
+import csv
+import datetime
+import io
+import logging
+from decimal import Decimal
+from mysql.connector import FieldType
+from schema import direct_connection
+
+logger = logging.getLogger(__name__)
+
+STANDINGS_COLUMNS = [
+    ('season', FieldType.VAR_STRING), ('team_rank', FieldType.LONG), ('team_id', FieldType.LONG),
+    ('name', FieldType.VAR_STRING), ('short_name', FieldType.VAR_STRING),
+    ('Played', FieldType.LONG), ('Won', FieldType.LONG), ('Drawn', FieldType.LONG), ('Lost', FieldType.LONG),
+    ('GoalsFor', FieldType.LONG), ('GoalsAgainst', FieldType.LONG), ('Points', FieldType.LONG),
+]
+
+
+def standings_rows(snapshot):
+    """Every season's current table from a season store snapshot, oldest season first."""
+    rows = []
+    for season in (str(season) for season in snapshot.seasons):
+        for team in snapshot.league_table(season):
+            rows.append(tuple(season if name == 'season' else team[name] for name, _ in STANDINGS_COLUMNS))
+    return STANDINGS_COLUMNS, rows
+
+
+# SQL streamed from the database, or a function building (description, rows) from a season snapshot
+DATASETS = {
+    'matches': """
+        SELECT m.id, m.season, m.match_date, m.home_team_id, ht.name as home_team,
+               m.away_team_id, at.name as away_team, m.home_goals, m.away_goals, m.result
+        FROM matches m
+        JOIN teams ht ON m.home_team_id = ht.id
+        JOIN teams at ON m.away_team_id = at.id
+        ORDER BY m.match_date, m.id
+    """,
+    'standings': standings_rows,
+    'predictions': """
+        SELECT p.id, p.user_id, p.match_id, p.prediction, p.predicted_at,
+               m.season, m.match_date, m.home_team_id, m.away_team_id,
+               m.home_goals, m.away_goals, m.result,
+               CASE WHEN m.result IN ('Home Win', 'Draw', 'Away Win')
+                    THEN p.prediction = m.result END as correct
+        FROM user_predictions p
+        JOIN matches m ON p.match_id = m.id
+        ORDER BY p.id
+    """,
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+INTEGER_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.INT24, FieldType.LONG, FieldType.LONGLONG,
+                 FieldType.YEAR}
+FLOAT_TYPES = {FieldType.DECIMAL, FieldType.NEWDECIMAL, FieldType.FLOAT, FieldType.DOUBLE}
+DATETIME_TYPES = {FieldType.DATETIME, FieldType.TIMESTAMP}
+
+
+def stream_snapshot_rows(dataset, snapshot, chunk_size=5000):
+    """Like stream_rows, for the datasets built from the season store."""
+    description, rows = DATASETS[dataset](snapshot)
+    yield description
+    for start in range(0, len(rows), chunk_size):
+        yield rows[start:start + chunk_size]
+    logger.info(f"Exported {len(rows)} {dataset} rows")
+
+
+def stream_rows(dataset, chunk_size=5000):
+    """Yield the column descriptions, then lists of up to chunk_size rows."""
+    cnx = direct_connection()
+    cursor = None
+    try:
+        setup = cnx.cursor()
+        setup.execute("SET SESSION TRANSACTION ISOLATION LEVEL READ COMMITTED")
+        setup.execute("SET SESSION TRANSACTION READ ONLY")
+        # Give slow consumers time before the server drops the stream
+        setup.execute("SET SESSION net_write_timeout = 600")
+        setup.close()
+
+        cursor = cnx.cursor(buffered=False)
+        cursor.execute(DATASETS[dataset])
+        yield cursor.description
+        total = 0
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            total += len(rows)
+            yield rows
+        logger.info(f"Exported {total} {dataset} rows")
+    finally:
+        if cursor:
+            cursor.close()
+        cnx.close()
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(stream):
+    """Encode a stream_rows() generator as CSV, one bytes chunk per row chunk."""
+    description = next(stream)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column[0] for column in description])
+    for rows in stream:
+        writer.writerows([[_csv_value(value) for value in row] for row in rows])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _arrow_schema(pa, description):
+    fields = []
+    for name, field_type, *_ in description:
+        if field_type in INTEGER_TYPES:
+            arrow_type = pa.int64()
+        elif field_type in FLOAT_TYPES:
+            arrow_type = pa.float64()
+        elif field_type == FieldType.DATE:
+            arrow_type = pa.date32()
+        elif field_type in DATETIME_TYPES:
+            arrow_type = pa.timestamp('us')
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def _arrow_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8')
+    return value
+
+
+class _ChunkSink:
+    """Write-only file object that hands back what was written since the last drain.
+
+    The Parquet footer records absolute row group offsets, so tell() keeps
+    counting across drains instead of restarting like a truncated BytesIO.
+    """
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def parquet_chunks(stream):
+    """Encode a stream_rows() generator as Parquet, one row group per row chunk."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    description = next(stream)
+    schema = _arrow_schema(pa, description)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+    try:
+        for rows in stream:
+            columns = list(zip(*rows))
+            arrays = [pa.array([_arrow_value(v) for v in column], type=field.type)
+                      for column, field in zip(columns, schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        # Closing writes the footer, which has to follow the last row group
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(dataset, fmt, chunk_size=5000, snapshot=None):
+    """Return a generator of encoded bytes for dataset in the given format.
+
+    Datasets built from the season store need the caller's snapshot.
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset {dataset}")
+    encoder = {'csv': csv_chunks, 'parquet': parquet_chunks}.get(fmt)
+    if encoder is None:
+        raise ValueError(f"Unknown export format {fmt}")
+    if callable(DATASETS[dataset]):
+        return encoder(stream_snapshot_rows(dataset, snapshot, chunk_size))
+    return encoder(stream_rows(dataset, chunk_size))
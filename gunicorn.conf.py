@@ -0,0 +1,19 @@
+# Gunicorn configuration: gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('WEB_THREADS', '4'))
+
+# Import the app once in the master and fork workers from it
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Engine connections must never be shared across processes
+    from models import db
+    from wsgi import app
+    with app.app_context():
+        db.engine.dispose()
@@ -0,0 +1,183 @@
+"""Head-to-head records maintained at ingest time.
+
+Each pair of clubs has a single `head_to_head` row keyed by the normalized
+(lower id, higher id) pair, mirroring HeadToHead in premier_league_stats.sql.
+Results are folded in as they arrive, so reading a pairing is one primary
+key lookup no matter how many seasons of history there are.
+"""
+import logging
+from collections import defaultdict
+from stats_engine import is_finished
+
+logger = logging.getLogger(__name__)
+
+HEAD_TO_HEAD_DDL = """
+    CREATE TABLE IF NOT EXISTS head_to_head (
+        team1_id INT NOT NULL,
+        team2_id INT NOT NULL,
+        team1_wins INT NOT NULL DEFAULT 0,
+        team2_wins INT NOT NULL DEFAULT 0,
+        draws INT NOT NULL DEFAULT 0,
+        team1_goals INT NOT NULL DEFAULT 0,
+        team2_goals INT NOT NULL DEFAULT 0,
+        last_match_date DATE,
+        last_updated DATE,
+        PRIMARY KEY (team1_id, team2_id)
+    )
+"""
+
+H2H_COLUMNS = ('team1_wins', 'team2_wins', 'draws', 'team1_goals', 'team2_goals')
+
+# The upsert can only move last_match_date forward; after a result is corrected
+# or withdrawn it is read back from `matches` (already updated in this transaction)
+RECOMPUTE_LAST_MATCH_QUERY = """
+    UPDATE head_to_head
+    SET last_match_date = (
+        SELECT MAX(match_date) FROM matches
+        WHERE result IN ('Home Win', 'Draw', 'Away Win')
+          AND ((home_team_id = %s AND away_team_id = %s) OR (home_team_id = %s AND away_team_id = %s))
+    )
+    WHERE team1_id = %s AND team2_id = %s
+"""
+
+
+def normalize_pair(team_a, team_b):
+    """Return the (team1_id, team2_id) key for a pairing, lower id first."""
+    return (team_a, team_b) if team_a < team_b else (team_b, team_a)
+
+
+def _add_contribution(deltas, match, sign):
+    key = normalize_pair(match['home_team_id'], match['away_team_id'])
+    home_is_team1 = key[0] == match['home_team_id']
+    team1_goals = match['home_goals'] if home_is_team1 else match['away_goals']
+    team2_goals = match['away_goals'] if home_is_team1 else match['home_goals']
+
+    delta = deltas[key]
+    delta['team1_wins'] += sign if team1_goals > team2_goals else 0
+    delta['team2_wins'] += sign if team2_goals > team1_goals else 0
+    delta['draws'] += sign if team1_goals == team2_goals else 0
+    delta['team1_goals'] += sign * team1_goals
+    delta['team2_goals'] += sign * team2_goals
+    if sign > 0 and (delta['last_match_date'] is None or match['match_date'] > delta['last_match_date']):
+        delta['last_match_date'] = match['match_date']
+
+
+def apply_h2h_changes(cursor, changes):
+    """Fold a batch of (previous, current) match states into head_to_head."""
+    deltas = defaultdict(lambda: dict(dict.fromkeys(H2H_COLUMNS, 0), last_match_date=None))
+    reversed_pairs = set()
+    for previous, current in changes:
+        if is_finished(previous):
+            _add_contribution(deltas, previous, -1)
+            reversed_pairs.add(normalize_pair(previous['home_team_id'], previous['away_team_id']))
+        if is_finished(current):
+            _add_contribution(deltas, current, 1)
+
+    if not deltas:
+        return
+    updates = ', '.join(f"{col} = {col} + VALUES({col})" for col in H2H_COLUMNS)
+    cursor.executemany(f"""
+        INSERT INTO head_to_head (
+            team1_id, team2_id, {', '.join(H2H_COLUMNS)}, last_match_date, last_updated
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, CURDATE())
+        ON DUPLICATE KEY UPDATE
+            {updates},
+            last_match_date = GREATEST(COALESCE(last_match_date, VALUES(last_match_date)),
+                                       COALESCE(VALUES(last_match_date), last_match_date)),
+            last_updated = CURDATE()
+    """, [
+        key + tuple(delta[col] for col in H2H_COLUMNS) + (delta['last_match_date'],)
+        for key, delta in deltas.items()
+    ])
+    if reversed_pairs:
+        cursor.executemany(RECOMPUTE_LAST_MATCH_QUERY, [
+            (team1, team2, team2, team1, team1, team2) for team1, team2 in sorted(reversed_pairs)
+        ])
+    logger.info(f"Updated head-to-head records for {len(deltas)} pairings")
+
+
+def rebuild_head_to_head(cnx):
+    """Recompute every pairing from the full match history in one pass."""
+    cursor = cnx.cursor()
+    try:
+        cursor.execute("DELETE FROM head_to_head")
+        cursor.execute("""
+            INSERT INTO head_to_head (
+                team1_id, team2_id, team1_wins, team2_wins, draws,
+                team1_goals, team2_goals, last_match_date, last_updated
+            )
+            SELECT t1, t2,
+                   SUM(g1 > g2), SUM(g2 > g1), SUM(g1 = g2),
+                   SUM(g1), SUM(g2), MAX(match_date), CURDATE()
+            FROM (
+                SELECT LEAST(home_team_id, away_team_id) as t1,
+                       GREATEST(home_team_id, away_team_id) as t2,
+                       IF(home_team_id < away_team_id, home_goals, away_goals) as g1,
+                       IF(home_team_id < away_team_id, away_goals, home_goals) as g2,
+                       match_date
+                FROM matches
+                WHERE result IN ('Home Win', 'Draw', 'Away Win')
+            ) pairs
+            GROUP BY t1, t2
+        """)
+        cnx.commit()
+        logger.info(f"Rebuilt {cursor.rowcount} head-to-head records")
+    except Exception:
+        cnx.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _orient(row, team_a, team_b):
+    """Express a stored row from team_a's point of view."""
+    if row is None:
+        return {'team_a_id': team_a, 'team_b_id': team_b, 'team_a_wins': 0, 'team_b_wins': 0,
+                'draws': 0, 'team_a_goals': 0, 'team_b_goals': 0, 'played': 0,
+                'last_match_date': None}
+    a_is_team1 = row['team1_id'] == team_a
+    prefix_a, prefix_b = ('team1', 'team2') if a_is_team1 else ('team2', 'team1')
+    record = {
+        'team_a_id': team_a,
+        'team_b_id': team_b,
+        'team_a_wins': row[f'{prefix_a}_wins'],
+        'team_b_wins': row[f'{prefix_b}_wins'],
+        'draws': row['draws'],
+        'team_a_goals': row[f'{prefix_a}_goals'],
+        'team_b_goals': row[f'{prefix_b}_goals'],
+        'last_match_date': row['last_match_date'],
+    }
+    record['played'] = record['team_a_wins'] + record['team_b_wins'] + record['draws']
+    return record
+
+
+def lookup_head_to_head(cursor, team_a, team_b):
+    """Return the record between two teams from team_a's point of view."""
+    return lookup_many(cursor, [(team_a, team_b)])[(team_a, team_b)]
+
+
+def head_to_head_query(pairs):
+    """Build the single-query lookup for several pairings: (sql, params)."""
+    keys = sorted({normalize_pair(a, b) for a, b in pairs})
+    placeholders = ', '.join(['(%s, %s)'] * len(keys))
+    params = [team_id for key in keys for team_id in key]
+    return f"""
+        SELECT * FROM head_to_head
+        WHERE (team1_id, team2_id) IN ({placeholders})
+    """, params
+
+
+def orient_rows(rows, pairs):
+    """Map fetched head_to_head rows back onto the requested (team_a, team_b) pairs."""
+    by_key = {(row['team1_id'], row['team2_id']): row for row in rows}
+    return {(a, b): _orient(by_key.get(normalize_pair(a, b)), a, b) for a, b in pairs}
+
+
+def lookup_many(cursor, pairs):
+    """Fetch several pairings in one query; returns {(team_a, team_b): record}."""
+    if not pairs:
+        return {}
+    sql, params = head_to_head_query(pairs)
+    cursor.execute(sql, params)
+    return orient_rows(cursor.fetchall(), pairs)
@@ -0,0 +1,261 @@
+"""Live score push over server-sent events.
+
+One poller per host (elected with an exclusive file lock) fetches today's
+matches every few seconds and writes the live state to a snapshot file.
+Every worker process runs a broadcaster that watches that file and fans
+score changes out to its connected browsers, so a single upstream request
+serves every client on the host.
+"""
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LIVE_FIELDS = ('home_team', 'away_team', 'home_score', 'away_score', 'status', 'result')
+
+
+class SnapshotFile:
+    """Atomically written JSON file holding {'version': n, 'matches': {id: state}}."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, version, matches):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': version, 'matches': matches, 'written_at': time.time()}, f)
+        os.replace(tmp_path, self.path)
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'version': 0, 'matches': {}}
+
+    def mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+
+def live_state(match):
+    """Reduce a parsed API match to the fields browsers need."""
+    return {
+        'home_team': match['HomeTeamName'],
+        'away_team': match['AwayTeamName'],
+        'home_score': match['HomeScore'],
+        'away_score': match['AwayScore'],
+        'status': match['Status'],
+        'result': match['Result'],
+    }
+
+
+def diff_states(old, new):
+    """Return the matches whose live fields changed between two snapshots."""
+    return {
+        match_id: state for match_id, state in new.items()
+        if any(old.get(match_id, {}).get(field) != state.get(field) for field in LIVE_FIELDS)
+    }
+
+
+class LivePoller:
+    """Poll upstream for today's matches; only the lock holder on a host polls."""
+
+    def __init__(self, fetch, snapshot, lock_path, interval, idle_interval):
+        self.fetch = fetch
+        self.snapshot = snapshot
+        self.lock_path = lock_path
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self._lock_file = None
+        self._stop = threading.Event()
+
+    def _acquire_leadership(self):
+        if self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        logger.info(f"Process {os.getpid()} is the live score poller for this host")
+        return True
+
+    def poll_once(self):
+        """Fetch, publish if anything changed, and return whether any match is in play."""
+        matches = self.fetch()
+        if matches is None:
+            return False
+        current = self.snapshot.read()
+        states = {str(match['id']): live_state(match) for match in matches}
+        if diff_states(current['matches'], states) or states.keys() != current['matches'].keys():
+            self.snapshot.write(current['version'] + 1, states)
+        return any(state['result'] == 'Live' for state in states.values())
+
+    def run(self):
+        while not self._stop.is_set():
+            if not self._acquire_leadership():
+                # Another process polls; check again later in case it goes away
+                self._stop.wait(self.idle_interval)
+                continue
+            try:
+                in_play = self.poll_once()
+            except Exception as e:
+                logger.error(f"Error polling live scores: {e}")
+                in_play = False
+            self._stop.wait(self.interval if in_play else self.idle_interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+class LiveBroadcaster:
+    """Fan snapshot changes out to the SSE subscribers of this process."""
+
+    def __init__(self, snapshot, poller=None, check_interval=1.0, queue_size=100):
+        self.snapshot = snapshot
+        self.poller = poller
+        self.check_interval = check_interval
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._started = False
+        self._state = snapshot.read()
+        self._mtime = snapshot.mtime()
+
+    def ensure_started(self):
+        """Start the watcher (and poller) threads on first use, i.e. after fork."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._watch, name='live-broadcaster', daemon=True).start()
+        if self.poller is not None:
+            threading.Thread(target=self.poller.run, name='live-poller', daemon=True).start()
+
+    def subscribe(self, limit=None):
+        """Register a subscriber queue; None when `limit` subscribers are already connected."""
+        self.ensure_started()
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.add(subscriber)
+            state = self._state
+        return subscriber, state
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def current(self):
+        return self._state
+
+    def _watch(self):
+        while True:
+            time.sleep(self.check_interval)
+            mtime = self.snapshot.mtime()
+            if mtime is None or mtime == self._mtime:
+                continue
+            self._mtime = mtime
+            new_state = self.snapshot.read()
+            changed = diff_states(self._state['matches'], new_state['matches'])
+            self._state = new_state
+            if changed:
+                self.publish({'version': new_state['version'], 'matches': changed})
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A client that cannot keep up is dropped; its browser reconnects
+                self.unsubscribe(subscriber)
+                with subscriber.mutex:
+                    subscriber.queue.clear()
+                subscriber.put_nowait(None)
+        logger.info(f"Pushed {len(event['matches'])} score changes to {len(subscribers)} clients")
+
+
+def format_sse(event, data, event_id=None):
+    """Encode one server-sent event."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventStream:
+    """SSE response body for one subscriber: the current snapshot, then diffs as they come.
+
+    Closing it, or the generator iterating it, unsubscribes; the former also
+    covers a response closed before it was ever iterated.
+    """
+
+    def __init__(self, broadcaster, subscriber, state, keepalive=15):
+        self.broadcaster = broadcaster
+        self.subscriber = subscriber
+        self.state = state
+        self.keepalive = keepalive
+
+    def __iter__(self):
+        # stream_with_context closes this generator, not the EventStream, when the client goes away
+        try:
+            yield format_sse('snapshot', self.state['matches'], self.state['version'])
+            while True:
+                try:
+                    event = self.subscriber.get(timeout=self.keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if event is None:
+                    return
+                yield format_sse('scores', event['matches'], event['version'])
+        finally:
+            self.close()
+
+    def close(self):
+        self.broadcaster.unsubscribe(self.subscriber)
+
+
+def open_stream(broadcaster, limit=None, keepalive=15):
+    """Subscribe and return the SSE body, or None when `limit` streams are already open.
+
+    Under a threaded WSGI server every open stream holds a worker thread for
+    as long as the browser stays, so streams per process are capped and the
+    rest of the clients poll instead.
+    """
+    subscription = broadcaster.subscribe(limit)
+    if subscription is None:
+        return None
+    return EventStream(broadcaster, *subscription, keepalive=keepalive)
+
+
+def poll_interval(config):
+    """Poll interval that keeps the live poller inside its share of the API budget."""
+    budget = config['API_RATE_LIMIT_PERIOD'] / (config['API_RATE_LIMIT'] * config['LIVE_API_SHARE'])
+    return max(config['LIVE_POLL_INTERVAL'], budget)
+
+
+def init_live(app, fetch):
+    """Create the per-process broadcaster; threads start on the first subscriber."""
+    state_dir = app.config['LIVE_STATE_DIR']
+    os.makedirs(state_dir, exist_ok=True)
+    snapshot = SnapshotFile(os.path.join(state_dir, 'live.json'))
+    poller = LivePoller(fetch, snapshot, os.path.join(state_dir, 'poller.lock'),
+                        poll_interval(app.config), app.config['LIVE_IDLE_INTERVAL'])
+    app.extensions['live'] = LiveBroadcaster(snapshot, poller)
+    return app.extensions['live']
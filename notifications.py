@@ -0,0 +1,412 @@
+"""Result notifications for users with notifications enabled.
+
+`update_matches` queues a `notification_jobs` row when a stored match gets a
+(new) final result; the first import of a match queues nothing, so loading
+past seasons does not mail anyone. `flask notify-worker` claims queued jobs
+and, per round, selects the next NOTIFY_BATCH_SIZE recipients of all
+claimed matches with one set-based query, ordered by user:
+
+- users whose favourite team played, and
+- users who predicted the match,
+
+both only with notifications enabled. Each user gets one message covering
+all claimed matches. Messages go through a pool of SMTP connections at no
+more than NOTIFY_RATE per second. After each batch the jobs record the last
+user done, so a worker that dies resumes where it stopped rather than
+mailing everyone again.
+"""
+import ast
+import logging
+import os
+import secrets
+import smtplib
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+FINISHED_RESULTS = ('Home Win', 'Draw', 'Away Win')
+
+THEMES = ('light', 'dark')
+
+PREFERENCE_COLUMNS_DDL = """
+    ALTER TABLE user_preferences
+        ADD COLUMN notifications_enabled BOOLEAN NOT NULL DEFAULT FALSE,
+        ADD COLUMN favorite_team_id INT NULL,
+        ADD COLUMN theme VARCHAR(10) NOT NULL DEFAULT 'light',
+        ADD KEY idx_preferences_favorite (favorite_team_id, notifications_enabled),
+        ADD FOREIGN KEY (favorite_team_id) REFERENCES teams(id)
+"""
+
+NOTIFICATION_JOBS_DDL = """
+    CREATE TABLE IF NOT EXISTS notification_jobs (
+        match_id INT PRIMARY KEY,
+        queued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        claimed_by VARCHAR(64) NULL,
+        claimed_at DATETIME NULL,
+        last_user_id INT NOT NULL DEFAULT 0,
+        sent INT NOT NULL DEFAULT 0,
+        finished_at DATETIME NULL,
+        KEY idx_notification_jobs_pending (finished_at, queued_at)
+    )
+"""
+
+PREFERENCES_QUERY = """
+    SELECT notifications_enabled, favorite_team_id, theme
+    FROM user_preferences
+    WHERE user_id = %s
+"""
+
+SAVE_PREFERENCES_QUERY = """
+    INSERT INTO user_preferences (user_id, notifications_enabled, favorite_team_id, theme)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        notifications_enabled = VALUES(notifications_enabled),
+        favorite_team_id = VALUES(favorite_team_id),
+        theme = VALUES(theme)
+"""
+
+# A corrected result queues the match again
+QUEUE_JOB_QUERY = """
+    INSERT INTO notification_jobs (match_id) VALUES (%s)
+    ON DUPLICATE KEY UPDATE
+        queued_at = CURRENT_TIMESTAMP, claimed_by = NULL, claimed_at = NULL,
+        last_user_id = 0, sent = 0, finished_at = NULL
+"""
+
+CLAIM_JOBS_QUERY = """
+    UPDATE notification_jobs
+    SET claimed_by = %s, claimed_at = NOW()
+    WHERE finished_at IS NULL
+      AND (claimed_by IS NULL OR claimed_at < NOW() - INTERVAL %s SECOND)
+    ORDER BY queued_at
+    LIMIT %s
+"""
+
+CLAIMED_MATCHES_QUERY = """
+    SELECT m.id, m.home_goals, m.away_goals, m.result,
+           ht.name as home_team, at.name as away_team
+    FROM notification_jobs j
+    JOIN matches m ON m.id = j.match_id
+    JOIN teams ht ON ht.id = m.home_team_id
+    JOIN teams at ON at.id = m.away_team_id
+    WHERE j.claimed_by = %s
+"""
+
+# Both branches are driven by indexes: favourites by idx_preferences_favorite,
+# predictions by the match_id index of user_predictions
+RECIPIENTS_QUERY = """
+    SELECT r.user_id, u.username, u.email, r.match_id,
+           MAX(r.prediction) as prediction, MAX(r.favorite) as favorite
+    FROM (
+        SELECT p.user_id, j.match_id, NULL as prediction, 1 as favorite
+        FROM notification_jobs j
+        JOIN matches m ON m.id = j.match_id
+        JOIN user_preferences p
+          ON p.favorite_team_id IN (m.home_team_id, m.away_team_id) AND p.notifications_enabled = TRUE
+        WHERE j.claimed_by = %s AND p.user_id > j.last_user_id
+        UNION ALL
+        SELECT up.user_id, j.match_id, up.prediction, 0 as favorite
+        FROM notification_jobs j
+        JOIN user_predictions up ON up.match_id = j.match_id
+        JOIN user_preferences p ON p.user_id = up.user_id AND p.notifications_enabled = TRUE
+        WHERE j.claimed_by = %s AND up.user_id > j.last_user_id
+    ) r
+    JOIN users u ON u.id = r.user_id
+    GROUP BY r.user_id, u.username, u.email, r.match_id
+    ORDER BY r.user_id, r.match_id
+    LIMIT %s
+"""
+
+CHECKPOINT_QUERY = """
+    UPDATE notification_jobs
+    SET last_user_id = GREATEST(last_user_id, %s), sent = sent + %s, claimed_at = NOW()
+    WHERE match_id = %s AND claimed_by = %s
+"""
+
+FINISH_JOBS_QUERY = "UPDATE notification_jobs SET finished_at = NOW() WHERE claimed_by = %s"
+
+
+def backfill_preferences(cnx):
+    """Migration step: copy the old str(dict) preference blobs into the typed columns."""
+    cursor = cnx.cursor()
+    try:
+        cursor.execute("SELECT id, name, short_name FROM teams")
+        teams = {}
+        for team_id, name, short_name in cursor.fetchall():
+            for alias in (str(team_id), name, short_name):
+                teams[alias.strip().lower()] = team_id
+
+        cursor.execute("SELECT user_id, preferences FROM user_preferences WHERE preferences IS NOT NULL")
+        updates = []
+        for user_id, blob in cursor.fetchall():
+            try:
+                preferences = ast.literal_eval(blob)
+            except (ValueError, SyntaxError):
+                logger.warning(f"Ignoring unreadable preferences of user {user_id}")
+                continue
+            if not isinstance(preferences, dict):
+                continue
+            favorite = preferences.get('favorite_team')
+            theme = preferences.get('theme')
+            updates.append((
+                bool(preferences.get('notifications_enabled')),
+                teams.get(str(favorite).strip().lower()) if favorite else None,
+                theme if theme in THEMES else 'light',
+                user_id,
+            ))
+        if updates:
+            cursor.executemany("""
+                UPDATE user_preferences
+                SET notifications_enabled = %s, favorite_team_id = %s, theme = %s
+                WHERE user_id = %s
+            """, updates)
+        logger.info(f"Migrated preferences of {len(updates)} users")
+    finally:
+        cursor.close()
+
+
+def load_preferences(cursor, user_id):
+    """A user's preferences, with defaults when none are stored."""
+    cursor.execute(PREFERENCES_QUERY, (user_id,))
+    row = cursor.fetchone()
+    return row or {'notifications_enabled': False, 'favorite_team_id': None, 'theme': 'light'}
+
+
+def save_preferences(cursor, user_id, notifications_enabled, favorite_team_id, theme):
+    cursor.execute(SAVE_PREFERENCES_QUERY, (user_id, notifications_enabled, favorite_team_id, theme))
+
+
+def queue_notifications(cursor, changes):
+    """Queue a notification job per stored match whose final result changed; call in the ingest transaction."""
+    match_ids = [
+        current['id'] for previous, current in changes
+        if previous is not None and current['result'] in FINISHED_RESULTS
+        and previous['result'] != current['result']
+    ]
+    if match_ids:
+        cursor.executemany(QUEUE_JOB_QUERY, [(match_id,) for match_id in match_ids])
+    return len(match_ids)
+
+
+class RateLimiter:
+    """Spaces calls evenly at `rate` per second across threads; 0 disables the limit."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class SMTPTransport:
+    """A pool of reused SMTP connections, one per sender thread, sharing a rate limit."""
+
+    def __init__(self, host, port, username='', password='', use_tls=False, pool_size=8, rate=0, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='smtp')
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        with self._lock:
+            self._connections.append(smtp)
+        return smtp
+
+    def _connection(self, reconnect=False):
+        smtp = getattr(self._local, 'smtp', None)
+        if smtp is None or reconnect:
+            if smtp is not None:
+                self._discard(smtp)
+            smtp = self._local.smtp = self._connect()
+        return smtp
+
+    def _discard(self, smtp):
+        with self._lock:
+            if smtp in self._connections:
+                self._connections.remove(smtp)
+        try:
+            smtp.close()
+        except Exception:
+            pass
+
+    def _send(self, message):
+        self.limiter.acquire()
+        try:
+            try:
+                self._connection().send_message(message)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # The server dropped an idle connection; one retry on a fresh one.
+                # Not for other SMTPExceptions (they subclass OSError): refusals keep the connection
+                self.limiter.acquire()
+                self._connection(reconnect=True).send_message(message)
+            return True
+        except smtplib.SMTPRecipientsRefused:
+            logger.warning(f"Recipient refused: {message['To']}")
+        except (smtplib.SMTPException, OSError) as e:
+            logger.error(f"Error sending notification to {message['To']}: {e}")
+        return False
+
+    def send_many(self, messages):
+        """Send messages concurrently; returns a success flag per message, in order."""
+        return list(self._executor.map(self._send, messages))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for smtp in connections:
+            try:
+                smtp.quit()
+            except Exception:
+                smtp.close()
+
+
+def build_message(template, sender, recipient, items):
+    """Render one user's notification for a list of {match, prediction, favorite} items."""
+    if len(items) == 1:
+        match = items[0]['match']
+        subject = f"{match['home_team']} {match['home_goals']}-{match['away_goals']} {match['away_team']}"
+    else:
+        subject = f"{len(items)} new results"
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = recipient['email']
+    message['Subject'] = subject
+    message.set_content(template.render(username=recipient['username'], items=items))
+    return message
+
+
+class NotificationWorker:
+    """Claims queued jobs and sends their notifications in batches."""
+
+    def __init__(self, connect, transport, template, sender, batch_size=1000, claim_size=20, claim_timeout=600):
+        self.connect = connect
+        self.transport = transport
+        self.template = template
+        self.sender = sender
+        self.batch_size = batch_size
+        self.claim_size = claim_size
+        self.claim_timeout = claim_timeout
+
+    def _claim(self, cursor, cnx):
+        token = f"{socket.gethostname()}-{os.getpid()}-{secrets.token_hex(4)}"
+        cursor.execute(CLAIM_JOBS_QUERY, (token, self.claim_timeout, self.claim_size))
+        claimed = cursor.rowcount
+        cnx.commit()
+        return token if claimed else None
+
+    def _messages(self, rows, matches):
+        """Group recipient rows (ordered by user) into one message per user."""
+        messages, users = [], []
+        current, items = None, []
+        for row in rows + [None]:
+            if current is not None and (row is None or row['user_id'] != current['user_id']):
+                messages.append(build_message(self.template, self.sender, current, items))
+                users.append(current['user_id'])
+                items = []
+            if row is None:
+                break
+            current = row
+            match = matches[row['match_id']]
+            items.append({
+                'match': match,
+                'favorite': bool(row['favorite']),
+                'prediction': row['prediction'],
+                'correct': row['prediction'] == match['result'] if row['prediction'] else None,
+            })
+        return messages, users
+
+    def run_once(self):
+        """Claim and process one set of jobs; returns the number of messages sent, None if nothing was queued."""
+        cnx = self.connect()
+        cursor = cnx.cursor(dictionary=True)
+        try:
+            token = self._claim(cursor, cnx)
+            if token is None:
+                return None
+            cursor.execute(CLAIMED_MATCHES_QUERY, (token,))
+            matches = {row['id']: row for row in cursor.fetchall()}
+            logger.info(f"Sending notifications for {len(matches)} matches")
+            total = 0
+            while True:
+                cursor.execute(RECIPIENTS_QUERY, (token, token, self.batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                if len(rows) == self.batch_size and rows[0]['user_id'] != rows[-1]['user_id']:
+                    # The last user's rows may continue past the limit; they start the next batch
+                    last_user = rows[-1]['user_id']
+                    rows = [row for row in rows if row['user_id'] != last_user]
+                messages, users = self._messages(rows, matches)
+                sent = self.transport.send_many(messages)
+                total += sum(sent)
+
+                last_user_id = users[-1]
+                per_match = {match_id: 0 for match_id in matches}
+                delivered = {user_id for user_id, ok in zip(users, sent) if ok}
+                for row in rows:
+                    if row['user_id'] in delivered:
+                        per_match[row['match_id']] += 1
+                cursor.executemany(CHECKPOINT_QUERY, [
+                    (last_user_id, count, match_id, token) for match_id, count in per_match.items()
+                ])
+                cnx.commit()
+                logger.info(f"Sent {sum(sent)} of {len(messages)} notifications up to user {last_user_id}")
+            cursor.execute(FINISH_JOBS_QUERY, (token,))
+            cnx.commit()
+            return total
+        except Exception:
+            cnx.rollback()
+            raise
+        finally:
+            cursor.close()
+            cnx.close()
+
+    def run(self, poll_interval):
+        """Process jobs until interrupted, sleeping when the queue is empty."""
+        while True:
+            try:
+                if self.run_once() is not None:
+                    continue
+            except Exception as e:
+                # Claimed jobs are picked up again after the claim timeout
+                logger.error(f"Error sending notifications: {e}")
+            time.sleep(poll_interval)
+
+
+def create_worker(app, connect):
+    """Build a notification worker from the app's MAIL_* and NOTIFY_* settings."""
+    config = app.config
+    transport = SMTPTransport(
+        config['MAIL_SERVER'], config['MAIL_PORT'], config['MAIL_USERNAME'], config['MAIL_PASSWORD'],
+        config['MAIL_USE_TLS'], config['NOTIFY_POOL_SIZE'], config['NOTIFY_RATE'],
+    )
+    return NotificationWorker(
+        connect, transport, app.jinja_env.get_template('email/results.txt'), config['MAIL_FROM'],
+        config['NOTIFY_BATCH_SIZE'], config['NOTIFY_CLAIM_SIZE'], config['NOTIFY_CLAIM_TIMEOUT'],
+    )
@@ -0,0 +1,47 @@
+"""Password hashing shared by registration, login and the bulk user import.
+
+New hashes use Werkzeug's default method. Two older formats still verify:
+
+- `<32 hex salt>:<werkzeug hash of password + salt>`, written by the old
+  salted `hash_password` helper, and
+- Werkzeug hashes made with other methods or iteration counts.
+
+Both are replaced by a current hash the next time the user logs in.
+"""
+import re
+from functools import lru_cache
+from werkzeug.security import generate_password_hash, check_password_hash
+
+LEGACY_SALTED = re.compile(r'^([0-9a-f]{32}):(.+\$.+\$.+)$')
+# Hash formats accepted from imports: the pbkdf2 methods the pinned Werkzeug can check.
+# Not `plain` (no hashing at all) and not scrypt, which Werkzeug only verifies from 2.3.
+KNOWN_METHODS = re.compile(r'^pbkdf2:sha(1|224|256|384|512)(:\d+)?\$[^$]+\$[0-9a-f]+$')
+
+
+def hash_password(password):
+    """Hash a password with the current method; a plain function so it can run in a process pool."""
+    return generate_password_hash(password)
+
+
+@lru_cache(maxsize=None)
+def _current_method():
+    return hash_password('').split('$', 1)[0]
+
+
+def is_known_hash(stored_hash):
+    """Whether stored_hash is in a format verify_password understands."""
+    legacy = LEGACY_SALTED.match(stored_hash)
+    return bool(KNOWN_METHODS.match(legacy.group(2) if legacy else stored_hash))
+
+
+def verify_password(stored_hash, password):
+    legacy = LEGACY_SALTED.match(stored_hash)
+    if legacy:
+        salt, hash_value = legacy.groups()
+        return check_password_hash(hash_value, password + salt)
+    return check_password_hash(stored_hash, password)
+
+
+def needs_rehash(stored_hash):
+    """Whether a (verified) hash should be replaced by one in the current format."""
+    return bool(LEGACY_SALTED.match(stored_hash)) or stored_hash.split('$', 1)[0] != _current_method()
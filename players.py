@@ -0,0 +1,358 @@
+"""Player squads, per-match player statistics and season leaderboards.
+
+Squads come from the football-data teams endpoint, per-match events (goals,
+assists, cards, minutes) from the match detail endpoint, and the scorers
+endpoint fills in season totals for matches we have no event data for. The
+same functions accept payloads loaded from local JSON dumps.
+
+`player_season_totals` is updated by delta whenever a match's player rows
+change, so leaderboards read indexed summary rows rather than summing
+`player_stats`. Totals from the scorers feed are kept as separate rows
+(source 'feed') so the two sources never double count; leaderboards use the
+event-derived rows once every finished match of the season has been ingested.
+"""
+import glob
+import json
+import logging
+import os
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+FULL_MATCH_MINUTES = 90
+
+TOTAL_COLUMNS = ('appearances', 'goals', 'assists', 'yellow_cards', 'red_cards', 'minutes_played')
+EVENT_COLUMNS = ('goals', 'assists', 'yellow_cards', 'red_cards', 'minutes_played')
+
+LEADERBOARDS = {
+    'scorers': 'goals DESC, assists DESC, minutes_played ASC',
+    'assists': 'assists DESC, goals DESC, minutes_played ASC',
+    'discipline': 'red_cards DESC, yellow_cards DESC, minutes_played ASC',
+}
+
+PLAYERS_DDL = """
+    CREATE TABLE IF NOT EXISTS players (
+        id INT PRIMARY KEY,
+        team_id INT,
+        name VARCHAR(100) NOT NULL,
+        position VARCHAR(30),
+        shirt_number INT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        KEY idx_players_team (team_id)
+    )
+"""
+
+PLAYER_STATS_DDL = """
+    CREATE TABLE IF NOT EXISTS player_stats (
+        player_id INT NOT NULL,
+        match_id INT NOT NULL,
+        team_id INT NOT NULL,
+        season VARCHAR(9) NOT NULL,
+        goals INT NOT NULL DEFAULT 0,
+        assists INT NOT NULL DEFAULT 0,
+        yellow_cards INT NOT NULL DEFAULT 0,
+        red_cards INT NOT NULL DEFAULT 0,
+        minutes_played INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (player_id, match_id),
+        KEY idx_player_stats_match (match_id)
+    )
+"""
+
+PLAYER_SEASON_TOTALS_DDL = """
+    CREATE TABLE IF NOT EXISTS player_season_totals (
+        player_id INT NOT NULL,
+        season VARCHAR(9) NOT NULL,
+        source VARCHAR(6) NOT NULL DEFAULT 'events',
+        team_id INT,
+        appearances INT NOT NULL DEFAULT 0,
+        goals INT NOT NULL DEFAULT 0,
+        assists INT NOT NULL DEFAULT 0,
+        yellow_cards INT NOT NULL DEFAULT 0,
+        red_cards INT NOT NULL DEFAULT 0,
+        minutes_played INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (player_id, season, source),
+        KEY idx_totals_goals (season, source, goals),
+        KEY idx_totals_assists (season, source, assists),
+        KEY idx_totals_discipline (season, source, red_cards, yellow_cards)
+    )
+"""
+
+
+def season_label(season_info):
+    """Turn an API season object into our 'YYYY/YYYY' season string."""
+    if not season_info:
+        return 'Unknown'
+    return f"{season_info.get('startDate', '')[:4]}/{season_info.get('endDate', '')[:4]}"
+
+
+def _upsert_players(cursor, rows):
+    if rows:
+        cursor.executemany("""
+            INSERT INTO players (id, team_id, name, position, shirt_number)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                team_id = COALESCE(VALUES(team_id), team_id),
+                name = VALUES(name),
+                position = COALESCE(VALUES(position), position),
+                shirt_number = COALESCE(VALUES(shirt_number), shirt_number)
+        """, rows)
+
+
+def ingest_squads(cursor, teams_payload):
+    """Upsert squads from a /competitions/PL/teams payload."""
+    rows = []
+    for team in teams_payload.get('teams', []):
+        for player in team.get('squad', []):
+            if player.get('id') and player.get('name'):
+                rows.append((player['id'], team.get('id'), player['name'],
+                             player.get('position'), player.get('shirtNumber')))
+    _upsert_players(cursor, rows)
+    logger.info(f"Upserted {len(rows)} squad players")
+    return len(rows)
+
+
+def parse_match_events(match_payload):
+    """Turn a match detail payload into {player_id: stats} for everyone who played.
+
+    Starters play from minute 0 and substitutes from the minute they came on,
+    until they are substituted off, sent off, or the match ends.
+    """
+    players = {}
+    entered = {}
+    left = {}
+
+    def player_row(person, team_id):
+        row = players.get(person['id'])
+        if row is None:
+            row = players[person['id']] = dict.fromkeys(EVENT_COLUMNS, 0)
+            row.update({'team_id': team_id, 'name': person.get('name'),
+                        'position': person.get('position'),
+                        'shirt_number': person.get('shirtNumber')})
+        elif row['team_id'] is None:
+            # Substitutions and bookings may come without a team block
+            row['team_id'] = team_id
+        return row
+
+    for side in ('homeTeam', 'awayTeam'):
+        team = match_payload.get(side) or {}
+        for person in team.get('lineup') or []:
+            if person.get('id'):
+                player_row(person, team.get('id'))
+                entered[person['id']] = 0
+
+    for sub in match_payload.get('substitutions') or []:
+        team_id = (sub.get('team') or {}).get('id')
+        player_in = sub.get('playerIn') or {}
+        player_out = sub.get('playerOut') or {}
+        if player_in.get('id'):
+            player_row(player_in, team_id)
+            entered[player_in['id']] = sub.get('minute') or 0
+        if player_out.get('id'):
+            left[player_out['id']] = sub.get('minute') or FULL_MATCH_MINUTES
+
+    for goal in match_payload.get('goals') or []:
+        team_id = (goal.get('team') or {}).get('id')
+        scorer = goal.get('scorer') or {}
+        assist = goal.get('assist') or {}
+        if scorer.get('id') and goal.get('type') != 'OWN':
+            player_row(scorer, team_id)['goals'] += 1
+        if assist.get('id'):
+            player_row(assist, team_id)['assists'] += 1
+
+    for booking in match_payload.get('bookings') or []:
+        team_id = (booking.get('team') or {}).get('id')
+        person = booking.get('player') or {}
+        if not person.get('id'):
+            continue
+        row = player_row(person, team_id)
+        card = booking.get('card') or ''
+        if 'YELLOW' in card:
+            row['yellow_cards'] += 1
+        if 'RED' in card:
+            row['red_cards'] += 1
+            left[person['id']] = min(left.get(person['id'], FULL_MATCH_MINUTES), booking.get('minute') or 0)
+
+    for player_id, row in players.items():
+        if player_id in entered:
+            row['minutes_played'] = max(0, min(left.get(player_id, FULL_MATCH_MINUTES), FULL_MATCH_MINUTES)
+                                        - entered[player_id])
+    return players
+
+
+def _attribute_teams(cursor, match_id, players):
+    """Fill in missing team ids from the squads; drop the players still without one."""
+    missing = [player_id for player_id, row in players.items() if row['team_id'] is None]
+    if not missing:
+        return
+    cursor.execute(f"""
+        SELECT id, team_id FROM players
+        WHERE id IN ({', '.join(['%s'] * len(missing))}) AND team_id IS NOT NULL
+    """, missing)
+    for player_id, team_id in cursor.fetchall():
+        players[player_id]['team_id'] = team_id
+    for player_id in missing:
+        if players[player_id]['team_id'] is None:
+            logger.warning(f"Skipping player {player_id} in match {match_id}: no team")
+            del players[player_id]
+
+
+def ingest_match_events(cursor, match_payload):
+    """Replace one match's player rows and fold the difference into season totals.
+
+    Re-ingesting a corrected payload only applies the delta, so totals stay
+    exact without re-summing player_stats.
+    """
+    match_id = match_payload['id']
+    season = season_label(match_payload.get('season'))
+    players = parse_match_events(match_payload)
+    _attribute_teams(cursor, match_id, players)
+
+    cursor.execute("""
+        SELECT player_id, team_id, season, goals, assists, yellow_cards, red_cards, minutes_played
+        FROM player_stats
+        WHERE match_id = %s
+    """, (match_id,))
+    previous = {row[0]: row for row in cursor.fetchall()}
+
+    deltas = defaultdict(lambda: dict.fromkeys(TOTAL_COLUMNS, 0))
+    for player_id, team_id, old_season, *values in previous.values():
+        delta = deltas[(player_id, old_season, team_id)]
+        delta['appearances'] -= 1
+        for col, value in zip(EVENT_COLUMNS, values):
+            delta[col] -= value
+    for player_id, row in players.items():
+        delta = deltas[(player_id, season, row['team_id'])]
+        delta['appearances'] += 1
+        for col in EVENT_COLUMNS:
+            delta[col] += row[col]
+
+    _upsert_players(cursor, [
+        (player_id, row['team_id'], row['name'], row['position'], row['shirt_number'])
+        for player_id, row in players.items() if row['name']
+    ])
+
+    cursor.execute("DELETE FROM player_stats WHERE match_id = %s", (match_id,))
+    if players:
+        cursor.executemany("""
+            INSERT INTO player_stats (
+                player_id, match_id, team_id, season,
+                goals, assists, yellow_cards, red_cards, minutes_played
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, [
+            (player_id, match_id, row['team_id'], season) + tuple(row[col] for col in EVENT_COLUMNS)
+            for player_id, row in players.items()
+        ])
+
+    changed = [(key, delta) for key, delta in deltas.items() if any(delta.values())]
+    if changed:
+        updates = ', '.join(f"{col} = {col} + VALUES({col})" for col in TOTAL_COLUMNS)
+        cursor.executemany(f"""
+            INSERT INTO player_season_totals (player_id, season, team_id, {', '.join(TOTAL_COLUMNS)}, source)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'events')
+            ON DUPLICATE KEY UPDATE team_id = VALUES(team_id), {updates}
+        """, [key + tuple(delta[col] for col in TOTAL_COLUMNS) for key, delta in changed])
+    return len(players)
+
+
+def ingest_scorers(cursor, scorers_payload):
+    """Store players and cumulative season totals from a /competitions/PL/scorers payload."""
+    season = season_label(scorers_payload.get('season'))
+    players = []
+    totals = []
+    for scorer in scorers_payload.get('scorers', []):
+        person = scorer.get('player') or {}
+        team_id = (scorer.get('team') or {}).get('id')
+        if not person.get('id'):
+            continue
+        players.append((person['id'], team_id, person.get('name'), person.get('position'),
+                        person.get('shirtNumber')))
+        totals.append((person['id'], season, team_id, scorer.get('playedMatches') or 0,
+                       scorer.get('goals') or 0, scorer.get('assists') or 0))
+
+    _upsert_players(cursor, players)
+    if totals:
+        cursor.executemany("""
+            INSERT INTO player_season_totals (player_id, season, source, team_id, appearances, goals, assists)
+            VALUES (%s, %s, 'feed', %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                team_id = VALUES(team_id),
+                appearances = VALUES(appearances),
+                goals = VALUES(goals),
+                assists = VALUES(assists)
+        """, totals)
+    logger.info(f"Ingested {len(totals)} scorers for {season}")
+    return len(totals)
+
+
+def load_dump(directory):
+    """Load squads, scorers and match payloads saved as JSON files in `directory`.
+
+    Expected layout: teams.json, scorers.json and matches/<id>.json, each
+    holding the raw API response.
+    """
+    def read(path):
+        with open(path) as f:
+            return json.load(f)
+
+    teams = read(os.path.join(directory, 'teams.json')) if os.path.exists(os.path.join(directory, 'teams.json')) else None
+    scorers = read(os.path.join(directory, 'scorers.json')) if os.path.exists(os.path.join(directory, 'scorers.json')) else None
+    matches = [read(path) for path in sorted(glob.glob(os.path.join(directory, 'matches', '*.json')))]
+    return teams, scorers, matches
+
+
+# Event totals are complete once every finished match of the season has player rows;
+# until the backfill gets there, the scorers feed has the fuller numbers
+SEASON_SOURCE_QUERY = """
+    SELECT EXISTS (SELECT 1 FROM player_stats WHERE season = %s)
+       AND NOT EXISTS (
+           SELECT 1 FROM matches m
+           WHERE m.season = %s AND m.result IN ('Home Win', 'Draw', 'Away Win')
+             AND NOT EXISTS (SELECT 1 FROM player_stats ps WHERE ps.match_id = m.id)
+       ) as complete
+"""
+
+# Only well-formed 'YYYY/YYYY' labels, which sort chronologically; payloads without
+# season dates are stored as 'Unknown' (or '/') and must not become the default
+LATEST_SEASON_QUERY = """
+    SELECT MAX(season) as season FROM player_season_totals
+    WHERE season REGEXP '^[0-9]{4}/[0-9]{4}$'
+"""
+
+
+def season_source(cursor, season):
+    """Event-derived totals once they cover every finished match; the scorers feed until then."""
+    cursor.execute(SEASON_SOURCE_QUERY, (season, season))
+    row = cursor.fetchone()
+    complete = row['complete'] if isinstance(row, dict) else row[0]
+    return 'events' if complete else 'feed'
+
+
+def leaderboard_query(category, season, limit, source):
+    """Build the leaderboard query for a category: (sql, params)."""
+    order_by = LEADERBOARDS[category]
+    return f"""
+        SELECT t.*, p.name, p.position, tm.name as team_name, tm.short_name as team_short
+        FROM player_season_totals t
+        JOIN players p ON p.id = t.player_id
+        LEFT JOIN teams tm ON tm.id = t.team_id
+        WHERE t.season = %s AND t.source = %s
+        ORDER BY {order_by}
+        LIMIT %s
+    """, (season, source, limit)
+
+
+def leaderboard(cursor, category, season, limit=20, source=None):
+    """Top players for a category, read straight from the indexed season totals."""
+    if source is None:
+        source = 'events' if category == 'discipline' else season_source(cursor, season)
+    cursor.execute(*leaderboard_query(category, season, limit, source))
+    return cursor.fetchall()
+
+
+def latest_season(cursor):
+    cursor.execute(LATEST_SEASON_QUERY)
+    row = cursor.fetchone()
+    if isinstance(row, dict):
+        return row['season']
+    return row[0] if row else None
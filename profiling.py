@@ -0,0 +1,186 @@
+"""Opt-in sampling profiler for individual requests.
+
+A profiled request gets a helper thread that samples the request thread's
+call stack every PROFILER_INTERVAL seconds. The samples are written in the
+"folded stacks" format understood by flamegraph.pl, speedscope and inferno,
+and only the latest PROFILER_KEEP profiles are kept on disk.
+
+Nothing is registered on the app unless PROFILER_ENABLED is set, so the
+disabled path costs nothing at all.
+"""
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from flask import Blueprint, current_app, g, request, render_template, send_from_directory, abort
+from admin import is_admin_request, admin_required
+
+logger = logging.getLogger(__name__)
+
+profiling = Blueprint('profiling', __name__, url_prefix='/_profiles')
+
+PROFILE_ID_RE = re.compile(r'^[0-9T]+-[0-9]+-[A-Za-z0-9_.]+$')
+
+
+class StackSampler:
+    """Sample the call stack of one thread from a background thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started_at
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            # Folded format lists frames root first, separated by semicolons
+            self.counts[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+
+class ProfileStore:
+    """Keep the most recent profiles as .folded files plus a JSON sidecar."""
+
+    def __init__(self, directory, keep):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def save(self, sampler, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%dT%H%M%S')
+        endpoint = re.sub(r'[^A-Za-z0-9_.]', '_', meta.get('endpoint') or 'unknown')
+        profile_id = f"{stamp}-{int(time.time() * 1000) % 1000:03d}{os.getpid()}-{endpoint}"
+
+        folded_path = os.path.join(self.directory, profile_id + '.folded')
+        with open(folded_path + '.tmp', 'w') as f:
+            for stack, count in sampler.counts.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(folded_path + '.tmp', folded_path)
+
+        meta.update({
+            'id': profile_id,
+            'samples': sampler.samples,
+            'duration_ms': round(sampler.elapsed * 1000, 1),
+            'created_at': time.time(),
+        })
+        with open(os.path.join(self.directory, profile_id + '.json'), 'w') as f:
+            json.dump(meta, f)
+
+        self.prune()
+        return profile_id
+
+    def prune(self):
+        with self._lock:
+            profiles = self.list()
+            for meta in profiles[self.keep:]:
+                for ext in ('.folded', '.json'):
+                    try:
+                        os.remove(os.path.join(self.directory, meta['id'] + ext))
+                    except FileNotFoundError:
+                        pass
+
+    def list(self):
+        """Return profile metadata, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        profiles.sort(key=lambda p: p.get('created_at', 0), reverse=True)
+        return profiles
+
+
+def _should_profile():
+    """Decide whether to profile the current request."""
+    if request.blueprint == 'profiling':
+        return False
+    if request.headers.get('X-Profile') or request.args.get('_profile'):
+        return is_admin_request()
+    rate = current_app.config['PROFILER_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+def _start_profile():
+    if not _should_profile():
+        return
+    sampler = StackSampler(threading.get_ident(), current_app.config['PROFILER_INTERVAL'])
+    sampler.start()
+    g._profiler = sampler
+
+
+def _finish_profile(exc=None):
+    sampler = g.pop('_profiler', None)
+    if sampler is None:
+        return
+    sampler.stop()
+    try:
+        profile_id = current_app.extensions['profile_store'].save(sampler, {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'error': repr(exc) if exc else None,
+        })
+        logger.info(f"Saved request profile {profile_id} ({sampler.samples} samples)")
+    except OSError as e:
+        logger.error(f"Error saving request profile: {e}")
+
+
+def init_profiler(app):
+    """Register the profiler hooks and the profile index when enabled."""
+    if not app.config.get('PROFILER_ENABLED'):
+        return
+    app.extensions['profile_store'] = ProfileStore(app.config['PROFILER_DIR'], app.config['PROFILER_KEEP'])
+    app.before_request(_start_profile)
+    # teardown runs even when the view raised, so the sampler thread always stops
+    app.teardown_request(_finish_profile)
+    app.register_blueprint(profiling)
+    logger.info(f"Request profiler enabled (sample rate {app.config['PROFILER_SAMPLE_RATE']})")
+
+
+@profiling.route('/')
+@admin_required
+def profile_index():
+    """List the stored profiles."""
+    profiles = current_app.extensions['profile_store'].list()
+    return render_template('profiles.html', profiles=profiles)
+
+
+@profiling.route('/<profile_id>.folded')
+@admin_required
+def profile_download(profile_id):
+    """Serve a folded-stack file for flamegraph tooling."""
+    if not PROFILE_ID_RE.match(profile_id):
+        abort(404)
+    directory = os.path.abspath(current_app.extensions['profile_store'].directory)
+    return send_from_directory(directory, profile_id + '.folded', mimetype='text/plain')
@@ -0,0 +1,3 @@
+"""SQL for the read routes, shared by the Flask views and the async API (asgi.py)."""
+
+TEAMS_BY_ID_QUERY = "SELECT id, name, short_name FROM teams WHERE id IN (%s, %s)"
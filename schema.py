@@ -0,0 +1,215 @@
+"""Versioned schema migrations with a cached boot-time check.
+
+Instead of running DDL every time a process starts, the database records
+the applied version in `schema_version` and each host caches the last
+version it verified in the instance folder. A boot with an up-to-date cache
+touches neither the DDL nor the database. Add new DDL as a new entry at the
+end of MIGRATIONS; never edit an applied one.
+"""
+import logging
+import os
+import mysql.connector
+from config import MYSQL_CONFIG
+from stats_engine import TEAM_SEASON_STATS_DDL, TEAM_FORM_DDL
+from head_to_head import HEAD_TO_HEAD_DDL
+from players import PLAYERS_DDL, PLAYER_STATS_DDL, PLAYER_SEASON_TOTALS_DDL
+from season_store import DATA_VERSION_DDL
+from change_log import MATCH_CHANGES_DDL
+from notifications import PREFERENCE_COLUMNS_DDL, NOTIFICATION_JOBS_DDL, backfill_preferences
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = [
+    # 1: core tables
+    [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(80) UNIQUE NOT NULL,
+            email VARCHAR(120) UNIQUE NOT NULL,
+            password_hash VARCHAR(256) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS teams (
+            id INT PRIMARY KEY,
+            name VARCHAR(80) NOT NULL,
+            short_name VARCHAR(3) NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS matches (
+            id INT PRIMARY KEY,
+            season VARCHAR(9) NOT NULL,
+            match_date DATE NOT NULL,
+            home_team_id INT NOT NULL,
+            away_team_id INT NOT NULL,
+            home_goals INT DEFAULT 0,
+            away_goals INT DEFAULT 0,
+            home_team_rank INT DEFAULT 0,
+            away_team_rank INT DEFAULT 0,
+            result VARCHAR(20) NOT NULL DEFAULT 'Scheduled',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (home_team_id) REFERENCES teams(id),
+            FOREIGN KEY (away_team_id) REFERENCES teams(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_predictions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            match_id INT NOT NULL,
+            prediction VARCHAR(10) NOT NULL,
+            predicted_at DATETIME NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (match_id) REFERENCES matches(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            user_id INT PRIMARY KEY,
+            preferences TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """,
+    ],
+    # 2: ingest-maintained aggregates (team stats, head-to-head, players)
+    [
+        TEAM_SEASON_STATS_DDL,
+        TEAM_FORM_DDL,
+        HEAD_TO_HEAD_DDL,
+        PLAYERS_DDL,
+        PLAYER_STATS_DDL,
+        PLAYER_SEASON_TOTALS_DDL,
+    ],
+    # 3: one prediction per user and match, ordered to the microsecond; kickoff times
+    [
+        """
+        DELETE older FROM user_predictions older
+        JOIN user_predictions newer
+          ON newer.user_id = older.user_id AND newer.match_id = older.match_id
+         AND (newer.predicted_at > older.predicted_at
+              OR (newer.predicted_at = older.predicted_at AND newer.id > older.id))
+        """,
+        """
+        ALTER TABLE user_predictions
+            MODIFY predicted_at DATETIME(6) NOT NULL,
+            ADD UNIQUE KEY uq_user_match (user_id, match_id)
+        """,
+        "ALTER TABLE matches ADD COLUMN kickoff_at DATETIME NULL AFTER match_date",
+    ],
+    # 4: ingest data version watched by the per-worker season stores
+    [
+        DATA_VERSION_DDL,
+        "INSERT IGNORE INTO data_version (id, version) VALUES (1, 1)",
+    ],
+    # 5: matchweek of each fixture, for standings by matchweek
+    [
+        "ALTER TABLE matches ADD COLUMN matchday TINYINT NULL AFTER season",
+    ],
+    # 6: change log for delta sync
+    [
+        MATCH_CHANGES_DDL,
+    ],
+    # 7: typed, indexed preferences (replacing the str(dict) blob) and the result notification queue
+    [
+        PREFERENCE_COLUMNS_DDL,
+        backfill_preferences,
+        "ALTER TABLE user_preferences DROP COLUMN preferences",
+        NOTIFICATION_JOBS_DDL,
+    ],
+    # 8: room for legacy salt-prefixed imported hashes in databases set up with a 128-character password_hash
+    [
+        "ALTER TABLE users MODIFY password_hash VARCHAR(256) NOT NULL",
+    ],
+    # 9: team statistics come from the season store; nothing reads the ingest-maintained copies
+    [
+        "DROP TABLE IF EXISTS team_form",
+        "DROP TABLE IF EXISTS team_season_stats",
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+# Seconds a booting host waits for another host's migration run to finish
+MIGRATE_LOCK_TIMEOUT = 300
+
+
+def direct_connection():
+    """Open a plain (non-pooled) connection, safe to use before workers fork."""
+    config = MYSQL_CONFIG.copy()
+    config.pop('pool_size', None)
+    config['connect_timeout'] = 10
+    return mysql.connector.connect(**config)
+
+
+def _cache_path(app):
+    return os.path.join(app.instance_path, 'schema_version')
+
+
+def _cached_version(app):
+    try:
+        with open(_cache_path(app)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _remember_version(app, version):
+    os.makedirs(app.instance_path, exist_ok=True)
+    with open(_cache_path(app), 'w') as f:
+        f.write(str(version))
+
+
+def migrate(cnx):
+    """Apply any migrations the database has not seen yet; returns the new version."""
+    cursor = cnx.cursor()
+    locked = False
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                id TINYINT PRIMARY KEY,
+                version INT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+        """)
+        # Hosts booting together take turns; whoever waited reads the version the winner left
+        cursor.execute("SELECT GET_LOCK('schema_migrate', %s)", (MIGRATE_LOCK_TIMEOUT,))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Timed out waiting for another host's schema migration")
+        locked = True
+        cursor.execute("SELECT version FROM schema_version WHERE id = 1")
+        row = cursor.fetchone()
+        current = row[0] if row else 0
+
+        for version in range(current + 1, SCHEMA_VERSION + 1):
+            logger.info(f"Applying schema migration {version}")
+            for statement in MIGRATIONS[version - 1]:
+                if callable(statement):
+                    statement(cnx)
+                else:
+                    cursor.execute(statement)
+            cursor.execute("""
+                INSERT INTO schema_version (id, version) VALUES (1, %s)
+                ON DUPLICATE KEY UPDATE version = VALUES(version)
+            """, (version,))
+            cnx.commit()
+        return max(current, SCHEMA_VERSION)
+    finally:
+        if locked:
+            cursor.execute("SELECT RELEASE_LOCK('schema_migrate')")
+            cursor.fetchone()
+        cursor.close()
+
+
+def ensure_schema(app, force=False):
+    """Make sure the database is at SCHEMA_VERSION, skipping the check when cached."""
+    if not force and _cached_version(app) == SCHEMA_VERSION:
+        return
+    cnx = direct_connection()
+    try:
+        version = migrate(cnx)
+    finally:
+        cnx.close()
+    _remember_version(app, version)
+    logger.info(f"Database schema is at version {version}")
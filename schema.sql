@@ -3,7 +3,7 @@ CREATE TABLE IF NOT EXISTS users (
     id INT AUTO_INCREMENT PRIMARY KEY,
     username VARCHAR(80) UNIQUE NOT NULL,
     email VARCHAR(120) UNIQUE NOT NULL,
-    password_hash VARCHAR(128) NOT NULL,
+    password_hash VARCHAR(256) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -20,6 +20,7 @@ CREATE TABLE IF NOT EXISTS teams (
 CREATE TABLE IF NOT EXISTS matches (
     id INT AUTO_INCREMENT PRIMARY KEY,
     season VARCHAR(9) NOT NULL,
+    matchday TINYINT NULL,
     home_team_id INT NOT NULL,
     away_team_id INT NOT NULL,
     home_goals INT DEFAULT 0,
@@ -28,6 +29,7 @@ CREATE TABLE IF NOT EXISTS matches (
     away_team_rank INT DEFAULT 0,
     result VARCHAR(20) NOT NULL DEFAULT 'Scheduled',
     match_date DATE NOT NULL,
+    kickoff_at DATETIME NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (home_team_id) REFERENCES teams(id),
     FOREIGN KEY (away_team_id) REFERENCES teams(id)
@@ -50,10 +52,114 @@ CREATE TABLE IF NOT EXISTS user_predictions (
     user_id INTEGER NOT NULL REFERENCES users(id),
     match_id INTEGER NOT NULL REFERENCES matches(id),
     prediction VARCHAR(10) NOT NULL CHECK (prediction IN ('Home Win', 'Draw', 'Away Win')),
-    predicted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    predicted_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
     UNIQUE(user_id, match_id)
 );
 
+-- Head-to-head record per normalized team pair (mirrors HeadToHead in premier_league_stats.sql)
+CREATE TABLE IF NOT EXISTS head_to_head (
+    team1_id INT NOT NULL,
+    team2_id INT NOT NULL,
+    team1_wins INT NOT NULL DEFAULT 0,
+    team2_wins INT NOT NULL DEFAULT 0,
+    draws INT NOT NULL DEFAULT 0,
+    team1_goals INT NOT NULL DEFAULT 0,
+    team2_goals INT NOT NULL DEFAULT 0,
+    last_match_date DATE,
+    last_updated DATE,
+    PRIMARY KEY (team1_id, team2_id)
+);
+
+-- Players and per-match player statistics (mirror Players and PlayerStats in premier_league_stats.sql)
+CREATE TABLE IF NOT EXISTS players (
+    id INT PRIMARY KEY,
+    team_id INT,
+    name VARCHAR(100) NOT NULL,
+    position VARCHAR(30),
+    shirt_number INT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    KEY idx_players_team (team_id)
+);
+
+CREATE TABLE IF NOT EXISTS player_stats (
+    player_id INT NOT NULL,
+    match_id INT NOT NULL,
+    team_id INT NOT NULL,
+    season VARCHAR(9) NOT NULL,
+    goals INT NOT NULL DEFAULT 0,
+    assists INT NOT NULL DEFAULT 0,
+    yellow_cards INT NOT NULL DEFAULT 0,
+    red_cards INT NOT NULL DEFAULT 0,
+    minutes_played INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (player_id, match_id),
+    KEY idx_player_stats_match (match_id)
+);
+
+-- Pre-aggregated per-season player totals backing the leaderboards
+CREATE TABLE IF NOT EXISTS player_season_totals (
+    player_id INT NOT NULL,
+    season VARCHAR(9) NOT NULL,
+    source VARCHAR(6) NOT NULL DEFAULT 'events',
+    team_id INT,
+    appearances INT NOT NULL DEFAULT 0,
+    goals INT NOT NULL DEFAULT 0,
+    assists INT NOT NULL DEFAULT 0,
+    yellow_cards INT NOT NULL DEFAULT 0,
+    red_cards INT NOT NULL DEFAULT 0,
+    minutes_played INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (player_id, season, source),
+    KEY idx_totals_goals (season, source, goals),
+    KEY idx_totals_assists (season, source, assists),
+    KEY idx_totals_discipline (season, source, red_cards, yellow_cards)
+);
+
+-- Ingest data version watched by the per-worker season stores (season_store.py)
+CREATE TABLE IF NOT EXISTS data_version (
+    id TINYINT PRIMARY KEY,
+    version BIGINT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+INSERT IGNORE INTO data_version (id, version) VALUES (1, 1);
+
+-- Change log of match updates for delta sync (change_log.py)
+CREATE TABLE IF NOT EXISTS match_changes (
+    version BIGINT AUTO_INCREMENT PRIMARY KEY,
+    match_id INT NOT NULL,
+    fields JSON NOT NULL,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_match_changes_changed_at (changed_at)
+);
+
+-- Per-user preferences; notifications go to favourite-team fans and predictors (notifications.py)
+CREATE TABLE IF NOT EXISTS user_preferences (
+    user_id INT PRIMARY KEY REFERENCES users(id),
+    notifications_enabled BOOLEAN NOT NULL DEFAULT FALSE,
+    favorite_team_id INT NULL REFERENCES teams(id),
+    theme VARCHAR(10) NOT NULL DEFAULT 'light',
+    KEY idx_preferences_favorite (favorite_team_id, notifications_enabled)
+);
+
+-- Result notifications queued at ingest (notifications.py)
+CREATE TABLE IF NOT EXISTS notification_jobs (
+    match_id INT PRIMARY KEY,
+    queued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    claimed_by VARCHAR(64) NULL,
+    claimed_at DATETIME NULL,
+    last_user_id INT NOT NULL DEFAULT 0,
+    sent INT NOT NULL DEFAULT 0,
+    finished_at DATETIME NULL,
+    KEY idx_notification_jobs_pending (finished_at, queued_at)
+);
+
+-- This file already contains every migration in schema.py; record that so they are not re-applied.
+-- Keep the version equal to schema.SCHEMA_VERSION when adding a migration.
+CREATE TABLE IF NOT EXISTS schema_version (
+    id TINYINT PRIMARY KEY,
+    version INT NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+INSERT IGNORE INTO schema_version (id, version) VALUES (1, 9);
+
 -- Insert some sample teams
 INSERT INTO teams (name, short_name, team_rank) VALUES
 ('Arsenal', 'ARS', 1),
@@ -0,0 +1,447 @@
+"""In-process columnar snapshot of the `matches` table.
+
+Thirty seasons of history is only ~12k rows, so each worker keeps the whole
+table as NumPy arrays and computes standings, team statistics, form and
+head-to-heads with vectorized operations instead of re-aggregating in MySQL
+on every page view. Ingest bumps `data_version` in the same transaction as
+its match writes; each worker checks that counter at most every
+SEASON_STORE_CHECK_INTERVAL seconds and reloads only when it moved.
+"""
+import logging
+import threading
+import time
+import numpy as np
+from stats_engine import FINISHED_RESULTS, FORM_WINDOWS, SPLIT_COLUMNS, combine_splits
+
+logger = logging.getLogger(__name__)
+
+DATA_VERSION_DDL = """
+    CREATE TABLE IF NOT EXISTS data_version (
+        id TINYINT PRIMARY KEY,
+        version BIGINT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+"""
+
+BUMP_DATA_VERSION_QUERY = """
+    INSERT INTO data_version (id, version) VALUES (1, 1)
+    ON DUPLICATE KEY UPDATE version = version + 1
+"""
+
+DATA_VERSION_QUERY = "SELECT version FROM data_version WHERE id = 1"
+
+# A no-op upsert: it takes the row's exclusive lock (creating the row if needed)
+LOCK_INGEST_QUERY = """
+    INSERT INTO data_version (id, version) VALUES (1, 1)
+    ON DUPLICATE KEY UPDATE version = version
+"""
+
+STORE_MATCHES_QUERY = """
+    SELECT id, season, matchday, match_date, home_team_id, away_team_id, home_goals, away_goals, result
+    FROM matches
+    ORDER BY match_date, id
+"""
+
+STORE_TEAMS_QUERY = "SELECT id, name, short_name FROM teams"
+
+FORM_LETTERS = np.array(['L', 'D', 'W'])
+
+STANDINGS_FIELDS = ('played', 'won', 'drawn', 'goals_for', 'goals_against')
+
+
+def lock_ingest(cursor):
+    """Serialize ingest transactions on the data_version row; call first, before reading stored matches."""
+    cursor.execute(LOCK_INGEST_QUERY)
+
+
+def bump_data_version(cursor):
+    """Tell every worker's season store that `matches` changed (call inside the write transaction)."""
+    cursor.execute(BUMP_DATA_VERSION_QUERY)
+
+
+class SeasonSnapshot:
+    """Immutable column arrays for one data version.
+
+    Every match appears twice in the long view, once from each team's side
+    (team, opponent, scored, conceded, venue), so per-team aggregates are a
+    bincount over a boolean mask. Per-season standings histories are built
+    on first use and kept for the life of the snapshot.
+    """
+
+    def __init__(self, version, matches, teams):
+        self.version = version
+        self.teams = {team['id']: team for team in teams}
+        count = len(matches)
+        self.match_ids = np.fromiter((m['id'] for m in matches), dtype=np.int64, count=count)
+        self.dates = np.array([m['match_date'] for m in matches], dtype='datetime64[D]')
+        self.results = np.array([m['result'] for m in matches], dtype=object)
+        self.seasons, self.season_idx = np.unique(np.array([m['season'] for m in matches], dtype=str),
+                                                  return_inverse=True)
+        self.team_ids = np.array(sorted({m['home_team_id'] for m in matches} | {m['away_team_id'] for m in matches}
+                                        | set(self.teams)), dtype=np.int64)
+        home = np.fromiter((m['home_team_id'] for m in matches), dtype=np.int64, count=count)
+        away = np.fromiter((m['away_team_id'] for m in matches), dtype=np.int64, count=count)
+        self.home = np.searchsorted(self.team_ids, home)
+        self.away = np.searchsorted(self.team_ids, away)
+        self.home_goals = np.fromiter((m['home_goals'] or 0 for m in matches), dtype=np.int64, count=count)
+        self.away_goals = np.fromiter((m['away_goals'] or 0 for m in matches), dtype=np.int64, count=count)
+        self.matchday_numbers = np.fromiter((m['matchday'] or 0 for m in matches), dtype=np.int64, count=count)
+        self.finished = np.isin(self.results, FINISHED_RESULTS)
+        self._histories = {}
+
+        # Long view: home side first, then away side
+        self.l_team = np.concatenate([self.home, self.away])
+        self.l_opponent = np.concatenate([self.away, self.home])
+        self.l_scored = np.concatenate([self.home_goals, self.away_goals])
+        self.l_conceded = np.concatenate([self.away_goals, self.home_goals])
+        self.l_home = np.concatenate([np.ones(count, dtype=bool), np.zeros(count, dtype=bool)])
+        self.l_match = np.concatenate([np.arange(count), np.arange(count)])
+        self.l_finished = np.concatenate([self.finished, self.finished])
+        self.l_season = np.concatenate([self.season_idx, self.season_idx])
+        self.l_points = np.where(self.l_scored > self.l_conceded, 3, np.where(self.l_scored == self.l_conceded, 1, 0))
+
+    def _team_index(self, team_id):
+        index = np.searchsorted(self.team_ids, team_id)
+        if index < len(self.team_ids) and self.team_ids[index] == team_id:
+            return index
+        return None
+
+    def _match_row(self, i):
+        home_id = int(self.team_ids[self.home[i]])
+        away_id = int(self.team_ids[self.away[i]])
+        home_team = self.teams.get(home_id, {})
+        away_team = self.teams.get(away_id, {})
+        return {
+            'id': int(self.match_ids[i]),
+            'season': str(self.seasons[self.season_idx[i]]),
+            'match_date': self.dates[i].item(),
+            'home_team_id': home_id,
+            'away_team_id': away_id,
+            'home_goals': int(self.home_goals[i]),
+            'away_goals': int(self.away_goals[i]),
+            'result': self.results[i],
+            'HomeTeamName': home_team.get('name'),
+            'AwayTeamName': away_team.get('name'),
+            'HomeTeamShort': home_team.get('short_name'),
+            'AwayTeamShort': away_team.get('short_name'),
+        }
+
+    def match_count(self):
+        return len(self.match_ids)
+
+    def recent_matches(self, limit, offset=0):
+        """Matches newest first."""
+        order = np.arange(len(self.match_ids))[::-1]
+        return [self._match_row(i) for i in order[offset:offset + limit]]
+
+    def upcoming_matches(self, today):
+        """Matches on or after today, soonest first."""
+        indices = np.nonzero(self.dates >= np.datetime64(today, 'D'))[0]
+        return [self._match_row(i) for i in indices]
+
+    def current_season(self):
+        """The season of the latest finished match (or of the latest fixture before any are played)."""
+        if not len(self.match_ids):
+            return None
+        finished = np.nonzero(self.finished)[0]
+        last = finished[-1] if len(finished) else len(self.match_ids) - 1
+        return str(self.seasons[self.season_idx[last]])
+
+    def season_at(self, day):
+        """The season in play on a date: that of the latest fixture on or before it (else the first season)."""
+        if not len(self.match_ids):
+            return None
+        before = np.nonzero(self.dates <= np.datetime64(day, 'D'))[0]
+        last = before[np.argmax(self.dates[before])] if len(before) else np.argmin(self.dates)
+        return str(self.seasons[self.season_idx[last]])
+
+    def _season_code(self, season):
+        codes = np.nonzero(self.seasons == season)[0]
+        return codes[0] if len(codes) else None
+
+    def _season_history(self, code):
+        """Cumulative per-team totals for a season, by match date and by matchday.
+
+        by_date[d, t] and by_matchday[k, t] hold STANDINGS_FIELDS totals for
+        team t after days[d] / matchdays[k], so an as-of table is one row lookup.
+        """
+        history = self._histories.get(code)
+        if history is not None:
+            return history
+        matches = np.nonzero(self.season_idx == code)[0]
+        teams = np.unique(np.concatenate([self.home[matches], self.away[matches]]))
+        finished = matches[self.finished[matches]]
+        home = np.searchsorted(teams, self.home[finished])
+        away = np.searchsorted(teams, self.away[finished])
+        home_goals = self.home_goals[finished]
+        away_goals = self.away_goals[finished]
+
+        days, day_bucket = np.unique(self.dates[finished], return_inverse=True)
+        matchday = self.matchday_numbers[finished].copy()
+        unknown = matchday == 0
+        if unknown.any():
+            # Matches stored before matchdays were recorded: one round per len(teams) / 2 results
+            matchday[unknown] = np.nonzero(unknown)[0] // max(len(teams) // 2, 1) + 1
+        matchdays, matchday_bucket = np.unique(matchday, return_inverse=True)
+
+        def cumulative(bucket, buckets):
+            totals = np.zeros((buckets, len(teams), len(STANDINGS_FIELDS)), dtype=np.int64)
+            for side, scored, conceded in ((home, home_goals, away_goals), (away, away_goals, home_goals)):
+                values = np.stack([np.ones_like(scored), scored > conceded, scored == conceded,
+                                   scored, conceded], axis=1).astype(np.int64)
+                np.add.at(totals, (bucket, side), values)
+            return np.cumsum(totals, axis=0)
+
+        history = {
+            'teams': teams,
+            'days': days,
+            'by_date': cumulative(day_bucket, len(days)),
+            'matchdays': matchdays,
+            'by_matchday': cumulative(matchday_bucket, len(matchdays)),
+        }
+        self._histories[code] = history
+        return history
+
+    @staticmethod
+    def _standing_order(totals):
+        """Team order for a totals matrix: points, then goal difference, then goals scored."""
+        played, won, drawn, goals_for, goals_against = totals.T
+        return np.lexsort((-goals_for, -(goals_for - goals_against), -(3 * won + drawn)))
+
+    def _table(self, teams, totals):
+        table = []
+        for rank, i in enumerate(self._standing_order(totals), start=1):
+            played, won, drawn, goals_for, goals_against = (int(value) for value in totals[i])
+            team_id = int(self.team_ids[teams[i]])
+            info = self.teams.get(team_id, {})
+            table.append({
+                'name': info.get('name'), 'short_name': info.get('short_name'), 'team_id': team_id,
+                'Played': played, 'Won': won, 'Drawn': drawn, 'Lost': played - won - drawn,
+                'GoalsFor': goals_for, 'GoalsAgainst': goals_against,
+                'Points': 3 * won + drawn, 'team_rank': rank,
+            })
+        return table
+
+    @staticmethod
+    def _totals_at(cumulative, index, team_count):
+        if index < 0:
+            return np.zeros((team_count, len(STANDINGS_FIELDS)), dtype=np.int64)
+        return cumulative[index]
+
+    def standings(self, season=None, as_of=None, matchday=None):
+        """League table after a date or matchday (default: now), best placed first.
+
+        Every club with a fixture in the season is listed, played or not; rows
+        have the keys the league table templates use (Played, Won, ..., Points).
+        """
+        code = self._season_code(season or self.current_season())
+        if code is None:
+            return []
+        history = self._season_history(code)
+        team_count = len(history['teams'])
+        if matchday is not None:
+            index = np.searchsorted(history['matchdays'], matchday, side='right') - 1
+            totals = self._totals_at(history['by_matchday'], index, team_count)
+        else:
+            if as_of is None:
+                index = len(history['days']) - 1
+            else:
+                index = np.searchsorted(history['days'], np.datetime64(as_of, 'D'), side='right') - 1
+            totals = self._totals_at(history['by_date'], index, team_count)
+        return self._table(history['teams'], totals)
+
+    def league_table(self, season=None):
+        """Current standings for a season (default: the current one)."""
+        return self.standings(season)
+
+    def matchdays(self, season=None):
+        """Matchdays with at least one finished match in a season."""
+        code = self._season_code(season or self.current_season())
+        if code is None:
+            return []
+        return [int(matchday) for matchday in self._season_history(code)['matchdays']]
+
+    def standings_history(self, season=None):
+        """League position and points of every club after every matchday of a season."""
+        season = season or self.current_season()
+        code = self._season_code(season)
+        if code is None:
+            return None
+        history = self._season_history(code)
+        positions = []
+        points = []
+        for totals in history['by_matchday']:
+            rank = np.empty(len(history['teams']), dtype=np.int64)
+            rank[self._standing_order(totals)] = np.arange(1, len(history['teams']) + 1)
+            positions.append(rank.tolist())
+            points.append((3 * totals[:, 1] + totals[:, 2]).tolist())
+        teams = []
+        for index in history['teams']:
+            team_id = int(self.team_ids[index])
+            info = self.teams.get(team_id, {})
+            teams.append({'team_id': team_id, 'name': info.get('name'), 'short_name': info.get('short_name')})
+        return {
+            'season': season,
+            'teams': teams,
+            'matchdays': [int(matchday) for matchday in history['matchdays']],
+            # positions[k][i] is teams[i]'s position after matchdays[k]
+            'positions': positions,
+            'points': points,
+        }
+
+    def ranks(self, season=None):
+        """{team_id: league position} for a season."""
+        return {row['team_id']: row['team_rank'] for row in self.league_table(season)}
+
+    def _form_rows(self, positions):
+        """One row per team and match (venue, points, goals) for long-view positions, newest first."""
+        rows = []
+        for p in positions[::-1]:
+            match = self.l_match[p]
+            opponent_id = int(self.team_ids[self.l_opponent[p]])
+            rows.append({
+                'team_id': int(self.team_ids[self.l_team[p]]),
+                'match_id': int(self.match_ids[match]),
+                'season': str(self.seasons[self.l_season[p]]),
+                'match_date': self.dates[match].item(),
+                'venue': 'H' if self.l_home[p] else 'A',
+                'points': int(self.l_points[p]),
+                'goals_scored': int(self.l_scored[p]),
+                'goals_conceded': int(self.l_conceded[p]),
+                'opponent_name': self.teams.get(opponent_id, {}).get('name'),
+            })
+        return rows
+
+    def _team_positions(self, index, season_code=None):
+        """Finished long-view positions of a team in chronological order."""
+        mask = (self.l_team == index) & self.l_finished
+        if season_code is not None:
+            mask &= self.l_season == season_code
+        positions = np.nonzero(mask)[0]
+        return positions[np.argsort(self.l_match[positions], kind='stable')]
+
+    def team_recent_form(self, team_id, limit=10):
+        """Last results across seasons, newest first."""
+        index = self._team_index(team_id)
+        if index is None:
+            return []
+        return self._form_rows(self._team_positions(index)[-limit:])
+
+    def team_seasons(self, team_id):
+        """Per-season home/away summaries newest first, with combine_splits totals."""
+        index = self._team_index(team_id)
+        if index is None:
+            return []
+        mask = (self.l_team == index) & self.l_finished
+        seasons_played = np.unique(self.l_season[mask])
+        summaries = []
+        for code in seasons_played[::-1]:
+            row = {'team_id': team_id, 'season': str(self.seasons[code])}
+            for venue, side in (('home', True), ('away', False)):
+                split = mask & (self.l_season == code) & (self.l_home == side)
+                scored = self.l_scored[split]
+                conceded = self.l_conceded[split]
+                values = (len(scored), int((scored > conceded).sum()), int((scored == conceded).sum()),
+                          int((scored < conceded).sum()), int(scored.sum()), int(conceded.sum()),
+                          int((conceded == 0).sum()))
+                row.update({f"{venue}_{col}": value for col, value in zip(SPLIT_COLUMNS, values)})
+            recent = self._team_positions(index, code)
+            for window in FORM_WINDOWS:
+                window_positions = recent[-window:]
+                row[f'form_last{window}'] = ''.join(FORM_LETTERS[np.minimum(self.l_points[window_positions], 2)])
+                row[f'points_last{window}'] = int(self.l_points[window_positions].sum())
+                row[f'goals_for_last{window}'] = int(self.l_scored[window_positions].sum())
+                row[f'goals_against_last{window}'] = int(self.l_conceded[window_positions].sum())
+            summaries.append(combine_splits(row))
+        return summaries
+
+    def head_to_head(self, pairs):
+        """{(team_a, team_b): record} in the shape head_to_head.orient_rows returns."""
+        records = {}
+        for team_a, team_b in pairs:
+            a = self._team_index(team_a)
+            b = self._team_index(team_b)
+            record = {'team_a_id': team_a, 'team_b_id': team_b, 'team_a_wins': 0, 'team_b_wins': 0,
+                      'draws': 0, 'team_a_goals': 0, 'team_b_goals': 0, 'played': 0, 'last_match_date': None}
+            if a is not None and b is not None:
+                mask = (self.l_team == a) & (self.l_opponent == b) & self.l_finished
+                scored = self.l_scored[mask]
+                conceded = self.l_conceded[mask]
+                record.update({
+                    'team_a_wins': int((scored > conceded).sum()),
+                    'team_b_wins': int((scored < conceded).sum()),
+                    'draws': int((scored == conceded).sum()),
+                    'team_a_goals': int(scored.sum()),
+                    'team_b_goals': int(conceded.sum()),
+                    'played': int(mask.sum()),
+                })
+                if record['played']:
+                    record['last_match_date'] = self.dates[self.l_match[mask]].max().item()
+            records[(team_a, team_b)] = record
+        return records
+
+
+class SeasonStore:
+    """Per-worker holder of the current SeasonSnapshot, reloaded when data_version moves."""
+
+    def __init__(self, connect, check_interval=5):
+        self.connect = connect
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def _load(self, cursor, version):
+        cursor.execute(STORE_MATCHES_QUERY)
+        matches = cursor.fetchall()
+        cursor.execute(STORE_TEAMS_QUERY)
+        teams = cursor.fetchall()
+        started = time.perf_counter()
+        snapshot = SeasonSnapshot(version, matches, teams)
+        logger.info(f"Loaded season store version {version}: {len(matches)} matches "
+                    f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return snapshot
+
+    def refresh(self, connect=None):
+        """Check the data version now and reload if it moved forward."""
+        cnx = (connect or self.connect)()
+        cursor = cnx.cursor(dictionary=True)
+        try:
+            cursor.execute(DATA_VERSION_QUERY)
+            row = cursor.fetchone()
+            version = row['version'] if row else 0
+            # Versions only grow; a lagging replica must not send us back to an older snapshot
+            if self._snapshot is None or version > self._snapshot.version:
+                self._snapshot = self._load(cursor, version)
+            self._checked_at = time.monotonic()
+        finally:
+            cursor.close()
+            cnx.close()
+        return self._snapshot
+
+    def expire(self):
+        """Make the next snapshot() call check the data version."""
+        self._checked_at = 0
+
+    def snapshot(self):
+        """Return the current snapshot, checking the data version at most every check_interval."""
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    return self.refresh()
+        if time.monotonic() - self._checked_at >= self.check_interval and self._lock.acquire(blocking=False):
+            # One thread checks; the others keep serving the snapshot they have
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Could not refresh season store: {e}")
+                self._checked_at = time.monotonic()
+            finally:
+                self._lock.release()
+        return self._snapshot
+
+
+def init_season_store(app, connect):
+    """Create the per-process season store; it loads on first use (or in preload_shared_state)."""
+    app.extensions['season_store'] = SeasonStore(connect, app.config['SEASON_STORE_CHECK_INTERVAL'])
+    return app.extensions['season_store']
@@ -32,7 +32,7 @@ def setup_database():
                 id INT AUTO_INCREMENT PRIMARY KEY,
                 username VARCHAR(80) UNIQUE NOT NULL,
                 email VARCHAR(120) UNIQUE NOT NULL,
-                password_hash VARCHAR(128) NOT NULL,
+                password_hash VARCHAR(256) NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
@@ -78,7 +78,7 @@ def setup_database():
             )
         """)
         
-        # Create user_preferences table
+        # Create user_preferences table (migration-1 layout; schema migration 7 types its columns on first boot)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS user_preferences (
                 user_id INT PRIMARY KEY,
@@ -0,0 +1,78 @@
+"""Shapes of the per-team statistics served by the season store.
+
+Team pages and the API compute home/away splits and form from the season
+store (season_store.py). The `team_season_stats` and `team_form` tables that
+ingest used to maintain are dropped by schema migration 9; their DDL stays
+here because migration 2 still creates them on the way there.
+"""
+
+FINISHED_RESULTS = ('Home Win', 'Draw', 'Away Win')
+FORM_WINDOWS = (5, 10)
+
+SPLIT_COLUMNS = ('played', 'won', 'drawn', 'lost', 'goals_for', 'goals_against', 'clean_sheets')
+
+TEAM_SEASON_STATS_DDL = """
+    CREATE TABLE IF NOT EXISTS team_season_stats (
+        team_id INT NOT NULL,
+        season VARCHAR(9) NOT NULL,
+        home_played INT NOT NULL DEFAULT 0,
+        home_won INT NOT NULL DEFAULT 0,
+        home_drawn INT NOT NULL DEFAULT 0,
+        home_lost INT NOT NULL DEFAULT 0,
+        home_goals_for INT NOT NULL DEFAULT 0,
+        home_goals_against INT NOT NULL DEFAULT 0,
+        home_clean_sheets INT NOT NULL DEFAULT 0,
+        away_played INT NOT NULL DEFAULT 0,
+        away_won INT NOT NULL DEFAULT 0,
+        away_drawn INT NOT NULL DEFAULT 0,
+        away_lost INT NOT NULL DEFAULT 0,
+        away_goals_for INT NOT NULL DEFAULT 0,
+        away_goals_against INT NOT NULL DEFAULT 0,
+        away_clean_sheets INT NOT NULL DEFAULT 0,
+        form_last5 VARCHAR(5) NOT NULL DEFAULT '',
+        form_last10 VARCHAR(10) NOT NULL DEFAULT '',
+        points_last5 INT NOT NULL DEFAULT 0,
+        points_last10 INT NOT NULL DEFAULT 0,
+        goals_for_last5 INT NOT NULL DEFAULT 0,
+        goals_against_last5 INT NOT NULL DEFAULT 0,
+        goals_for_last10 INT NOT NULL DEFAULT 0,
+        goals_against_last10 INT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (team_id, season)
+    )
+"""
+
+TEAM_FORM_DDL = """
+    CREATE TABLE IF NOT EXISTS team_form (
+        team_id INT NOT NULL,
+        match_id INT NOT NULL,
+        season VARCHAR(9) NOT NULL,
+        match_date DATE NOT NULL,
+        venue CHAR(1) NOT NULL,
+        points INT NOT NULL,
+        goals_scored INT NOT NULL,
+        goals_conceded INT NOT NULL,
+        PRIMARY KEY (team_id, match_id),
+        KEY idx_team_form_recent (team_id, season, match_date)
+    )
+"""
+
+
+def is_finished(match):
+    return match is not None and match['result'] in FINISHED_RESULTS
+
+
+def combine_splits(row):
+    """Add overall totals (matching the old team_stats keys) to a home/away split row."""
+    if not row:
+        return None
+    stats = dict(row)
+    stats['total_matches'] = row['home_played'] + row['away_played']
+    stats['wins'] = row['home_won'] + row['away_won']
+    stats['draws'] = row['home_drawn'] + row['away_drawn']
+    stats['losses'] = row['home_lost'] + row['away_lost']
+    stats['goals_for'] = row['home_goals_for'] + row['away_goals_for']
+    stats['goals_against'] = row['home_goals_against'] + row['away_goals_against']
+    stats['clean_sheets'] = row['home_clean_sheets'] + row['away_clean_sheets']
+    stats['points'] = stats['wins'] * 3 + stats['draws']
+    return stats
@@ -0,0 +1,73 @@
+"""Delta sync responses and the resync (`reset`) decision."""
+import datetime
+import threading
+import time
+
+from change_log import ChangeFeed, shape_changes
+
+
+def row(version, match_id=1):
+    return {'version': version, 'match_id': match_id, 'fields': '{"home_goals": 1}',
+            'changed_at': datetime.datetime(2024, 8, 17, 15, 0)}
+
+
+def test_client_inside_the_retained_range_gets_the_rows_after_it():
+    body = shape_changes([row(11), row(12)], since=10, oldest=5, latest=12, limit=500)
+    assert [change['version'] for change in body['changes']] == [11, 12]
+    assert body['version'] == 12 and not body['reset'] and not body['more']
+
+
+def test_client_right_before_the_oldest_row_needs_no_reset():
+    assert not shape_changes([row(5)], since=4, oldest=5, latest=5, limit=500)['reset']
+
+
+def test_client_behind_the_pruned_range_resets():
+    assert shape_changes([row(20)], since=3, oldest=20, latest=20, limit=500)['reset']
+
+
+def test_client_ahead_of_the_log_resets():
+    # e.g. the table was emptied or the client synced against another database
+    assert shape_changes([], since=40, oldest=0, latest=0, limit=500)['reset']
+    assert shape_changes([], since=40, oldest=20, latest=30, limit=500)['reset']
+
+
+def test_first_sync_never_resets():
+    body = shape_changes([row(1)], since=0, oldest=1, latest=1, limit=1)
+    assert not body['reset'] and body['more']
+
+
+class FakeConnection:
+    """Change log connection whose MAX(version) is whatever the test sets."""
+
+    def __init__(self, log):
+        self.log = log
+
+    def cursor(self, dictionary=False):
+        return self
+
+    def execute(self, query, params=()):
+        pass
+
+    def fetchone(self):
+        return {'version': self.log['latest']}
+
+    def close(self):
+        pass
+
+
+def test_wait_returns_at_once_when_the_waiter_cap_is_reached():
+    log = {'latest': 7}
+    feed = ChangeFeed(lambda: FakeConnection(log), check_interval=0.01)
+    waiter = threading.Thread(target=feed.wait, args=(7, 5, 1))
+    waiter.start()
+    while not feed._waiters:
+        time.sleep(0.001)
+
+    started = time.monotonic()
+    assert feed.wait(7, 5, limit=1) is False
+    assert time.monotonic() - started < 1
+
+    log['latest'] = 8
+    waiter.join(2)
+    assert not waiter.is_alive()
+    assert feed.wait(7, 5, limit=1) is True
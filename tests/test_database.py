@@ -0,0 +1,128 @@
+"""Read routing between the primary and two replicas, with connections faked per host."""
+import logging
+
+import pytest
+
+pytest.importorskip('dotenv')
+mysql_connector = pytest.importorskip('mysql.connector')
+flask = pytest.importorskip('flask')
+
+import database  # noqa: E402
+from database import get_read_connection, mark_write, parse_replicas, replica_router  # noqa: E402
+
+
+class FakeServer:
+    """One MySQL server: its replication lag, or the error SHOW REPLICA STATUS raises."""
+
+    def __init__(self, host, lag=0, status_error=None):
+        self.host = host
+        self.lag = lag
+        self.status_error = status_error
+        self.connections = 0
+
+
+class FakeConnection:
+
+    def __init__(self, server):
+        self.server = server
+        self.host = server.host
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.server, dictionary)
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+
+    def __init__(self, server, dictionary):
+        self.server = server
+        self.dictionary = dictionary
+        self.row = None
+
+    def execute(self, query):
+        if query == 'SELECT 1':
+            self.row = (1,)
+        elif query == 'SHOW REPLICA STATUS':
+            if self.server.status_error is not None:
+                raise mysql_connector.Error(msg='denied', errno=self.server.status_error)
+            self.row = {'Seconds_Behind_Source': self.server.lag}
+        else:
+            raise AssertionError(f"Unexpected query {query}")
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    servers = {host: FakeServer(host) for host in ('primary', 'replica-a', 'replica-b')}
+
+    def connect(**config):
+        server = servers['primary' if config['pool_name'] == 'mypool' else config['host']]
+        server.connections += 1
+        return FakeConnection(server)
+
+    monkeypatch.setattr(database.mysql.connector, 'connect', connect)
+    monkeypatch.setitem(database.MYSQL_CONFIG, 'host', 'primary')
+    replica_router.configure(parse_replicas('replica-a,replica-b:3307/stats'), max_lag=5,
+                             check_interval=10, pool_size=5)
+    yield servers
+    replica_router.configure([], 5, 10, 5)
+
+
+@pytest.fixture
+def app():
+    app = flask.Flask(__name__)
+    app.secret_key = 'test'
+    app.config['READ_YOUR_WRITES_WINDOW'] = 30
+    return app
+
+
+def test_parse_replicas_keeps_ports_and_databases():
+    first, second = parse_replicas('replica-a, replica-b:3307/stats')
+    assert first['host'] == 'replica-a' and 'pool_size' not in first
+    assert (second['host'], second['port'], second['database']) == ('replica-b', 3307, 'stats')
+
+
+def test_reads_go_to_the_replicas_in_turn(servers, app):
+    with app.test_request_context('/'):
+        hosts = [get_read_connection().host for _ in range(4)]
+    assert hosts == ['replica-a', 'replica-b', 'replica-a', 'replica-b']
+    assert servers['primary'].connections == 0
+
+
+def test_lagging_replica_is_skipped(servers, app):
+    servers['replica-a'].lag = 60
+    with app.test_request_context('/'):
+        hosts = [get_read_connection().host for _ in range(3)]
+    assert hosts == ['replica-b', 'replica-b', 'replica-b']
+
+
+def test_reads_fall_back_to_the_primary_when_every_replica_lags(servers, app):
+    servers['replica-a'].lag = 60
+    servers['replica-b'].lag = None  # replication stopped
+    with app.test_request_context('/'):
+        assert get_read_connection().host == 'primary'
+
+
+def test_mark_write_pins_reads_to_the_primary_for_the_window(servers, app, monkeypatch):
+    with app.test_request_context('/'):
+        mark_write()
+        assert get_read_connection().host == 'primary'
+        now = database.time.time()
+        monkeypatch.setattr(database.time, 'time', lambda: now + 31)
+        assert get_read_connection().host == 'replica-a'
+
+
+def test_missing_replication_privilege_is_reported_as_a_config_error(servers, app, caplog):
+    denied = mysql_connector.errorcode.ER_SPECIFIC_ACCESS_DENIED_ERROR
+    servers['replica-a'].status_error = denied
+    servers['replica-b'].status_error = denied
+    with caplog.at_level(logging.ERROR, logger='database'), app.test_request_context('/'):
+        assert get_read_connection().host == 'primary'
+    assert 'lacks REPLICATION CLIENT on read replica replica-a' in caplog.text
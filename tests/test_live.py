@@ -0,0 +1,42 @@
+"""Live stream subscriptions and the per-process stream cap."""
+import os
+
+from live import LiveBroadcaster, SnapshotFile, open_stream
+
+
+def broadcaster(tmp_path):
+    snapshot = SnapshotFile(os.path.join(tmp_path, 'live.json'))
+    snapshot.write(3, {'1': {'home_score': 0, 'away_score': 0}})
+    return LiveBroadcaster(snapshot, check_interval=60)
+
+
+def test_cap_refuses_streams_past_the_limit(tmp_path):
+    live = broadcaster(tmp_path)
+    assert open_stream(live, limit=1) is not None
+    assert open_stream(live, limit=1) is None
+
+
+def test_closing_the_body_iterator_frees_the_slot(tmp_path):
+    # What stream_with_context does when the client disconnects: close the generator, not the stream
+    live = broadcaster(tmp_path)
+    body = iter(open_stream(live, limit=1, keepalive=0.01))
+    assert next(body).startswith('id: 3\nevent: snapshot')
+    assert next(body) == ': keepalive\n\n'
+    assert open_stream(live, limit=1) is None
+    body.close()
+    assert open_stream(live, limit=1) is not None
+
+
+def test_closing_an_unstarted_stream_frees_the_slot(tmp_path):
+    live = broadcaster(tmp_path)
+    open_stream(live, limit=1).close()
+    assert open_stream(live, limit=1) is not None
+
+
+def test_scores_are_pushed_to_subscribers(tmp_path):
+    live = broadcaster(tmp_path)
+    body = iter(open_stream(live, limit=1))
+    next(body)
+    live.publish({'version': 4, 'matches': {'1': {'home_score': 1, 'away_score': 0}}})
+    assert next(body).startswith('id: 4\nevent: scores')
+    body.close()
@@ -0,0 +1,193 @@
+"""Notification delivery against a local SMTP stand-in."""
+import email
+import socketserver
+import threading
+
+import pytest
+
+import notifications
+from notifications import NotificationWorker, SMTPTransport
+
+
+class SMTPStandIn(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Minimal SMTP server that records delivered messages and refuses `refused@` recipients."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.lock = threading.Lock()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply('220 stand-in ready')
+        recipients, data = [], None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if data is not None:
+                if line == b'.\r\n':
+                    with self.server.lock:
+                        self.server.messages.append(email.message_from_bytes(b''.join(data)))
+                    data, recipients = None, []
+                    self.reply('250 queued')
+                else:
+                    data.append(line[1:] if line.startswith(b'..') else line)
+                continue
+            command = line.decode('ascii').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 stand-in')
+            elif verb == 'RCPT':
+                if 'refused@' in command:
+                    self.reply('550 no such user')
+                else:
+                    recipients.append(command)
+                    self.reply('250 ok')
+            elif verb == 'DATA':
+                data = []
+                self.reply('354 go ahead')
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class FakeNotificationDB:
+    """Answers the worker's queries for one queued match and a list of recipients."""
+
+    def __init__(self, match, recipients):
+        self.match = match
+        self.recipients = recipients
+        self.claimed = False
+        self.finished = False
+        self.last_user_id = 0
+        self.sent = 0
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, query, params=()):
+        db = self.db
+        if query == notifications.CLAIM_JOBS_QUERY:
+            self.rowcount = 0 if db.claimed else 1
+            db.claimed = True
+        elif query == notifications.CLAIMED_MATCHES_QUERY:
+            self.rows = [db.match]
+        elif query == notifications.RECIPIENTS_QUERY:
+            limit = params[-1]
+            self.rows = [row for row in db.recipients if row['user_id'] > db.last_user_id][:limit]
+        elif query == notifications.FINISH_JOBS_QUERY:
+            db.finished = True
+        else:
+            raise AssertionError(f"Unexpected query {query}")
+
+    def executemany(self, query, rows):
+        assert query == notifications.CHECKPOINT_QUERY
+        for last_user_id, sent, match_id, token in rows:
+            self.db.last_user_id = max(self.db.last_user_id, last_user_id)
+            self.db.sent += sent
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class PlainTemplate:
+
+    def render(self, username, items):
+        return f"Hi {username}: " + ', '.join(item['match']['result'] for item in items)
+
+
+def recipient(user_id, address, prediction=None):
+    return {'user_id': user_id, 'username': f'user{user_id}', 'email': address, 'match_id': 1,
+            'prediction': prediction, 'favorite': 0 if prediction else 1}
+
+
+def test_worker_delivers_one_message_per_recipient_in_batches(smtp_server):
+    match = {'id': 1, 'home_team': 'Arsenal', 'away_team': 'Chelsea',
+             'home_goals': 2, 'away_goals': 1, 'result': 'Home Win'}
+    recipients = [recipient(i, f'user{i}@example.com', 'Home Win' if i % 2 else None) for i in range(1, 8)]
+    db = FakeNotificationDB(match, recipients)
+    transport = SMTPTransport('127.0.0.1', smtp_server.server_address[1], pool_size=2)
+    worker = NotificationWorker(db.connect, transport, PlainTemplate(), 'noreply@example.com', batch_size=3)
+    try:
+        assert worker.run_once() == 7
+        assert worker.run_once() is None
+    finally:
+        transport.close()
+
+    assert sorted(message['To'] for message in smtp_server.messages) == [r['email'] for r in recipients]
+    assert {message['Subject'] for message in smtp_server.messages} == {'Arsenal 2-1 Chelsea'}
+    assert db.finished and db.last_user_id == 7 and db.sent == 7
+    # Connections are pooled and reused across batches
+    assert smtp_server.connections <= 2
+
+
+def test_refused_recipient_keeps_the_connection_and_is_not_resent(smtp_server):
+    transport = SMTPTransport('127.0.0.1', smtp_server.server_address[1], pool_size=1)
+    messages = []
+    for address in ('a@example.com', 'refused@example.com', 'b@example.com'):
+        message = email.message.EmailMessage()
+        message['From'] = 'noreply@example.com'
+        message['To'] = address
+        message['Subject'] = 'Result'
+        message.set_content('Arsenal 2-1 Chelsea')
+        messages.append(message)
+    try:
+        assert transport.send_many(messages) == [True, False, True]
+    finally:
+        transport.close()
+
+    assert [message['To'] for message in smtp_server.messages] == ['a@example.com', 'b@example.com']
+    assert smtp_server.connections == 1
@@ -0,0 +1,140 @@
+"""Season store standings against a naive recomputation over a small fixture list."""
+import datetime
+import itertools
+import random
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from season_store import SeasonSnapshot  # noqa: E402
+
+TEAMS = [{'id': team_id, 'name': f'Team {team_id}', 'short_name': f'T{team_id}'} for team_id in (57, 61, 64, 65, 66)]
+SEASON_STARTS = {'2023/2024': datetime.date(2023, 8, 12), '2024/2025': datetime.date(2024, 8, 17)}
+
+
+def fixture_list():
+    """Double round-robin per season, a week per matchday; the last two matchdays of 2024/2025 unplayed."""
+    rng = random.Random(7)
+    matches = []
+    team_ids = [team['id'] for team in TEAMS]
+    for season, start in SEASON_STARTS.items():
+        pairs = list(itertools.permutations(team_ids, 2))
+        rng.shuffle(pairs)
+        rounds = [pairs[i:i + 2] for i in range(0, len(pairs), 2)]
+        for matchday, pairing in enumerate(rounds, start=1):
+            for slot, (home, away) in enumerate(pairing):
+                played = season == '2023/2024' or matchday <= len(rounds) - 2
+                home_goals, away_goals = (rng.randint(0, 3), rng.randint(0, 3)) if played else (0, 0)
+                if not played:
+                    result = 'Scheduled'
+                elif home_goals > away_goals:
+                    result = 'Home Win'
+                elif home_goals < away_goals:
+                    result = 'Away Win'
+                else:
+                    result = 'Draw'
+                matches.append({
+                    'id': len(matches) + 1, 'season': season, 'matchday': matchday,
+                    # Two games a round on different days, so by-date and by-matchday cuts differ
+                    'match_date': start + datetime.timedelta(days=7 * (matchday - 1) + slot),
+                    'home_team_id': home, 'away_team_id': away,
+                    'home_goals': home_goals, 'away_goals': away_goals, 'result': result,
+                })
+    return sorted(matches, key=lambda m: (m['match_date'], m['id']))
+
+
+@pytest.fixture(scope='module')
+def matches():
+    return fixture_list()
+
+
+@pytest.fixture(scope='module')
+def snapshot(matches):
+    return SeasonSnapshot(1, matches, TEAMS)
+
+
+def naive_table(matches, season, include):
+    """{team_id: (Played, Won, Drawn, Lost, GoalsFor, GoalsAgainst, Points)} by summing every included result."""
+    totals = {}
+    for match in matches:
+        if match['season'] != season:
+            continue
+        for team_id in (match['home_team_id'], match['away_team_id']):
+            totals.setdefault(team_id, [0] * 7)
+        if match['result'] == 'Scheduled' or not include(match):
+            continue
+        sides = ((match['home_team_id'], match['home_goals'], match['away_goals']),
+                 (match['away_team_id'], match['away_goals'], match['home_goals']))
+        for team_id, scored, conceded in sides:
+            row = totals[team_id]
+            row[0] += 1
+            row[1] += scored > conceded
+            row[2] += scored == conceded
+            row[3] += scored < conceded
+            row[4] += scored
+            row[5] += conceded
+            row[6] += 3 if scored > conceded else 1 if scored == conceded else 0
+    return {team_id: tuple(row) for team_id, row in totals.items()}
+
+
+def as_naive(table):
+    return {row['team_id']: (row['Played'], row['Won'], row['Drawn'], row['Lost'],
+                             row['GoalsFor'], row['GoalsAgainst'], row['Points']) for row in table}
+
+
+def assert_ordered(table):
+    keys = [(row['Points'], row['GoalsFor'] - row['GoalsAgainst'], row['GoalsFor']) for row in table]
+    assert keys == sorted(keys, reverse=True)
+    assert [row['team_rank'] for row in table] == list(range(1, len(table) + 1))
+
+
+@pytest.mark.parametrize('season', sorted(SEASON_STARTS))
+def test_standings_by_date_match_a_naive_recount(matches, snapshot, season):
+    start = SEASON_STARTS[season]
+    for offset in range(-1, 7 * 10 + 3):
+        as_of = start + datetime.timedelta(days=offset)
+        table = snapshot.standings(season, as_of=as_of)
+        assert as_naive(table) == naive_table(matches, season, lambda m: m['match_date'] <= as_of), as_of
+        assert_ordered(table)
+
+
+@pytest.mark.parametrize('season', sorted(SEASON_STARTS))
+def test_standings_by_matchday_match_a_naive_recount(matches, snapshot, season):
+    for matchday in range(0, 12):
+        table = snapshot.standings(season, matchday=matchday)
+        assert as_naive(table) == naive_table(matches, season, lambda m: m['matchday'] <= matchday), matchday
+        assert_ordered(table)
+
+
+def test_current_standings_count_every_finished_match(matches, snapshot):
+    assert as_naive(snapshot.league_table('2024/2025')) == naive_table(matches, '2024/2025', lambda m: True)
+    assert snapshot.current_season() == '2024/2025'
+
+
+def test_history_follows_the_matchday_tables(snapshot):
+    history = snapshot.standings_history('2024/2025')
+    # The last two matchdays are unplayed, so they have no entry
+    assert history['matchdays'] == list(range(1, 9)) == snapshot.matchdays('2024/2025')
+    for k, matchday in enumerate(history['matchdays']):
+        table = {row['team_id']: row for row in snapshot.standings('2024/2025', matchday=matchday)}
+        for i, team in enumerate(history['teams']):
+            assert history['points'][k][i] == table[team['team_id']]['Points']
+            assert history['positions'][k][i] == table[team['team_id']]['team_rank']
+
+
+@pytest.mark.parametrize('day, season', [
+    (datetime.date(2023, 1, 1), '2023/2024'),    # before any fixture: the first season
+    (datetime.date(2023, 9, 1), '2023/2024'),
+    (datetime.date(2024, 7, 1), '2023/2024'),    # summer break: the season that just ended
+    (datetime.date(2024, 8, 17), '2024/2025'),   # opening day
+    (datetime.date(2024, 12, 26), '2024/2025'),  # after the last fixture
+])
+def test_season_at_picks_the_season_a_date_falls_in(snapshot, day, season):
+    assert snapshot.season_at(day) == season
+
+
+def test_empty_snapshot_has_no_season():
+    snapshot = SeasonSnapshot(1, [], TEAMS)
+    assert snapshot.season_at(datetime.date(2024, 8, 17)) is None
+    assert snapshot.standings() == []
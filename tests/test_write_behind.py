@@ -0,0 +1,181 @@
+"""Prediction journal: group commit, crash recovery, cutoff and last-write-wins."""
+import datetime
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import write_behind
+from write_behind import PredictionJournal, coalesce
+
+FUTURE = datetime.datetime(2100, 1, 1, 15, 0)
+
+
+class FakeDB:
+    """Matches keyed by id and every row the journal upserted, in order."""
+
+    def __init__(self, matches):
+        self.matches = matches
+        self.upserts = []
+        self.commits = 0
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, query, params=()):
+        assert query.startswith('SELECT id, kickoff_at, result FROM matches')
+        self.rows = [self.db.matches[match_id] for match_id in params if match_id in self.db.matches]
+
+    def executemany(self, query, rows):
+        assert query == write_behind.UPSERT_PREDICTION_QUERY
+        self.db.upserts.extend(rows)
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def match(match_id, kickoff_at=FUTURE, result='Scheduled'):
+    return {'id': match_id, 'kickoff_at': kickoff_at, 'result': result}
+
+
+def entry(user_id, match_id, prediction, predicted_at, ts):
+    return {'user_id': user_id, 'match_id': match_id, 'prediction': prediction,
+            'predicted_at': predicted_at, 'ts': ts}
+
+
+@pytest.fixture
+def journal(tmp_path):
+    db = FakeDB({1: match(1), 2: match(2)})
+    # The flusher thread sleeps through the test; flushes are driven explicitly
+    journal = PredictionJournal(str(tmp_path), db.connect, interval=3600)
+    journal.db = db
+    return journal
+
+
+def test_coalesce_breaks_same_microsecond_ties_by_submission_order():
+    same = '2024-08-17T14:59:59.123456'
+    entries = [
+        entry(7, 1, 'Home Win', same, 100.000001),
+        entry(7, 1, 'Away Win', same, 100.000002),
+        entry(7, 2, 'Draw', '2024-08-17T15:00:00.000001', 99.0),
+        entry(7, 2, 'Home Win', '2024-08-17T15:00:00.000000', 101.0),
+    ]
+    latest = {e['match_id']: e['prediction'] for e in coalesce(entries)}
+    # Same timestamp: the later journal entry wins; otherwise predicted_at decides, not file order
+    assert latest == {1: 'Away Win', 2: 'Draw'}
+    assert {e['match_id']: e['prediction'] for e in coalesce(entries[::-1])} == latest
+
+
+def test_appends_are_durable_and_share_fsyncs(journal, monkeypatch):
+    fsyncs = []
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        fsyncs.append(fd)
+        time.sleep(0.01)
+        real_fsync(fd)
+
+    monkeypatch.setattr(write_behind.os, 'fsync', slow_fsync)
+    journal.ensure_started()
+    threads = [threading.Thread(target=journal.append, args=(user_id, 1, 'Draw')) for user_id in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every append returned after an fsync covering it, but concurrent ones shared them
+    assert journal._synced == journal._written == 40
+    assert 0 < len(fsyncs) < 40
+    assert journal.pending_for(3) == {1: 'Draw'}
+
+    journal.flush()
+    assert sorted(row[0] for row in journal.db.upserts) == list(range(40))
+    assert journal.pending_for(3) == {}
+
+
+def test_segments_of_a_crashed_process_are_replayed(journal, tmp_path):
+    # A worker that died mid-write: its owner file is unlocked and its last line torn
+    dead = 'dead-0000'
+    (tmp_path / f'{dead}.owner').write_text('')
+    lines = [
+        json.dumps(entry(1, 1, 'Home Win', '2024-08-17T10:00:00.000000', 1.0)),
+        json.dumps(entry(2, 2, 'Draw', '2024-08-17T10:00:01.000000', 2.0)),
+        json.dumps(entry(1, 1, 'Away Win', '2024-08-17T10:00:02.000000', 3.0)),
+    ]
+    (tmp_path / f'{dead}.00000001.jsonl').write_text('\n'.join(lines[:2]) + '\n')
+    (tmp_path / f'{dead}.00000002.jsonl').write_text(lines[2] + '\n{"user_id": 3, "mat')
+
+    journal.ensure_started()
+    journal._claim_orphans()
+
+    assert sorted(journal.db.upserts) == [
+        (1, 1, 'Away Win', '2024-08-17T10:00:02.000000'),
+        (2, 2, 'Draw', '2024-08-17T10:00:01.000000'),
+    ]
+    assert not list(tmp_path.glob(f'{dead}.*'))
+
+
+def test_segments_of_a_live_process_are_left_alone(journal, tmp_path):
+    other = PredictionJournal(str(tmp_path), journal.db.connect, interval=3600)
+    other.append(5, 1, 'Draw')
+    journal.ensure_started()
+    journal._claim_orphans()
+    assert journal.db.upserts == []
+    other.flush()
+    assert [row[:3] for row in journal.db.upserts] == [(5, 1, 'Draw')]
+
+
+def test_cutoff_runs_before_coalescing(journal, tmp_path):
+    kickoff = datetime.datetime(2024, 8, 17, 14, 0)
+    journal.db.matches[1] = match(1, kickoff_at=kickoff)
+    before = kickoff.replace(tzinfo=datetime.timezone.utc).timestamp() - 60
+    after = before + 120
+    path = tmp_path / 'replay.jsonl'
+    path.write_text('\n'.join(json.dumps(e) for e in [
+        entry(1, 1, 'Home Win', '2024-08-17T13:59:00.000000', before),
+        # Submitted after kickoff: dropped, and it must not displace the accepted pick above
+        entry(1, 1, 'Away Win', '2024-08-17T14:01:00.000000', after),
+    ]) + '\n')
+
+    written = journal._flush_segments([str(path)])
+
+    assert [e['prediction'] for e in written] == ['Home Win']
+    assert journal.db.upserts == [(1, 1, 'Home Win', '2024-08-17T13:59:00.000000')]
+    assert not path.exists()
+
+
+def test_matches_without_kickoff_close_when_no_longer_scheduled(journal):
+    journal.db.matches[2] = match(2, kickoff_at=None, result='Live')
+    entries = [entry(1, 1, 'Draw', 'x', 1.0), entry(1, 2, 'Draw', 'x', 1.0), entry(1, 3, 'Draw', 'x', 1.0)]
+    kept = write_behind.before_cutoff(FakeCursor(journal.db), entries)
+    assert [e['match_id'] for e in kept] == [1]
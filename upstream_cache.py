@@ -0,0 +1,243 @@
+"""Disk-backed cache of raw Football-Data.org responses.
+
+Responses are stored per endpoint and params under UPSTREAM_CACHE_DIR, so
+they survive restarts and deploys and are shared by every worker on a host.
+
+- Revalidation sends If-None-Match / If-Modified-Since; a 304 only bumps the
+  entry's age, and the already parsed payload is reused.
+- Stale entries are returned immediately while one background refresh runs
+  (one per key per host, elected with a file lock).
+- A failed fetch is cached too (negative caching) so callers don't retry on
+  every request.
+- After UPSTREAM_BREAKER_THRESHOLD consecutive failures the circuit opens
+  and no requests are sent for UPSTREAM_BREAKER_COOLDOWN seconds.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Stop calling upstream after repeated failures; let one trial through after the cooldown."""
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            now = time.time()
+            if now < self.open_until:
+                return False
+            if self.failures >= self.threshold:
+                # Half-open: this caller is the trial, everyone else waits for its outcome
+                self.open_until = now + self.cooldown
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.failures >= self.threshold:
+                logger.info("Upstream API recovered; circuit closed")
+            self.failures = 0
+            self.open_until = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.open_until = time.time() + self.cooldown
+                logger.warning(f"Upstream API failed {self.failures} times in a row; "
+                               f"circuit open for {self.cooldown}s")
+
+
+class UpstreamCache:
+    """Raw upstream responses on disk, with parsed payloads kept per process."""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker(3, 60)
+        self._parsed = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def init_app(self, app, base_url, api_key):
+        config = app.config
+        self.base_url = base_url
+        self.api_key = api_key
+        self.directory = config['UPSTREAM_CACHE_DIR']
+        self.ttl = config['UPSTREAM_CACHE_TTL']
+        self.negative_ttl = config['UPSTREAM_NEGATIVE_TTL']
+        self.timeout = config['UPSTREAM_TIMEOUT']
+        self.breaker = CircuitBreaker(config['UPSTREAM_BREAKER_THRESHOLD'], config['UPSTREAM_BREAKER_COOLDOWN'])
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _ensure_process(self):
+        """Per-process state (session, refresh bookkeeping) must not be shared across fork."""
+        if self._pid == os.getpid():
+            return
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._session = requests.Session()
+        self._session.headers['X-Auth-Token'] = self.api_key
+        self._pid = os.getpid()
+
+    def _key(self, path, params):
+        raw = json.dumps([path, sorted((params or {}).items())], default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, f"{key}.{suffix}")
+
+    def _read_meta(self, key):
+        try:
+            with open(self._path(key, 'meta')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key, suffix, data):
+        path = self._path(key, suffix)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _write_meta(self, key, meta):
+        self._write(key, 'meta', json.dumps(meta).encode('utf-8'))
+
+    def _payload(self, key, meta, parse):
+        """The parsed body for a meta entry, parsing only when the body changed."""
+        if meta is None or not meta.get('has_body'):
+            return None
+        cached = self._parsed.get((key, parse))
+        if cached is not None and cached[0] == meta['body_hash']:
+            return cached[1]
+        try:
+            with open(self._path(key, 'body'), 'rb') as f:
+                data = json.loads(f.read())
+        except (OSError, ValueError) as e:
+            logger.error(f"Unreadable cached upstream body {key}: {e}")
+            return None
+        payload = parse(data) if parse else data
+        self._parsed[(key, parse)] = (meta['body_hash'], payload)
+        return payload
+
+    def _fetch(self, key, path, params):
+        """Make one (conditional) upstream request and update the cache entry; returns the new meta."""
+        meta = self._read_meta(key) or {'has_body': False}
+        if not self.breaker.allow():
+            return meta
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        url = f"{self.base_url}{path}"
+        try:
+            logger.info(f"Making API request to {url}")
+            response = self._session.get(url, params=params, headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"API request error: {e}")
+            return self._record_failure(key, meta)
+
+        if response.status_code == 304:
+            meta.update(fetched_at=time.time(), failed_until=0)
+            self._write_meta(key, meta)
+            self.breaker.record_success()
+            return meta
+        if response.status_code != 200:
+            logger.error(f"API request failed with status code {response.status_code}: {response.text[:500]}")
+            retry_after = response.headers.get('Retry-After', '')
+            return self._record_failure(key, meta, int(retry_after) if retry_after.isdigit() else None)
+        try:
+            response.json()
+        except ValueError:
+            logger.error(f"API returned invalid JSON for {url}")
+            return self._record_failure(key, meta)
+
+        self._write(key, 'body', response.content)
+        meta.update(
+            has_body=True,
+            body_hash=hashlib.sha1(response.content).hexdigest(),
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+            fetched_at=time.time(),
+            failed_until=0,
+            path=path,
+        )
+        self._write_meta(key, meta)
+        self.breaker.record_success()
+        return meta
+
+    def _record_failure(self, key, meta, retry_after=None):
+        self.breaker.record_failure()
+        meta['failed_until'] = time.time() + max(self.negative_ttl, retry_after or 0)
+        self._write_meta(key, meta)
+        return meta
+
+    def _refresh_locked(self, key, path, params, blocking, max_age=None):
+        """Fetch while holding the per-key host lock; None if another process holds it (non-blocking)."""
+        with open(self._path(key, 'lock'), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except OSError:
+                return None
+            # Someone may have refreshed while we waited for the lock
+            meta = self._read_meta(key)
+            if meta and blocking and self._usable(meta, max_age):
+                return meta
+            return self._fetch(key, path, params)
+
+    def _background_refresh(self, key, path, params):
+        try:
+            self._refresh_locked(key, path, params, blocking=False)
+        except Exception as e:
+            logger.error(f"Background refresh of {path} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    @staticmethod
+    def _usable(meta, max_age):
+        now = time.time()
+        fresh = meta.get('has_body') and now - meta.get('fetched_at', 0) < max_age
+        return fresh or now < meta.get('failed_until', 0)
+
+    def get(self, path, params=None, parse=None, max_age=None, background=True):
+        """Return the (parsed) payload for an endpoint, or None if there is none to give.
+
+        Fresh entries are served from the cache. Stale ones are served as they
+        are while a background refresh runs, unless background is False, in
+        which case the caller waits for revalidation. Entries that recently
+        failed are not retried until their negative TTL passes.
+        """
+        self._ensure_process()
+        key = self._key(path, params)
+        max_age = self.ttl if max_age is None else max_age
+        meta = self._read_meta(key)
+
+        if meta is not None and self._usable(meta, max_age):
+            return self._payload(key, meta, parse)
+
+        if meta is not None and meta.get('has_body') and background:
+            with self._lock:
+                start = key not in self._refreshing
+                self._refreshing.add(key)
+            if start:
+                threading.Thread(target=self._background_refresh, args=(key, path, params),
+                                 name='upstream-refresh', daemon=True).start()
+            return self._payload(key, meta, parse)
+
+        # Nothing to serve yet (or the caller wants it revalidated): fetch now, one process at a time
+        meta = self._refresh_locked(key, path, params, blocking=True, max_age=max_age)
+        return self._payload(key, meta, parse)
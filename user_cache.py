@@ -0,0 +1,80 @@
+"""Per-worker cache of the identity fields logged-in pages need.
+
+Flask-Login calls the user loader on every request from a logged-in user.
+Most pages only need the id, username and email (navbar, profile card), so
+we keep those in a small TTL cache instead of querying `users` each time.
+"""
+import threading
+import time
+from collections import OrderedDict
+from flask_login import UserMixin
+from sqlalchemy import event
+
+
+class SessionUser(UserMixin):
+    """Read-only identity restored from the cache instead of the database."""
+
+    def __init__(self, id, username, email):
+        self.id = id
+        self.username = username
+        self.email = email
+
+    def __repr__(self):
+        return f'<SessionUser {self.username}>'
+
+
+class UserCache:
+    """Thread-safe LRU of user identities with a time-to-live."""
+
+    def __init__(self, ttl=60, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, fields = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+        return SessionUser(**fields)
+
+    def put(self, user):
+        fields = {'id': user.id, 'username': user.username, 'email': user.email}
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, fields)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def load(self, user_id, loader):
+        """Return the cached identity, falling back to `loader(user_id)`."""
+        cached = self.get(user_id)
+        if cached is not None:
+            return cached
+        user = loader(user_id)
+        if user is not None:
+            self.put(user)
+        return user
+
+
+def watch_user_changes(user_model, user_cache):
+    """Drop cached identities whenever a user row is updated or deleted.
+
+    This covers changes made through this worker; other workers pick the
+    change up when their entry's TTL runs out.
+    """
+    def invalidate(mapper, connection, target):
+        user_cache.invalidate(target.id)
+
+    event.listen(user_model, 'after_update', invalidate)
+    event.listen(user_model, 'after_delete', invalidate)
@@ -0,0 +1,148 @@
+"""Bulk import of user accounts from CSV.
+
+`flask import-users FILE` streams rows with `username`, `email` and either
+`password` or an existing `password_hash`, and works through them in chunks
+of USER_IMPORT_CHUNK_SIZE:
+
+- rows whose username or email already appeared in the file, or already
+  exist in `users`, are skipped. The database check is one IN lookup per
+  chunk, case-insensitive like the unique keys.
+- plaintext passwords are hashed in a process pool across all cores. The
+  next chunk is read and checked while the pool hashes the current one.
+- each chunk is written with one multi-row INSERT and committed.
+
+Hashes in a legacy format are imported as they are and upgraded when the
+user next logs in (see passwords.py).
+"""
+import csv
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from passwords import hash_password, is_known_hash
+
+logger = logging.getLogger(__name__)
+
+# The ON DUPLICATE KEY no-op skips accounts created while the import runs;
+# mysql.connector only batches plain INSERT ... VALUES, so not INSERT IGNORE
+INSERT_USERS_QUERY = """
+    INSERT INTO users (username, email, password_hash)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE id = id
+"""
+
+
+def read_users(stream):
+    """Yield (line number, row) for each CSV row, with surrounding whitespace stripped."""
+    reader = csv.DictReader(stream)
+    missing = {'username', 'email'} - set(reader.fieldnames or ())
+    if missing or not {'password', 'password_hash'} & set(reader.fieldnames or ()):
+        raise ValueError("CSV needs username, email and password or password_hash columns")
+    for row in reader:
+        yield reader.line_num, {key: (value or '').strip() for key, value in row.items() if key}
+
+
+def _valid(row):
+    if not row['username'] or len(row['username']) > 80:
+        return False
+    if '@' not in row['email'] or len(row['email']) > 120:
+        return False
+    if row.get('password_hash'):
+        return is_known_hash(row['password_hash'])
+    return bool(row.get('password'))
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def existing_accounts(cursor, chunk):
+    """Lowercased usernames and emails in the chunk that are already taken."""
+    usernames = [row['username'] for row in chunk]
+    emails = [row['email'] for row in chunk]
+    cursor.execute(f"""
+        SELECT username, email FROM users
+        WHERE username IN ({', '.join(['%s'] * len(usernames))})
+           OR email IN ({', '.join(['%s'] * len(emails))})
+    """, usernames + emails)
+    taken = set()
+    for username, email in cursor.fetchall():
+        taken.add(('username', username.lower()))
+        taken.add(('email', email.lower()))
+    return taken
+
+
+class UserImport:
+    """State of one import run: seen keys, counters and the hashing pool."""
+
+    def __init__(self, connect, chunk_size=1000, workers=None):
+        self.connect = connect
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count()
+        self.seen = set()
+        self.counts = {'imported': 0, 'duplicate': 0, 'existing': 0, 'invalid': 0}
+
+    def _select(self, cursor, numbered_rows):
+        """Drop invalid rows and duplicates (within the file and against the database)."""
+        chunk = []
+        for line_num, row in numbered_rows:
+            if not _valid(row):
+                logger.warning(f"Skipping invalid user on line {line_num}")
+                self.counts['invalid'] += 1
+                continue
+            keys = {('username', row['username'].lower()), ('email', row['email'].lower())}
+            if keys & self.seen:
+                self.counts['duplicate'] += 1
+                continue
+            self.seen |= keys
+            chunk.append(row)
+        if not chunk:
+            return chunk
+        taken = existing_accounts(cursor, chunk)
+        selected = [
+            row for row in chunk
+            if ('username', row['username'].lower()) not in taken and ('email', row['email'].lower()) not in taken
+        ]
+        self.counts['existing'] += len(chunk) - len(selected)
+        return selected
+
+    def _insert(self, cnx, cursor, chunk, hashes):
+        values = []
+        for row in chunk:
+            password_hash = row.get('password_hash') or next(hashes)
+            values.append((row['username'], row['email'], password_hash))
+        cursor.executemany(INSERT_USERS_QUERY, values)
+        cnx.commit()
+        self.counts['imported'] += cursor.rowcount
+        logger.info(f"Imported {self.counts['imported']} users")
+
+    def run(self, stream):
+        """Import every user in a CSV stream; returns the counters."""
+        cnx = self.connect()
+        cursor = cnx.cursor()
+        pending = None
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for numbered_rows in _chunks(read_users(stream), self.chunk_size):
+                    chunk = self._select(cursor, numbered_rows)
+                    passwords = [row['password'] for row in chunk if not row.get('password_hash')]
+                    # map() submits everything now; results are collected when the chunk is inserted
+                    hashes = pool.map(hash_password, passwords, chunksize=max(1, len(passwords) // (self.workers * 4)))
+                    if pending:
+                        self._insert(cnx, cursor, *pending)
+                    pending = (chunk, hashes) if chunk else None
+                if pending:
+                    self._insert(cnx, cursor, *pending)
+            return self.counts
+        except Exception:
+            cnx.rollback()
+            raise
+        finally:
+            cursor.close()
+            cnx.close()
@@ -0,0 +1,259 @@
+"""Write-behind journal for prediction submissions.
+
+With WRITE_BEHIND_ENABLED, make_prediction appends the prediction to a
+local journal and acknowledges it as soon as the line is fsynced; a flusher
+thread in each worker writes the journal to `user_predictions` every
+WRITE_BEHIND_INTERVAL seconds as one batched multi-row upsert.
+
+- Durability: concurrent submissions share one fsync (group commit).
+- Ordering: the latest predicted_at wins per (user, match), both within a
+  batch and against the stored row, so a late flush never overwrites a
+  newer prediction.
+- Cutoff: entries submitted at or after kickoff are dropped at flush time.
+- Recovery: each process holds a flock on its owner file; segments whose
+  owner is gone (a crashed or restarted worker) are claimed and flushed by
+  the next flusher that notices.
+"""
+import atexit
+import calendar
+import datetime
+import fcntl
+import glob
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+UPSERT_PREDICTION_QUERY = """
+    INSERT INTO user_predictions (user_id, match_id, prediction, predicted_at)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        prediction = IF(VALUES(predicted_at) >= predicted_at, VALUES(prediction), prediction),
+        predicted_at = GREATEST(predicted_at, VALUES(predicted_at))
+"""
+
+
+def _kickoff_timestamp(row):
+    if row['kickoff_at'] is None:
+        return None
+    return calendar.timegm(row['kickoff_at'].timetuple())
+
+
+def coalesce(entries):
+    """Keep the latest entry per (user, match)."""
+    latest = {}
+    for entry in entries:
+        key = (entry['user_id'], entry['match_id'])
+        if key not in latest or (entry['predicted_at'], entry['ts']) >= (latest[key]['predicted_at'], latest[key]['ts']):
+            latest[key] = entry
+    return list(latest.values())
+
+
+def before_cutoff(cursor, entries):
+    """Drop entries for unknown matches or submitted at or after kickoff."""
+    match_ids = sorted({entry['match_id'] for entry in entries})
+    if not match_ids:
+        return []
+    placeholders = ', '.join(['%s'] * len(match_ids))
+    cursor.execute(f"SELECT id, kickoff_at, result FROM matches WHERE id IN ({placeholders})", match_ids)
+    matches = {row['id']: row for row in cursor.fetchall()}
+
+    accepted = []
+    for entry in entries:
+        match = matches.get(entry['match_id'])
+        if match is None:
+            continue
+        kickoff = _kickoff_timestamp(match)
+        # Matches without a kickoff time are open until they are no longer scheduled
+        open_for_entry = entry['ts'] < kickoff if kickoff is not None else match['result'] == 'Scheduled'
+        if open_for_entry:
+            accepted.append(entry)
+    if len(accepted) < len(entries):
+        logger.info(f"Dropped {len(entries) - len(accepted)} predictions submitted after kickoff")
+    return accepted
+
+
+class PredictionJournal:
+    """Per-process append-only journal of predictions, rotated into segments for flushing."""
+
+    def __init__(self, directory, connect, interval=0.25):
+        self.directory = directory
+        self.connect = connect
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        self._pending = {}
+
+    def _open(self):
+        """Set up the owner lock and first segment; reruns in a forked child."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._owner = f"{os.getpid()}-{secrets.token_hex(4)}"
+        self._owner_file = open(os.path.join(self.directory, f"{self._owner}.owner"), 'a')
+        fcntl.flock(self._owner_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._segment_number = 0
+        self._written = 0
+        self._synced = 0
+        self._pending = {}
+        self._new_segment()
+        self._pid = os.getpid()
+        threading.Thread(target=self._run, name='prediction-flusher', daemon=True).start()
+        atexit.register(self.flush)
+        logger.info(f"Prediction journal {self._owner} started")
+
+    def _new_segment(self):
+        self._segment_number += 1
+        path = os.path.join(self.directory, f"{self._owner}.{self._segment_number:08d}.jsonl")
+        self._segment = open(path, 'a')
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+
+    def append(self, user_id, match_id, prediction):
+        """Journal a prediction and return once it is on disk."""
+        self.ensure_started()
+        entry = {
+            'user_id': user_id,
+            'match_id': match_id,
+            'prediction': prediction,
+            'predicted_at': datetime.datetime.now().isoformat(),
+            'ts': time.time(),
+        }
+        with self._lock:
+            self._segment.write(json.dumps(entry) + '\n')
+            self._segment.flush()
+            self._written += 1
+            sequence = self._written
+            segment = self._segment
+            self._pending[(user_id, match_id)] = entry
+        self._sync(segment, sequence)
+        return entry
+
+    def _sync(self, segment, sequence):
+        # Whoever gets the sync lock fsyncs every line written so far; later arrivals find theirs covered
+        with self._sync_lock:
+            if self._synced >= sequence:
+                return
+            with self._lock:
+                target = self._written
+            # Rotation takes the sync lock too, so the segment cannot be closed under us
+            if not segment.closed:
+                os.fsync(segment.fileno())
+            self._synced = max(self._synced, target)
+
+    def pending_for(self, user_id):
+        """This process's not-yet-flushed predictions of a user, {match_id: prediction}."""
+        with self._lock:
+            return {match_id: entry['prediction']
+                    for (pending_user, match_id), entry in self._pending.items() if pending_user == user_id}
+
+    def _rotate(self):
+        """Seal the active segment; returns the pending entries it covers."""
+        with self._sync_lock, self._lock:
+            covered = dict(self._pending)
+            if self._segment.tell():
+                self._segment.flush()
+                os.fsync(self._segment.fileno())
+                self._synced = self._written
+                self._segment.close()
+                self._new_segment()
+            return covered
+
+    def _owned_segments(self, owner):
+        return sorted(glob.glob(os.path.join(self.directory, f"{owner}.*.jsonl")))
+
+    def _flush_segments(self, paths):
+        entries = []
+        for path in paths:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # A torn last line from a crash was never acknowledged
+                        logger.warning(f"Skipping unreadable journal line in {path}")
+        if entries:
+            cnx = self.connect()
+            cursor = cnx.cursor(dictionary=True)
+            try:
+                # Cutoff first: a late pick must not displace the accepted one before it is dropped
+                entries = coalesce(before_cutoff(cursor, entries))
+                if entries:
+                    cursor.executemany(UPSERT_PREDICTION_QUERY, [
+                        (e['user_id'], e['match_id'], e['prediction'], e['predicted_at']) for e in entries
+                    ])
+                cnx.commit()
+            except Exception:
+                cnx.rollback()
+                raise
+            finally:
+                cursor.close()
+                cnx.close()
+        for path in paths:
+            os.remove(path)
+        return entries
+
+    def _claim_orphans(self):
+        """Flush the segments of processes that no longer hold their owner lock."""
+        for owner_path in glob.glob(os.path.join(self.directory, '*.owner')):
+            owner = os.path.basename(owner_path)[:-len('.owner')]
+            if owner == self._owner:
+                continue
+            with open(owner_path, 'a') as owner_file:
+                try:
+                    fcntl.flock(owner_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue
+                paths = self._owned_segments(owner)
+                if paths:
+                    logger.info(f"Recovering {len(paths)} journal segments of {owner}")
+                    self._flush_segments(paths)
+                os.remove(owner_path)
+
+    def flush(self):
+        """Write everything journaled so far to the database."""
+        if self._pid != os.getpid():
+            return
+        with self._flush_lock:
+            flushing = self._rotate()
+            active = self._segment.name
+            sealed = [path for path in self._owned_segments(self._owner) if path != active]
+            if not sealed:
+                return
+            written = self._flush_segments(sealed)
+            with self._lock:
+                for key, entry in flushing.items():
+                    if self._pending.get(key) is entry:
+                        del self._pending[key]
+            if written:
+                logger.info(f"Flushed {len(written)} predictions")
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+                self._claim_orphans()
+            except Exception as e:
+                # Segments stay on disk and are retried on the next tick
+                logger.error(f"Error flushing prediction journal: {e}")
+
+
+def init_write_behind(app, connect):
+    """Create the per-process journal when WRITE_BEHIND_ENABLED; it starts on first use."""
+    if not app.config['WRITE_BEHIND_ENABLED']:
+        return None
+    journal = PredictionJournal(app.config['WRITE_BEHIND_DIR'], connect, app.config['WRITE_BEHIND_INTERVAL'])
+    app.extensions['prediction_journal'] = journal
+    # Start the flusher in every worker, so orphaned segments are recovered without a new submission
+    app.before_request(journal.ensure_started)
+    return journal
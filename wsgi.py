@@ -0,0 +1,12 @@
+"""WSGI entry point for gunicorn (see gunicorn.conf.py).
+
+With preload_app the app is built once in the master; shared read-only state
+is loaded before fork and frozen out of the garbage collector so that
+workers keep sharing those memory pages copy-on-write.
+"""
+import gc
+from app import create_app, preload_shared_state
+
+app = create_app()
+preload_shared_state(app)
+gc.freeze()